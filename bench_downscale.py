@@ -0,0 +1,90 @@
+# bench_downscale.py
+# version: 1.0.0 (Fast Downscale Benchmark)
+__version__ = "1.0.0"
+
+# 比較標準縮圖路徑 (完整解碼 + LANCZOS) 與快速縮圖路徑 (JPEG draft + reduce + LANCZOS)
+# 的吞吐量與品質。品質以標準路徑的輸出為基準計算 PSNR / SSIM (需要 numpy)。
+#
+# 用法: python bench_downscale.py <圖片或資料夾> [--width 1920] [--repeat 3]
+
+import os
+import sys
+import time
+import argparse
+
+from image_ops import Image, np, decode_resized, compute_psnr, compute_ssim
+
+try:
+    from utils import IMAGE_EXTS
+except ImportError:
+    IMAGE_EXTS = ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp', '.tiff', '.tif', '.ico']
+
+def collect_images(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for name in sorted(files):
+                    if os.path.splitext(name)[1].lower() in IMAGE_EXTS: yield os.path.join(root, name)
+        elif os.path.isfile(path): yield path
+
+def make_settings(width, fast):
+    return {"resize_enabled": True, "resize_mode": "像素", "width": str(width), "height": "", "keep_ratio": True,
+            "scale_rule": "僅縮小，不放大", "fast_downscale": fast}
+
+def run_once(path, settings):
+    start = time.perf_counter()
+    with Image.open(path) as img:
+        source_pixels = img.width * img.height
+        out = decode_resized(img, settings)
+        out.load()
+    return out, time.perf_counter() - start, source_pixels
+
+def bench_file(path, width, repeat):
+    """回傳 (標準耗時, 快速耗時, 原始像素數, PSNR, SSIM)，耗時取 repeat 次中的最小值。"""
+    std_times, fast_times = [], []
+    for _ in range(repeat):
+        std_img, t, source_pixels = run_once(path, make_settings(width, False)); std_times.append(t)
+        fast_img, t, _ = run_once(path, make_settings(width, True)); fast_times.append(t)
+    psnr = ssim = None
+    if np is not None and std_img.size == fast_img.size:
+        psnr, ssim = compute_psnr(std_img, fast_img), compute_ssim(std_img, fast_img)
+    return min(std_times), min(fast_times), source_pixels, psnr, ssim
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="快速縮圖效能與品質基準測試")
+    parser.add_argument("paths", nargs="+", help="圖片檔或資料夾")
+    parser.add_argument("--width", type=int, default=1920, help="目標寬度 (像素，預設 1920)")
+    parser.add_argument("--repeat", type=int, default=3, help="每張圖重複次數，取最佳值 (預設 3)")
+    args = parser.parse_args(argv)
+
+    if Image is None: print("需要 Pillow: pip install Pillow"); return 1
+    if np is None: print("注意: 未安裝 numpy，將略過 PSNR/SSIM。")
+
+    files = list(collect_images(args.paths))
+    if not files: print("找不到圖片檔案。"); return 1
+
+    total_std = total_fast = total_pixels = 0
+    psnrs, ssims = [], []
+    print(f"{'檔案':<40} {'標準(s)':>9} {'快速(s)':>9} {'加速':>6} {'PSNR':>7} {'SSIM':>7}")
+    for path in files:
+        try: std_t, fast_t, pixels, psnr, ssim = bench_file(path, args.width, max(1, args.repeat))
+        except Exception as e: print(f"{os.path.basename(path)[:40]:<40} 失敗: {e}"); continue
+        total_std += std_t; total_fast += fast_t; total_pixels += pixels
+        if psnr is not None: psnrs.append(psnr); ssims.append(ssim)
+        psnr_str = "inf" if psnr == float("inf") else (f"{psnr:.2f}" if psnr is not None else "-")
+        ssim_str = f"{ssim:.4f}" if ssim is not None else "-"
+        print(f"{os.path.basename(path)[:40]:<40} {std_t:>9.3f} {fast_t:>9.3f} {std_t / fast_t if fast_t else 0:>5.1f}x {psnr_str:>7} {ssim_str:>7}")
+
+    if not total_fast: return 1
+    mp = total_pixels / 1e6
+    print("-" * 82)
+    print(f"標準路徑: {total_std:.2f} 秒, {mp / total_std:.1f} MP/s")
+    print(f"快速路徑: {total_fast:.2f} 秒, {mp / total_fast:.1f} MP/s (加速 {total_std / total_fast:.2f}x)")
+    finite = [p for p in psnrs if p != float("inf")]
+    if ssims:
+        print(f"品質 (相對標準路徑): 平均 PSNR {sum(finite) / len(finite) if finite else float('inf'):.2f} dB, "
+              f"平均 SSIM {sum(ssims) / len(ssims):.4f}, 最低 SSIM {min(ssims):.4f}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,7 +1,7 @@
 # delete_pane.py
 # Compatible with main.py v4.x
-# version: 2.0.1
-__version__ = "2.0.1"
+# version: 2.1.0 (Work-Weighted Progress)
+__version__ = "2.1.0"
 
 import os
 import sys
@@ -30,7 +30,11 @@ except ImportError:
         try: from tkinterdnd2 import TkinterDND; return TkinterDND.Tk()
         except ImportError: return tk.Tk()
 
+from progress import ProgressTracker
+
 CONFIG_NAME = "DeleteFolderGUI.config.json"
+# 刪除一個項目的固定成本 (目錄項與中繼資料更新)，以等效位元組計入工作量
+DELETE_ITEM_COST = 256 * 1024
 
 def is_windows() -> bool: return os.name == "nt"
 def safe_path(path: str) -> str: return os.path.abspath(os.path.expanduser(path or "")).rstrip("\\/")
@@ -64,25 +68,15 @@ class DeleteWorker(threading.Thread):
         self.ui_queue = ui_queue
         self.cancel_event = cancel_event
         self.log_batch = []
-        self.last_update_time = 0
 
     def _send_log_batch(self, force=False):
         if force or len(self.log_batch) >= 100:
             if self.log_batch:
                 self.ui_queue.put(("log_batch", self.log_batch)); self.log_batch = []
 
-    def _update_status(self, current, total, start_time):
-        now = time.time()
-        if now - self.last_update_time > 0.2:
-            self.last_update_time = now
-            progress = int(current * 100 / total) if total > 0 else 0
-            elapsed = now - start_time
-            speed = current / elapsed if elapsed > 0 else 0
-            remaining_items = total - current
-            eta = remaining_items / speed if speed > 0 else 0
-            eta_str = f"{int(eta // 60)} 分 {int(eta % 60)} 秒" if eta > 60 else f"{eta:.1f} 秒"
-            status_text = f"刪除中... (剩餘 {remaining_items:,} 個項目, 預計 {eta_str})"
-            self.ui_queue.put(("progress", progress)); self.ui_queue.put(("status", status_text))
+    def _update_status(self):
+        if not self.tracker.should_emit(0.2): return
+        self.ui_queue.put(("progress", self.tracker.percent())); self.ui_queue.put(("status", self.tracker.status_text("刪除中...")))
 
     def _log(self, msg: str, batch=True):
         line = f"[{time.strftime('%H:%M:%S')}] {msg}"
@@ -97,19 +91,30 @@ class DeleteWorker(threading.Thread):
         try:
             total_items = len(self.files_to_delete) + len(self.dirs_to_delete) + 1
             completed_items = 0
-            deletion_start_time = time.time()
+            # 工作量 = 檔案大小 + 每個項目的固定成本，大檔案與大量小檔案都能反映在進度與 ETA 上
+            self.tracker = ProgressTracker(total_items, self.total_size + total_items * DELETE_ITEM_COST)
 
             for f in self.files_to_delete:
                 if self.cancel_event.is_set(): break
-                try: os.chmod(f, stat.S_IWRITE); os.remove(f); self._log(f"檔案已刪除: {f}")
+                item_start, size = time.perf_counter(), 0
+                try:
+                    size = os.lstat(f).st_size
+                    os.chmod(f, stat.S_IWRITE); os.remove(f); self._log(f"檔案已刪除: {f}")
                 except Exception as e: self._log(f"刪除檔案失敗: {f} -> {e}")
-                finally: completed_items += 1; self._update_status(completed_items, total_items, deletion_start_time)
+                finally:
+                    completed_items += 1
+                    self.tracker.item_done(size + DELETE_ITEM_COST, name=f, seconds=time.perf_counter() - item_start, bytes_count=size)
+                    self._update_status()
             
             for d in sorted(self.dirs_to_delete, key=lambda p: -len(p)):
                 if self.cancel_event.is_set(): break
+                item_start = time.perf_counter()
                 try: os.rmdir(d); self._log(f"資料夾已刪除: {d}")
                 except Exception as e: self._log(f"刪除資料夾失敗: {d} -> {e}")
-                finally: completed_items += 1; self._update_status(completed_items, total_items, deletion_start_time)
+                finally:
+                    completed_items += 1
+                    self.tracker.item_done(DELETE_ITEM_COST, name=d, seconds=time.perf_counter() - item_start)
+                    self._update_status()
 
             if not self.cancel_event.is_set():
                 try: os.rmdir(self.target); self._log(f"根目錄已刪除: {self.target}")
@@ -121,7 +126,8 @@ class DeleteWorker(threading.Thread):
             
             summary = (f"總共刪除: {completed_items:,} / {total_items:,} 個項目\n"
                        f"釋放空間: {format_size(self.total_size)}\n"
-                       f"總花費時間: {duration:.2f} 秒")
+                       f"總花費時間: {duration:.2f} 秒\n"
+                       f"{self.tracker.summary_text()}")
             self.ui_queue.put(("summary", summary))
 
             if self.cancel_event.is_set(): self._log("使用者已取消刪除操作。", batch=False); self.ui_queue.put(("done", "cancel"))
@@ -0,0 +1,614 @@
+# dupe_pane.py
+# version: 1.2.1 (Safe Duplicate Actions)
+__version__ = "1.2.1"
+
+import os
+import stat
+import queue
+import threading
+import time
+import tkinter as tk
+from tkinter import ttk, messagebox
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from tkinterdnd2 import DND_FILES
+
+from utils import IMAGE_EXTS, VIDEO_EXTS, format_size, natural_sort_key, ensure_tk_with_dnd, create_scrollable_treeview
+from file_cache import CACHE_DB_NAME, PARTIAL_CHUNK, ContentHashCache, PerceptualHashCache, file_signature, hash_file_partial, hash_file_full
+from image_ops import Image, np, PERCEPTUAL_HASH_KINDS, PERCEPTUAL_HASH_VERSION, compute_perceptual_hashes, find_similar_pairs, hamming_distance
+
+MATCH_EXACT = "完全相同"
+MATCH_SIMILAR = "相似圖片"
+
+class DuplicateFinderPane(ttk.Frame):
+    def __init__(self, parent, app):
+        super().__init__(parent)
+        self.app = app
+        self.pane_name = "dupe_pane"
+        self.worker_thread = None
+        self.ui_queue = queue.Queue()
+        self.cancel_event = threading.Event()
+
+        self.dupe_groups = []
+        self.checked_state = {}
+        self.item_to_path = {}
+        self.item_to_group = {}
+        self.scan_signatures = {}
+        self.result_mode = MATCH_EXACT
+        self.hash_cache = ContentHashCache(os.path.join(getattr(app, 'app_dir', '.'), CACHE_DB_NAME))
+        self.phash_cache = PerceptualHashCache(os.path.join(getattr(app, 'app_dir', '.'), CACHE_DB_NAME))
+
+        self.var_scope = tk.StringVar(value="全部檔案")
+        self.var_min_size = tk.StringVar(value="1")
+        self.var_workers = tk.IntVar(value=max(1, (os.cpu_count() or 2) - 1))
+        self.var_match_mode = tk.StringVar(value=MATCH_EXACT)
+        self.var_hash_algo = tk.StringVar(value="pHash")
+        self.var_hash_threshold = tk.IntVar(value=8)
+        self.var_summary = tk.StringVar(value="尚未掃描")
+
+        self._build_ui()
+        self._load_config()
+        self.after(100, self._process_ui_queue)
+
+    def _build_ui(self):
+        main_frame = ttk.LabelFrame(self, text=f"重複檔案搜尋 v{__version__}")
+        main_frame.pack(fill="both", expand=True, padx=5, pady=5)
+
+        option_frame = ttk.LabelFrame(main_frame, text="掃描設定")
+        option_frame.pack(fill="x", padx=10, pady=5)
+        ttk.Label(option_frame, text="範圍:").grid(row=0, column=0, sticky="w", padx=5, pady=2)
+        ttk.Combobox(option_frame, textvariable=self.var_scope, values=["全部檔案", "僅圖片", "僅影片"], state="readonly", width=10).grid(row=0, column=1, sticky="w", padx=5)
+        ttk.Label(option_frame, text="最小檔案 (KB):").grid(row=0, column=2, sticky="w", padx=(10, 5))
+        ttk.Entry(option_frame, textvariable=self.var_min_size, width=8).grid(row=0, column=3, sticky="w")
+        ttk.Label(option_frame, text="平行程序數:").grid(row=0, column=4, sticky="w", padx=(10, 5))
+        tk.Spinbox(option_frame, from_=1, to=max(1, os.cpu_count() or 1), textvariable=self.var_workers, width=4).grid(row=0, column=5, sticky="w")
+        ttk.Button(option_frame, text="儲存設定", command=self._save_config).grid(row=0, column=6, sticky="e", padx=5)
+        ttk.Label(option_frame, text="比對方式:").grid(row=1, column=0, sticky="w", padx=5, pady=2)
+        ttk.Combobox(option_frame, textvariable=self.var_match_mode, values=[MATCH_EXACT, MATCH_SIMILAR], state="readonly", width=10).grid(row=1, column=1, sticky="w", padx=5)
+        ttk.Label(option_frame, text="感知雜湊:").grid(row=1, column=2, sticky="w", padx=(10, 5))
+        ttk.Combobox(option_frame, textvariable=self.var_hash_algo, values=list(PERCEPTUAL_HASH_KINDS), state="readonly", width=7).grid(row=1, column=3, sticky="w")
+        ttk.Label(option_frame, text="距離門檻:").grid(row=1, column=4, sticky="w", padx=(10, 5))
+        tk.Spinbox(option_frame, from_=0, to=32, textvariable=self.var_hash_threshold, width=4).grid(row=1, column=5, sticky="w")
+        ttk.Label(option_frame, text="(64 位元中相異的位元數，建議 4~10；僅用於相似圖片)", foreground="gray").grid(row=1, column=6, sticky="w", padx=5)
+        option_frame.columnconfigure(6, weight=1)
+
+        frame_preview = ttk.LabelFrame(main_frame, text="重複群組 (勾選 = 要處理的多餘副本)")
+        frame_preview.pack(fill="both", expand=True, padx=10, pady=5)
+        tree_container, self.file_tree = create_scrollable_treeview(frame_preview)
+        tree_container.pack(fill="both", expand=True)
+
+        columns = ("checked", "path", "size", "detail")
+        self.file_tree.configure(columns=columns, show="tree headings")
+        self.file_tree.heading("#0", text="群組"); self.file_tree.column("#0", width=150, stretch=False)
+        self.file_tree.heading("checked", text="✔"); self.file_tree.column("checked", width=40, anchor="center", stretch=False)
+        self.file_tree.heading("path", text="檔案路徑"); self.file_tree.column("path", width=380, anchor="w")
+        self.file_tree.heading("size", text="大小 / 可釋放"); self.file_tree.column("size", width=110, anchor="e")
+        self.file_tree.heading("detail", text="解析度 / 距離"); self.file_tree.column("detail", width=130, anchor="w")
+        self.file_tree.tag_configure('checked', foreground='blue')
+        self.file_tree.tag_configure('group', foreground='gray')
+        self.file_tree.bind('<Button-1>', self._on_tree_click)
+        self.file_tree.bind('<space>', self._on_space_press)
+
+        ttk.Label(main_frame, textvariable=self.var_summary).pack(fill="x", padx=10)
+
+        exec_frame = ttk.Frame(main_frame)
+        exec_frame.pack(fill="x", padx=10, pady=10)
+        exec_frame.columnconfigure(1, weight=1)
+        btn_frame = ttk.Frame(exec_frame); btn_frame.grid(row=0, column=0, sticky="w")
+        self.btn_scan = ttk.Button(btn_frame, text="開始掃描", command=self._on_scan); self.btn_scan.pack(side="left")
+        ttk.Button(btn_frame, text="自動勾選", command=self._auto_check).pack(side="left", padx=5)
+        self.btn_delete = ttk.Button(btn_frame, text="刪除勾選", command=lambda: self._on_action("delete")); self.btn_delete.pack(side="left")
+        self.btn_link = ttk.Button(btn_frame, text="以硬連結取代", command=lambda: self._on_action("hardlink")); self.btn_link.pack(side="left", padx=5)
+        self.pbar = ttk.Progressbar(exec_frame); self.pbar.grid(row=0, column=1, sticky="ew", padx=10)
+        self.btn_cancel = ttk.Button(exec_frame, text="取消", command=self._on_cancel, state="disabled"); self.btn_cancel.grid(row=0, column=2)
+
+    def _get_settings_as_dict(self):
+        return {"scope": self.var_scope.get(), "min_size": self.var_min_size.get(), "workers": self.var_workers.get(),
+                "match_mode": self.var_match_mode.get(), "hash_algo": self.var_hash_algo.get(), "hash_threshold": self.var_hash_threshold.get()}
+
+    def _load_config(self):
+        settings = self.app.load_app_config().get(self.pane_name, {})
+        for key, value in settings.items():
+            var_name = f"var_{key}"
+            if hasattr(self, var_name):
+                try: getattr(self, var_name).set(value)
+                except tk.TclError: pass
+
+    def _save_config(self):
+        all_configs = self.app.load_app_config()
+        all_configs[self.pane_name] = self._get_settings_as_dict()
+        self.app.save_app_config(all_configs)
+        self.app.log("DupePane: 設定已儲存。")
+
+    def receive_update(self, data_state):
+        # 資料來源變更後，舊的比對結果已不可信
+        self._clear_results()
+        self.var_summary.set("尚未掃描" if data_state.get("all_files") else "請先從中央拖曳區載入資料夾")
+
+    def _clear_results(self):
+        self.file_tree.delete(*self.file_tree.get_children())
+        self.dupe_groups = []
+        self.checked_state.clear(); self.item_to_path.clear(); self.item_to_group.clear(); self.scan_signatures = {}
+        self.pbar['value'] = 0
+
+    def _set_busy(self, busy):
+        state = "disabled" if busy else "normal"
+        for btn in (self.btn_scan, self.btn_delete, self.btn_link): btn.config(state=state)
+        self.btn_cancel.config(state="normal" if busy else "disabled")
+
+    def _on_scan(self):
+        if self.worker_thread and self.worker_thread.is_alive(): return
+        data_state = getattr(self.app, 'data_state', {})
+        scope = self.var_scope.get()
+        similar = self.var_match_mode.get() == MATCH_SIMILAR
+        if similar:
+            if Image is None or np is None: messagebox.showerror("缺少套件", "相似圖片比對需要 Pillow 與 numpy：pip install Pillow numpy"); return
+            files = data_state.get("image_files", [])
+        elif scope == "僅圖片": files = data_state.get("image_files", [])
+        elif scope == "僅影片": files = data_state.get("video_files", [])
+        else: files = data_state.get("all_files", [])
+        if not files: messagebox.showwarning("注意", "沒有可掃描的檔案。"); return
+        try: min_size = max(1, int(float(self.var_min_size.get() or 0) * 1024))
+        except ValueError: messagebox.showerror("輸入錯誤", "最小檔案大小必須是數字。"); return
+        try: workers = max(1, int(self.var_workers.get()))
+        except (tk.TclError, ValueError): workers = 1
+        try: threshold = max(0, min(32, int(self.var_hash_threshold.get())))
+        except (tk.TclError, ValueError): messagebox.showerror("輸入錯誤", "距離門檻必須是 0~32 的整數。"); return
+
+        self._clear_results(); self._set_busy(True); self.cancel_event.clear()
+        if similar:
+            self.phash_cache.reset_stats()
+            hash_kind = PERCEPTUAL_HASH_KINDS.get(self.var_hash_algo.get(), "phash")
+            self.worker_thread = SimilarImageScanWorker(list(files), data_state.get("file_sizes", {}), min_size, hash_kind, threshold, workers, self.ui_queue, self.cancel_event, self.phash_cache)
+        else:
+            self.hash_cache.reset_stats()
+            self.worker_thread = DuplicateScanWorker(list(files), data_state.get("file_sizes", {}), min_size, workers, self.ui_queue, self.cancel_event, self.hash_cache)
+        self.worker_thread.start()
+
+    def _on_cancel(self):
+        if self.worker_thread and self.worker_thread.is_alive():
+            self.app.log("[重複檔案] 正在傳送取消訊號..."); self.cancel_event.set()
+            self.btn_cancel.config(state="disabled")
+
+    def _show_results(self, groups, signatures):
+        self._clear_results()
+        self.scan_signatures = signatures
+        self.dupe_groups = groups
+        self.result_mode = MATCH_EXACT
+        total_reclaim = 0
+        for g_idx, (size, paths) in enumerate(groups):
+            reclaim = size * (len(paths) - 1); total_reclaim += reclaim
+            parent = self.file_tree.insert("", "end", text=f"#{g_idx + 1} ({len(paths)} 個)", open=True,
+                                           values=("", os.path.dirname(paths[0]), f"可釋放 {format_size(reclaim)}", ""), tags=('group',))
+            for p_idx, path in enumerate(paths):
+                checked = p_idx > 0
+                item_id = self.file_tree.insert(parent, "end", values=("☑" if checked else "☐", path, format_size(size), ""), tags=('checked',) if checked else ())
+                self.checked_state[item_id] = checked
+                self.item_to_path[item_id] = path
+                self.item_to_group[item_id] = g_idx
+        self.var_summary.set(f"共 {len(groups):,} 組重複，{sum(len(p) for _, p in groups):,} 個檔案，可釋放 {format_size(total_reclaim)}")
+
+    def _show_similar_results(self, clusters, signatures):
+        """clusters 為 [[(path, size, width, height, 與保留檔的距離)]]，每組第一張為建議保留者 (解析度最高)。"""
+        self._clear_results()
+        self.scan_signatures = signatures
+        self.dupe_groups = clusters
+        self.result_mode = MATCH_SIMILAR
+        total_reclaim = 0
+        for g_idx, members in enumerate(clusters):
+            reclaim = sum(m[1] for m in members[1:]); total_reclaim += reclaim
+            parent = self.file_tree.insert("", "end", text=f"#{g_idx + 1} ({len(members)} 張)", open=True,
+                                           values=("", os.path.dirname(members[0][0]), f"可釋放 {format_size(reclaim)}", ""), tags=('group',))
+            for p_idx, (path, size, width, height, dist) in enumerate(members):
+                checked = p_idx > 0
+                detail = f"{width}x{height}" + (f" · 距離 {dist}" if p_idx else " · 保留")
+                item_id = self.file_tree.insert(parent, "end", values=("☑" if checked else "☐", path, format_size(size), detail), tags=('checked',) if checked else ())
+                self.checked_state[item_id] = checked
+                self.item_to_path[item_id] = path
+                self.item_to_group[item_id] = g_idx
+        self.var_summary.set(f"共 {len(clusters):,} 組相似圖片，{sum(len(m) for m in clusters):,} 張，刪除建議副本可釋放 {format_size(total_reclaim)}")
+
+    def _auto_check(self):
+        # 每組保留第一個 (完全相同：自然排序最前者；相似圖片：解析度最高者)，其餘勾選
+        for parent in self.file_tree.get_children(''):
+            for idx, item_id in enumerate(self.file_tree.get_children(parent)):
+                self._set_check(item_id, idx > 0)
+
+    def _set_check(self, item_id, state):
+        if item_id not in self.item_to_path: return
+        self.checked_state[item_id] = state
+        values = list(self.file_tree.item(item_id, 'values')); values[0] = '☑' if state else '☐'
+        self.file_tree.item(item_id, values=tuple(values), tags=('checked',) if state else ())
+
+    def _on_tree_click(self, event):
+        region = self.file_tree.identify_region(event.x, event.y)
+        if region != "cell" or self.file_tree.identify_column(event.x) != '#1': return
+        item_id = self.file_tree.identify_row(event.y)
+        if item_id: self._set_check(item_id, not self.checked_state.get(item_id, False))
+
+    def _on_space_press(self, event):
+        for item_id in self.file_tree.selection(): self._set_check(item_id, not self.checked_state.get(item_id, False))
+        return "break"
+
+    def _collect_actions(self):
+        """回傳 [(保留檔, 多餘副本, 保留檔掃描時簽章, 副本掃描時簽章)]；整組都被勾選時略過該組以免刪光。"""
+        by_group = defaultdict(lambda: ([], []))
+        for item_id, path in self.item_to_path.items():
+            keep, extras = by_group[self.item_to_group[item_id]]
+            (extras if self.checked_state.get(item_id, False) else keep).append(path)
+        actions, skipped_groups = [], 0
+        for keep, extras in by_group.values():
+            if not extras: continue
+            if not keep: skipped_groups += 1; continue
+            actions.extend((keep[0], extra, self.scan_signatures.get(keep[0]), self.scan_signatures.get(extra)) for extra in extras)
+        return actions, skipped_groups
+
+    def _on_action(self, mode):
+        if self.worker_thread and self.worker_thread.is_alive(): return
+        if mode == "hardlink" and self.result_mode == MATCH_SIMILAR:
+            messagebox.showwarning("注意", "相似圖片的內容並不相同，不能以硬連結取代，只能刪除。"); return
+        actions, skipped_groups = self._collect_actions()
+        if skipped_groups: self.app.log(f"[重複檔案] ⚠️ 有 {skipped_groups} 組全部被勾選，為安全起見已略過。")
+        if not actions: messagebox.showwarning("注意", "沒有勾選任何可處理的副本。"); return
+        action_text = "永久刪除" if mode == "delete" else "以硬連結取代"
+        if not messagebox.askyesno("確認", f"將{action_text} {len(actions):,} 個多餘副本，確定要繼續嗎？"): return
+        self._set_busy(True); self.cancel_event.clear(); self.pbar['value'] = 0
+        self.worker_thread = DuplicateActionWorker(actions, mode, self.ui_queue, self.cancel_event)
+        self.worker_thread.start()
+
+    def _process_ui_queue(self):
+        try:
+            while not self.ui_queue.empty():
+                kind, payload = self.ui_queue.get_nowait()
+                if kind == "progress": self.pbar['value'] = payload
+                elif kind == "status": self.app.update_status(payload)
+                elif kind == "log": self.app.log(f"[重複檔案] {payload}")
+                elif kind == "result": self._show_results(*payload)
+                elif kind == "similar_result": self._show_similar_results(*payload)
+                elif kind == "done":
+                    status_code, summary = payload
+                    self.app.update_status(f"重複檔案：{'任務已取消' if status_code == 'cancel' else '任務已完成'}")
+                    self.app.log(f"\n{'-'*20}\n[重複檔案] 總結報告:\n{summary}\n{'-'*20}\n")
+                    self._set_busy(False)
+                elif kind == "action_done":
+                    status_code, summary, done_paths = payload
+                    self.app.log(f"\n{'-'*20}\n[重複檔案] 總結報告:\n{summary}\n{'-'*20}\n")
+                    self._remove_processed(done_paths)
+                    self._set_busy(False)
+                    if status_code == "ok" and hasattr(self.app, '_scan_folder'):
+                        threading.Thread(target=self.app._scan_folder, daemon=True).start()
+        finally: self.after(100, self._process_ui_queue)
+
+    def _remove_processed(self, done_paths):
+        # 已處理的副本必須從結果中移除，否則下次操作可能把它當成保留檔
+        done = set(done_paths)
+        parents = set()
+        for item_id, path in list(self.item_to_path.items()):
+            if path not in done: continue
+            parents.add(self.file_tree.parent(item_id))
+            self.file_tree.delete(item_id)
+            del self.item_to_path[item_id]; self.item_to_group.pop(item_id, None); self.checked_state.pop(item_id, None)
+        for parent in parents:
+            # 只剩一個檔案的群組已無重複可處理
+            if not self.file_tree.exists(parent) or len(self.file_tree.get_children(parent)) > 1: continue
+            for item_id in self.file_tree.get_children(parent):
+                self.item_to_path.pop(item_id, None); self.item_to_group.pop(item_id, None); self.checked_state.pop(item_id, None)
+            self.file_tree.delete(parent)
+
+class DuplicateScanWorker(threading.Thread):
+    def __init__(self, files, file_sizes, min_size, max_workers, ui_queue, cancel_event, hash_cache=None):
+        super().__init__(daemon=True)
+        self.files = files
+        self.hash_cache = hash_cache
+        self.signatures = {}
+        self.file_sizes = file_sizes
+        self.min_size = min_size
+        self.max_workers = max_workers
+        self.ui_queue = ui_queue
+        self.cancel_event = cancel_event
+        self.start_time = time.time()
+        self.last_update_time = 0
+        self.bytes_hashed = 0
+
+    def run(self):
+        groups = []
+        try:
+            # STAGE 1: 依大小分桶，並合併指向同一實體的硬連結
+            by_size = defaultdict(list)
+            for path in self.files:
+                size = self.file_sizes.get(path)
+                if size is None:
+                    try: size = os.path.getsize(path)
+                    except OSError: continue
+                if size >= self.min_size: by_size[size].append(path)
+            buckets = []
+            for size, paths in by_size.items():
+                if len(paths) < 2: continue
+                seen_inodes, unique = set(), []
+                for path in paths:
+                    try: st = os.stat(path)
+                    except OSError: continue
+                    key = (st.st_dev, st.st_ino)
+                    if st.st_ino and key in seen_inodes: continue
+                    seen_inodes.add(key); unique.append(path)
+                    self.signatures[path] = (st.st_size, st.st_mtime_ns)
+                if len(unique) > 1: buckets.append((size, unique))
+            candidates = sum(len(p) for _, p in buckets)
+            self.ui_queue.put(("log", f"大小分桶完成：{len(self.files):,} 個檔案中有 {candidates:,} 個候選 ({len(buckets):,} 組相同大小)"))
+
+            with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+                # STAGE 2: 檔頭/檔尾部分雜湊
+                buckets = self._refine(executor, buckets, hash_file_partial, "部分雜湊", 0, 40)
+                # STAGE 3: 完整雜湊 (小檔案的部分雜湊已涵蓋全檔，可直接略過)
+                small = [(s, p) for s, p in buckets if s <= PARTIAL_CHUNK * 2]
+                large = [(s, p) for s, p in buckets if s > PARTIAL_CHUNK * 2]
+                groups = small + self._refine(executor, large, hash_file_full, "完整雜湊", 40, 100)
+
+            groups = [(size, sorted(paths, key=natural_sort_key)) for size, paths in groups]
+            groups.sort(key=lambda g: g[0] * (len(g[1]) - 1), reverse=True)
+        except Exception as e:
+            self.ui_queue.put(("log", f"❌ 掃描發生錯誤: {e}"))
+        finally:
+            if self.hash_cache: self.hash_cache.flush()
+
+        self.ui_queue.put(("progress", 100))
+        self.ui_queue.put(("result", (groups, dict(self.signatures))))
+        duration = time.time() - self.start_time
+        reclaim = sum(size * (len(paths) - 1) for size, paths in groups)
+        summary = (
+            f"掃描檔案: {len(self.files):,}\n"
+            f"重複群組: {len(groups):,}\n"
+            f"可釋放空間: {format_size(reclaim)}\n"
+            f"實際讀取: {format_size(self.bytes_hashed)}\n"
+            f"總花費時間: {duration:.2f} 秒"
+        )
+        if self.hash_cache:
+            stats = self.hash_cache.stats()
+            summary += f"\n雜湊快取: 命中 {stats['hits']:,} / 未命中 {stats['misses']:,} ({stats['hit_rate']:.0%})"
+        self.ui_queue.put(("done", ("cancel" if self.cancel_event.is_set() else "ok", summary)))
+
+    def _refine(self, executor, buckets, hash_func, label, p_start, p_end):
+        """將每個候選桶以 hash_func 再細分，只保留仍有兩個以上成員的群組。"""
+        jobs = [(path, size) for size, paths in buckets for path in paths]
+        digests = self._hash_all(executor, jobs, hash_func, label, p_start, p_end)
+        refined = []
+        for size, paths in buckets:
+            by_digest = defaultdict(list)
+            for path in paths:
+                if path in digests: by_digest[digests[path]].append(path)
+            refined.extend((size, same) for same in by_digest.values() if len(same) > 1)
+        return refined
+
+    def _hash_all(self, executor, jobs, hash_func, label, p_start, p_end):
+        results, pending = {}, {}
+        job_iter = iter(jobs)
+        total, done = len(jobs), 0
+        max_pending = self.max_workers * 4
+        is_partial = hash_func is hash_file_partial
+        kind = "partial" if is_partial else "full"
+        while True:
+            # 取消時停止送出新工作，但仍等待進行中的工作結束
+            while not self.cancel_event.is_set() and len(pending) < max_pending:
+                job = next(job_iter, None)
+                if job is None: break
+                path = job[0]
+                cached = self.hash_cache.get_digest(path, self.signatures.get(path), kind) if self.hash_cache else None
+                if cached is not None:
+                    results[path] = cached; done += 1; continue
+                pending[executor.submit(hash_func, *job)] = job
+            if not pending: break
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                path, size = pending.pop(fut)
+                try:
+                    results[path] = fut.result()
+                    self.bytes_hashed += min(size, PARTIAL_CHUNK * 2) if is_partial else size
+                    if self.hash_cache: self.hash_cache.put_digest(path, self.signatures.get(path), kind, results[path])
+                except Exception as e: self.ui_queue.put(("log", f"無法讀取 {os.path.basename(path)}: {e}"))
+                done += 1
+            self._update_status(label, done, total, p_start, p_end)
+        self._update_status(label, done, total, p_start, p_end)
+        return results
+
+    def _update_status(self, label, current, total, p_start, p_end):
+        now = time.time()
+        if now - self.last_update_time > 0.2 or current == total:
+            self.last_update_time = now
+            progress = p_start + (p_end - p_start) * current / total if total else p_end
+            self.ui_queue.put(("progress", int(progress)))
+            status = f"重複檔案：{label}中... ({current:,}/{total:,})"
+            if self.hash_cache:
+                stats = self.hash_cache.stats()
+                status += f" | 快取命中 {stats['hits']:,} / 未命中 {stats['misses']:,}"
+            self.ui_queue.put(("status", status))
+
+class SimilarImageScanWorker(DuplicateScanWorker):
+    """
+    相似圖片掃描：在子程序中以 draft 解碼計算感知雜湊，再以多重索引雜湊表找出 Hamming 距離不超過門檻的配對，
+    並以 union-find 合併為群組 (相似關係具遞移性，鏈狀相似的圖片會被併入同一組)。
+    """
+    def __init__(self, files, file_sizes, min_size, hash_kind, threshold, max_workers, ui_queue, cancel_event, hash_cache=None):
+        super().__init__(files, file_sizes, min_size, max_workers, ui_queue, cancel_event, hash_cache)
+        self.hash_kind = hash_kind
+        self.threshold = threshold
+
+    def run(self):
+        clusters, hashes = [], {}
+        try:
+            jobs = []
+            for path in self.files:
+                size = self.file_sizes.get(path)
+                if size is None:
+                    try: size = os.path.getsize(path)
+                    except OSError: continue
+                if size >= self.min_size: jobs.append((path, size))
+            with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+                hashes = self._hash_images(executor, jobs, 0, 90)
+            if not self.cancel_event.is_set(): clusters = self._cluster(hashes, dict(jobs))
+        except Exception as e:
+            self.ui_queue.put(("log", f"❌ 掃描發生錯誤: {e}"))
+        finally:
+            if self.hash_cache: self.hash_cache.flush()
+
+        self.ui_queue.put(("progress", 100))
+        self.ui_queue.put(("similar_result", (clusters, dict(self.signatures))))
+        reclaim = sum(m[1] for members in clusters for m in members[1:])
+        summary = (
+            f"掃描圖片: {len(self.files):,} (完成雜湊 {len(hashes):,})\n"
+            f"相似群組: {len(clusters):,} (門檻 {self.threshold} 位元，{self.hash_kind})\n"
+            f"刪除建議副本可釋放: {format_size(reclaim)}\n"
+            f"解碼圖片: {format_size(self.bytes_hashed)}\n"
+            f"總花費時間: {time.time() - self.start_time:.2f} 秒"
+        )
+        if self.hash_cache:
+            stats = self.hash_cache.stats()
+            summary += f"\n雜湊快取: 命中 {stats['hits']:,} / 未命中 {stats['misses']:,} ({stats['hit_rate']:.0%})"
+        self.ui_queue.put(("done", ("cancel" if self.cancel_event.is_set() else "ok", summary)))
+
+    def _hash_images(self, executor, jobs, p_start, p_end):
+        results, pending = {}, {}
+        job_iter = iter(jobs)
+        total, done = len(jobs), 0
+        max_pending = self.max_workers * 4
+        while True:
+            while not self.cancel_event.is_set() and len(pending) < max_pending:
+                job = next(job_iter, None)
+                if job is None: break
+                path = job[0]
+                signature = self.signatures[path] = file_signature(path)
+                if signature is None: done += 1; continue
+                cached = self.hash_cache.get(path, signature) if self.hash_cache else None
+                if cached and cached.get("version") == PERCEPTUAL_HASH_VERSION:
+                    results[path] = cached; done += 1; continue
+                pending[executor.submit(compute_perceptual_hashes, path)] = job
+            if not pending: break
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                path, size = pending.pop(fut)
+                try:
+                    results[path] = fut.result()
+                    self.bytes_hashed += size
+                    if self.hash_cache: self.hash_cache.put(path, self.signatures.get(path), results[path])
+                except Exception as e: self.ui_queue.put(("log", f"無法解碼 {os.path.basename(path)}: {e}"))
+                done += 1
+            self._update_status("感知雜湊", done, total, p_start, p_end)
+        self._update_status("感知雜湊", done, total, p_start, p_end)
+        return results
+
+    def _cluster(self, hashes, sizes):
+        paths = sorted(hashes, key=natural_sort_key)
+        values = [int(hashes[p][self.hash_kind], 16) for p in paths]
+        parent = list(range(len(paths)))
+        def find(i):
+            while parent[i] != i: parent[i] = parent[parent[i]]; i = parent[i]
+            return i
+        self._update_status("相似比對", 0, len(paths), 90, 100)
+        for i, j in find_similar_pairs(values, self.threshold).tolist(): parent[find(i)] = find(j)
+        by_root = defaultdict(list)
+        for idx in range(len(paths)): by_root[find(idx)].append(idx)
+
+        clusters = []
+        for members in by_root.values():
+            if len(members) < 2: continue
+            # 解析度最高者優先保留，其次為檔案較大者
+            members.sort(key=lambda i: (-hashes[paths[i]]["width"] * hashes[paths[i]]["height"], -sizes[paths[i]], natural_sort_key(paths[i])))
+            keep_value = values[members[0]]
+            clusters.append([(paths[i], sizes[paths[i]], hashes[paths[i]]["width"], hashes[paths[i]]["height"], hamming_distance(keep_value, values[i])) for i in members])
+        clusters.sort(key=lambda members: sum(m[1] for m in members[1:]), reverse=True)
+        return clusters
+
+class DuplicateActionWorker(threading.Thread):
+    def __init__(self, actions, mode, ui_queue, cancel_event):
+        super().__init__(daemon=True)
+        self.actions = actions
+        self.mode = mode
+        self.ui_queue = ui_queue
+        self.cancel_event = cancel_event
+
+    def run(self):
+        start_time = time.time()
+        total = len(self.actions)
+        done_paths, freed, changed = [], 0, 0
+        for i, (keep_path, extra_path, keep_sig, extra_sig) in enumerate(self.actions):
+            if self.cancel_event.is_set(): break
+            try:
+                # 保留檔必須仍存在，且兩者皆與掃描時相同 (大小/修改時間)，否則略過這一對
+                if keep_sig is None or extra_sig is None or file_signature(keep_path) != tuple(keep_sig) or file_signature(extra_path) != tuple(extra_sig):
+                    changed += 1
+                    self.ui_queue.put(("log", f"⚠️ 略過: {os.path.basename(extra_path)} - 保留檔不存在或檔案在掃描後已變更，請重新掃描"))
+                    continue
+                size = extra_sig[0]
+                if self.mode == "delete":
+                    os.chmod(extra_path, stat.S_IWRITE); os.remove(extra_path)
+                else:
+                    if os.path.samefile(keep_path, extra_path): continue
+                    # 先建立暫存連結再以 os.replace 原子替換，失敗時原檔不受影響
+                    temp_link = f"{extra_path}.linktmp"
+                    os.link(keep_path, temp_link)
+                    try: os.replace(temp_link, extra_path)
+                    except OSError:
+                        os.remove(temp_link); raise
+                done_paths.append(extra_path); freed += size
+            except Exception as e:
+                self.ui_queue.put(("log", f"❌ 失敗: {os.path.basename(extra_path)} - {e}"))
+            finally:
+                self.ui_queue.put(("progress", int((i + 1) * 100 / total)))
+
+        action_text = "刪除" if self.mode == "delete" else "硬連結取代"
+        summary = (
+            f"{action_text}: {len(done_paths):,} / {total:,} 個副本\n"
+            f"掃描後已變更而略過: {changed:,}\n"
+            f"釋放空間: {format_size(freed)}\n"
+            f"總花費時間: {time.time() - start_time:.2f} 秒"
+        )
+        self.ui_queue.put(("action_done", ("cancel" if self.cancel_event.is_set() else "ok", summary, done_paths)))
+
+if __name__ == '__main__':
+    root = ensure_tk_with_dnd()
+    root.title("Duplicate Finder Pane - Standalone Test")
+    root.geometry("760x700")
+
+    class MockApp:
+        def __init__(self):
+            self.root = root; self.app_dir = '.'
+            self.data_state = {"root_folder": "", "all_files": [], "image_files": [], "video_files": [], "file_sizes": {}}
+            self.pane_instance = None
+        def log(self, msg): print(f"[MOCK LOG] {msg}")
+        def update_status(self, text): print(f"[MOCK STATUS] {text}")
+        def load_app_config(self): return {}
+        def save_app_config(self, cfg): print(f"[MOCK] Saving config: {cfg}")
+        def _on_drop(self, event):
+            folder = event.data.strip("{}")
+            if os.path.isdir(folder):
+                self.data_state["root_folder"] = folder
+                threading.Thread(target=self._scan_folder, daemon=True).start()
+        def _scan_folder(self):
+            all_files, file_sizes = [], {}
+            for r, _, f_list in os.walk(self.data_state["root_folder"]):
+                for f in f_list:
+                    fp = os.path.join(r, f); all_files.append(fp)
+                    try: file_sizes[fp] = os.path.getsize(fp)
+                    except OSError: pass
+            self.data_state.update({
+                "all_files": all_files, "file_sizes": file_sizes,
+                "image_files": [f for f in all_files if os.path.splitext(f)[1].lower() in IMAGE_EXTS],
+                "video_files": [f for f in all_files if os.path.splitext(f)[1].lower() in VIDEO_EXTS],
+            })
+            self.root.after(0, self._notify_panes)
+        def _notify_panes(self):
+            if self.pane_instance: self.pane_instance.receive_update(self.data_state)
+
+    mock_app = MockApp()
+    frame_drag = tk.LabelFrame(root, text="[MOCK] Drop Zone for Standalone Test")
+    frame_drag.pack(fill="x", padx=10, pady=10)
+    label_drag = tk.Label(frame_drag, text="📂 Drop a folder here to test", height=4)
+    label_drag.pack(fill="x", expand=True)
+    try:
+        label_drag.drop_target_register(DND_FILES)
+        label_drag.dnd_bind("<<Drop>>", mock_app._on_drop)
+    except: pass
+
+    pane = DuplicateFinderPane(root, mock_app)
+    pane.pack(fill="both", expand=True)
+    mock_app.pane_instance = pane
+    root.mainloop()
@@ -0,0 +1,250 @@
+# file_cache.py
+# version: 1.4.1 (Shared Cache Connection)
+__version__ = "1.4.1"
+
+import os
+import json
+import hashlib
+import sqlite3
+import threading
+import time
+
+# 放在 app_dir 下的共用快取資料庫
+CACHE_DB_NAME = "FilePros.cache.sqlite3"
+
+# 每個輸出資料夾內記錄轉換來源與設定指紋的清單檔
+MANIFEST_NAME = ".filepros_manifest.json"
+
+# 部分雜湊只讀取檔頭與檔尾各 64KB；小於兩倍區塊的檔案，部分雜湊即等同完整雜湊
+PARTIAL_CHUNK = 64 * 1024
+FULL_CHUNK = 1024 * 1024
+
+# --- 雜湊函式可能在子程序中執行，必須維持在模組頂層 ---
+def hash_file_partial(path, size):
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        h.update(f.read(PARTIAL_CHUNK))
+        if size > PARTIAL_CHUNK * 2:
+            f.seek(-PARTIAL_CHUNK, os.SEEK_END); h.update(f.read(PARTIAL_CHUNK))
+        elif size > PARTIAL_CHUNK:
+            h.update(f.read())
+    return h.hexdigest()
+
+def hash_file_full(path, size=None):
+    h = hashlib.blake2b(digest_size=32)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(FULL_CHUNK), b""): h.update(chunk)
+    return h.hexdigest()
+
+def file_signature(path):
+    """以 (size, mtime_ns) 作為檔案簽章；檔案不存在時回傳 None。"""
+    try: st = os.stat(path)
+    except OSError: return None
+    return (st.st_size, st.st_mtime_ns)
+
+def _cache_key(path):
+    return os.path.normcase(os.path.abspath(path))
+
+class _SharedConnection:
+    """
+    同一資料庫檔的所有快取共用一條連線與一把鎖：SQLite 同時只允許一個寫入者，
+    各自連線時未提交的交易會讓其他快取的寫入一直等到逾時。寫入依筆數或時間提交，交易不會長時間開著。
+    """
+    def __init__(self, db_path):
+        self.lock = threading.Lock()
+        self.refs = 0
+        self.pending_writes = 0
+        self.first_pending = 0.0
+        try:
+            self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=5)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+        except sqlite3.Error:
+            # 程式目錄不可寫入時退回記憶體快取，功能照常只是不會保留
+            self.conn = sqlite3.connect(":memory:", check_same_thread=False)
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS file_cache ("
+            "namespace TEXT NOT NULL, path TEXT NOT NULL, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, "
+            "payload TEXT NOT NULL, PRIMARY KEY (namespace, path))"
+        )
+        self.conn.commit()
+
+    def commit(self):
+        # 呼叫端需持有 lock；提交失敗 (例如其他程序長時間鎖住) 時放棄這批快取寫入
+        if not self.pending_writes: return
+        try: self.conn.commit()
+        except sqlite3.Error:
+            try: self.conn.rollback()
+            except sqlite3.Error: pass
+        self.pending_writes = 0
+
+_connections = {}
+_connections_lock = threading.Lock()
+
+def _acquire_connection(db_path):
+    key = _cache_key(db_path)
+    with _connections_lock:
+        shared = _connections.get(key)
+        if shared is None: shared = _connections[key] = _SharedConnection(db_path)
+        shared.refs += 1
+        return shared
+
+def _release_connection(db_path):
+    key = _cache_key(db_path)
+    with _connections_lock:
+        shared = _connections.get(key)
+        if shared is None: return
+        shared.refs -= 1
+        if shared.refs <= 0:
+            del _connections[key]
+            with shared.lock: shared.commit(); shared.conn.close()
+
+class SignatureCache:
+    """
+    以 (path, size, mtime_ns) 為鍵的持久化快取 (SQLite)。
+    簽章不符時視為未命中，因此檔案變更後會自動失效。可跨執行緒共用；同一資料庫檔的各快取共用一條連線。
+    快取讀寫失敗時只視為未命中或放棄寫入，不會拋出例外。
+    """
+    COMMIT_EVERY = 500
+    COMMIT_INTERVAL = 1.0
+
+    def __init__(self, db_path, namespace):
+        self.db_path = db_path
+        self.namespace = namespace
+        self.hits = 0
+        self.misses = 0
+        self._shared = _acquire_connection(db_path)
+        self._conn = self._shared.conn
+        self._lock = self._shared.lock
+
+    def get(self, path, signature=None):
+        if signature is None: signature = file_signature(path)
+        if signature is None:
+            with self._lock: self.misses += 1
+            return None
+        with self._lock:
+            try:
+                row = self._conn.execute(
+                    "SELECT size, mtime_ns, payload FROM file_cache WHERE namespace=? AND path=?",
+                    (self.namespace, _cache_key(path))
+                ).fetchone()
+            except sqlite3.Error: row = None
+            if row and (row[0], row[1]) == tuple(signature):
+                self.hits += 1
+                return json.loads(row[2])
+            self.misses += 1
+            return None
+
+    def put(self, path, signature, payload):
+        if signature is None: return
+        shared = self._shared
+        with self._lock:
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO file_cache (namespace, path, size, mtime_ns, payload) VALUES (?, ?, ?, ?, ?)",
+                    (self.namespace, _cache_key(path), signature[0], signature[1], json.dumps(payload, ensure_ascii=False))
+                )
+            except sqlite3.Error: return
+            now = time.time()
+            if not shared.pending_writes: shared.first_pending = now
+            shared.pending_writes += 1
+            if shared.pending_writes >= self.COMMIT_EVERY or now - shared.first_pending >= self.COMMIT_INTERVAL: shared.commit()
+
+    def flush(self):
+        with self._lock: self._shared.commit()
+
+    def reset_stats(self):
+        with self._lock: self.hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "hit_rate": (self.hits / total) if total else 0.0}
+
+    def close(self):
+        _release_connection(self.db_path)
+
+class ContentHashCache(SignatureCache):
+    """內容雜湊服務：同一檔案可同時快取 partial 與 full 兩種雜湊，未變更的檔案不會再被讀取。"""
+    def __init__(self, db_path):
+        super().__init__(db_path, "content_hash")
+
+    def get_digest(self, path, signature, kind):
+        payload = self.get(path, signature)
+        digest = payload.get(kind) if payload else None
+        if payload and digest is None:
+            # 有紀錄但缺少此種雜湊，修正命中數以反映實際需要重新讀檔
+            with self._lock: self.hits -= 1; self.misses += 1
+        return digest
+
+    def put_digest(self, path, signature, kind, digest):
+        if signature is None: return
+        with self._lock:
+            try:
+                row = self._conn.execute(
+                    "SELECT size, mtime_ns, payload FROM file_cache WHERE namespace=? AND path=?",
+                    (self.namespace, _cache_key(path))
+                ).fetchone()
+            except sqlite3.Error: row = None
+        payload = json.loads(row[2]) if row and (row[0], row[1]) == tuple(signature) else {}
+        payload[kind] = digest
+        self.put(path, signature, payload)
+
+    def digest(self, path, kind="full"):
+        """同步取得雜湊：命中時不讀檔，未命中才計算並寫回快取。"""
+        signature = file_signature(path)
+        if signature is None: raise FileNotFoundError(path)
+        cached = self.get_digest(path, signature, kind)
+        if cached is not None: return cached
+        digest = hash_file_partial(path, signature[0]) if kind == "partial" else hash_file_full(path)
+        self.put_digest(path, signature, kind, digest)
+        return digest
+
+class ImageMetaCache(SignatureCache):
+    """圖像中繼資料快取：尺寸、格式、色彩模式、EXIF 方向與拍攝日期，檔案變更後自動失效。"""
+    def __init__(self, db_path):
+        super().__init__(db_path, "image_meta")
+
+class PerceptualHashCache(SignatureCache):
+    """感知雜湊快取：aHash / dHash / pHash 與轉正後尺寸，檔案變更後自動失效。"""
+    def __init__(self, db_path):
+        super().__init__(db_path, "perceptual_hash")
+
+class VideoMetaCache(SignatureCache):
+    """影片中繼資料快取 (ffprobe)：長度、容器、編碼、解析度、FPS、位元率與音軌，檔案變更後自動失效。"""
+    def __init__(self, db_path):
+        super().__init__(db_path, "ffprobe")
+
+class OutputManifest:
+    """
+    單一輸出資料夾的轉換紀錄 (JSON)：輸出檔名 -> 來源路徑、來源簽章、設定指紋、輸出簽章。
+    來源、設定與輸出三者皆未變更時，視為輸出已是最新。非執行緒安全，應由單一執行緒使用。
+    """
+    def __init__(self, out_dir):
+        self.path = os.path.join(out_dir, MANIFEST_NAME)
+        self.dirty = False
+        try:
+            with open(self.path, "r", encoding="utf-8") as f: self.entries = json.load(f)
+            if not isinstance(self.entries, dict): self.entries = {}
+        except (OSError, ValueError): self.entries = {}
+
+    def is_up_to_date(self, output_path, src_path, settings_fp):
+        entry = self.entries.get(os.path.basename(output_path))
+        if not entry or entry.get("settings_fp") != settings_fp or entry.get("src") != _cache_key(src_path): return False
+        src_sig, out_sig = file_signature(src_path), file_signature(output_path)
+        return src_sig is not None and out_sig is not None and list(src_sig) == entry.get("src_sig") and list(out_sig) == entry.get("out_sig")
+
+    def record(self, output_path, src_path, settings_fp):
+        src_sig, out_sig = file_signature(src_path), file_signature(output_path)
+        if src_sig is None or out_sig is None: return
+        self.entries[os.path.basename(output_path)] = {"src": _cache_key(src_path), "src_sig": list(src_sig), "settings_fp": settings_fp, "out_sig": list(out_sig)}
+        self.dirty = True
+
+    def save(self):
+        if not self.dirty: return
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f: json.dump(self.entries, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+            self.dirty = False
+        except OSError: pass
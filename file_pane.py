@@ -1,16 +1,18 @@
 # file_pane.py
-# version: 2.9.6 (Perfect Alchemy Edition)
-__version__ = "2.9.6"
+# version: 2.10.0 (Plan Export/Import)
+__version__ = "2.10.0"
 
 import os
 import shutil
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog
 from tkinterdnd2 import DND_FILES
 import threading
 import queue
 from collections import defaultdict
 
+from plan_io import PLAN_FILETYPES, write_plan, read_plan, validate_plan
+
 # 嘗試載入 utils，若失敗則使用備援定義 (確保獨立執行與主程式的一致性)
 try:
     from utils import IMAGE_EXTS, VIDEO_EXTS, natural_sort_key, ensure_tk_with_dnd, create_scrollable_treeview
@@ -193,6 +195,8 @@ class FileOrganizerPane(ttk.Frame):
         ttk.Button(btn_frame, text="✔", command=self._toggle_selection_check, width=3).pack(side="left")
         ttk.Button(btn_frame, text="全選", command=self._select_all).pack(side="left", padx=5)
         ttk.Button(btn_frame, text="清除", command=self._clear_all).pack(side="left")
+        ttk.Button(btn_frame, text="匯出計畫", command=self._export_plan).pack(side="left", padx=(10, 0))
+        ttk.Button(btn_frame, text="匯入計畫", command=self._import_plan).pack(side="left", padx=(5, 0))
         self.pbar = ttk.Progressbar(exec_frame); self.pbar.grid(row=0, column=1, sticky="ew", padx=10)
         self.btn_execute = ttk.Button(exec_frame, text="開始處理", command=self.execute_file_organizer); self.btn_execute.grid(row=0, column=2, padx=(10, 0))
         self.btn_cancel = ttk.Button(exec_frame, text="取消", command=self._on_cancel, state="disabled"); self.btn_cancel.grid(row=0, column=3, padx=(5, 0))
@@ -365,15 +369,47 @@ class FileOrganizerPane(ttk.Frame):
                 final_path = final_path_map.get(item_id, src_path)
                 if src_path.lower() != final_path.lower(): tasks_to_run.append((src_path, final_path))
         if not tasks_to_run: messagebox.showinfo("提示", "沒有需要處理的檔案變更。"); return
+        mode = self.var_mode.get()
+        self._start_worker(tasks_to_run, is_flatten_mode=mode in ["flatten", "both"])
+
+    def _start_worker(self, tasks_to_run, is_flatten_mode):
         self.btn_execute.config(state="disabled"); self.btn_cancel.config(state="normal")
         self.pbar['value'] = 0; self.cancel_event.clear()
         root_folder = getattr(self.app, 'data_state', {}).get("root_folder")
-        
-        mode = self.var_mode.get()
-        is_flatten_mode = mode in ["flatten", "both"]
         self.worker_thread = FileOrganizerWorker(tasks_to_run, is_flatten_mode, root_folder, self.ui_queue, self.cancel_event, self.app)
         self.worker_thread.start()
 
+    def iter_plan(self):
+        """以產生器逐筆輸出 (src, dst, checked)，供計畫匯出使用。"""
+        final_path_map = self._calculate_final_paths()
+        for i, item_id in enumerate(self.file_tree.get_children('')):
+            src_path = self.file_list_to_process[i]
+            yield src_path, final_path_map.get(item_id, src_path), self.checked_state.get(item_id, False)
+
+    def _export_plan(self):
+        if not self.file_list_to_process: messagebox.showwarning("注意", "沒有可匯出的計畫。"); return
+        path = filedialog.asksaveasfilename(title="匯出檔案整理計畫", defaultextension=".csv", filetypes=PLAN_FILETYPES)
+        if not path: return
+        try: count = write_plan(path, self.iter_plan())
+        except OSError as e: messagebox.showerror("錯誤", f"無法寫入計畫檔: {e}"); return
+        if hasattr(self.app, 'log'): self.app.log(f"FilePane: 已匯出 {count} 筆計畫至 {path}")
+
+    def _import_plan(self):
+        if self.worker_thread and self.worker_thread.is_alive(): messagebox.showwarning("注意", "目前已有任務執行中。"); return
+        path = filedialog.askopenfilename(title="匯入檔案整理計畫", filetypes=PLAN_FILETYPES)
+        if not path: return
+        known_files = getattr(self.app, 'data_state', {}).get("all_files", [])
+        try: tasks_to_run, errors = validate_plan(read_plan(path), known_files)
+        except (OSError, ValueError) as e: messagebox.showerror("錯誤", f"無法讀取計畫檔: {e}"); return
+        if errors:
+            if hasattr(self.app, 'log'):
+                for err in errors[:50]: self.app.log(f"[計畫驗證] {err}")
+            messagebox.showerror("計畫驗證失敗", f"共發現 {len(errors)} 個問題，詳情請見日誌。"); return
+        if not tasks_to_run: messagebox.showinfo("提示", "計畫中沒有需要處理的檔案變更。"); return
+        if not messagebox.askyesno("確認", f"將依計畫移動/重新命名 {len(tasks_to_run)} 個檔案，確定要繼續嗎？"): return
+        # 匯入的計畫不自動清理空目錄，避免刪除計畫以外的資料夾
+        self._start_worker(tasks_to_run, is_flatten_mode=False)
+
     def _on_select_all_images_toggle(self):
         is_checked = self.var_select_all_images.get();
         for var in self.img_ext_vars.values(): var.set(is_checked)
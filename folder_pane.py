@@ -1,15 +1,16 @@
 # folder_pane.py
-# version: 2.2.0
-__version__ = "2.2.0"
+# version: 2.3.0 (Plan Export/Import)
+__version__ = "2.3.0"
 
 import os
 import threading
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog
 from tkinterdnd2 import DND_FILES
 import queue
 
 from utils import ensure_tk_with_dnd, natural_sort_key, create_scrollable_treeview
+from plan_io import PLAN_FILETYPES, write_plan, read_plan, validate_plan
 
 class FolderOrganizerPane(ttk.Frame):
     def __init__(self, parent, app):
@@ -69,13 +70,16 @@ class FolderOrganizerPane(ttk.Frame):
 
         exec_frame = ttk.Frame(main_frame)
         exec_frame.pack(fill="x", padx=10, pady=10)
-        exec_frame.columnconfigure(0, weight=1)
+        exec_frame.columnconfigure(1, weight=1)
+        btn_frame = ttk.Frame(exec_frame); btn_frame.grid(row=0, column=0, sticky="w")
+        ttk.Button(btn_frame, text="匯出計畫", command=self._export_plan).pack(side="left")
+        ttk.Button(btn_frame, text="匯入計畫", command=self._import_plan).pack(side="left", padx=(5, 0))
         self.pbar = ttk.Progressbar(exec_frame)
-        self.pbar.grid(row=0, column=0, sticky="ew")
+        self.pbar.grid(row=0, column=1, sticky="ew", padx=(10, 0))
         self.btn_execute = ttk.Button(exec_frame, text="開始處理", command=self.execute_folder_rename, state="disabled")
-        self.btn_execute.grid(row=0, column=1, padx=(10, 0))
+        self.btn_execute.grid(row=0, column=2, padx=(10, 0))
         self.btn_cancel = ttk.Button(exec_frame, text="取消", command=self._on_cancel, state="disabled")
-        self.btn_cancel.grid(row=0, column=2, padx=(5, 0))
+        self.btn_cancel.grid(row=0, column=3, padx=(5, 0))
         
     def _get_settings_as_dict(self):
         return {
@@ -116,24 +120,50 @@ class FolderOrganizerPane(ttk.Frame):
         self.folder_list_to_process.clear()
         
         root_folder = data_state["root_folder"]
-        all_folders_to_preview = sorted(data_state["folders"], key=lambda p: natural_sort_key(os.path.basename(p)))
+        for folder_path, new_path, changed in self.iter_plan(data_state):
+            relative_path = os.path.relpath(folder_path, root_folder)
+            self.folder_tree.insert("", "end", values=(relative_path, os.path.basename(new_path)))
+            if changed: self.folder_list_to_process.append((folder_path, new_path))
 
-        for folder_path in all_folders_to_preview:
+    def _new_folder_name(self, folder_name):
+        new_name = folder_name
+        if self.var_add_string.get():
+            if self.var_add_position.get() == "prefix": new_name = f"{self.var_add_string.get()}{new_name}"
+            else: new_name = f"{new_name}{self.var_add_string.get()}"
+        if self.var_search_string.get():
+            if self.var_search_mode.get() == "delete": new_name = new_name.replace(self.var_search_string.get(), "")
+            elif self.var_search_mode.get() == "replace": new_name = new_name.replace(self.var_search_string.get(), self.var_replace_string.get())
+        return new_name
+
+    def iter_plan(self, data_state=None):
+        """以產生器逐筆輸出 (src, dst, changed)，預覽與計畫匯出共用。"""
+        if data_state is None: data_state = getattr(self.app, 'data_state', {})
+        for folder_path in sorted(data_state.get("folders", []), key=lambda p: natural_sort_key(os.path.basename(p))):
             folder_name = os.path.basename(folder_path)
-            new_name = folder_name
-            if self.var_add_string.get():
-                if self.var_add_position.get() == "prefix": new_name = f"{self.var_add_string.get()}{new_name}"
-                else: new_name = f"{new_name}{self.var_add_string.get()}"
-            if self.var_search_string.get():
-                if self.var_search_mode.get() == "delete": new_name = new_name.replace(self.var_search_string.get(), "")
-                elif self.var_search_mode.get() == "replace": new_name = new_name.replace(self.var_search_string.get(), self.var_replace_string.get())
-            
-            relative_path = os.path.relpath(folder_path, data_state["root_folder"])
-            self.folder_tree.insert("", "end", values=(relative_path, new_name))
+            new_name = self._new_folder_name(folder_name)
+            yield folder_path, os.path.join(os.path.dirname(folder_path), new_name), folder_name != new_name
+
+    def _export_plan(self):
+        if not getattr(self.app, 'data_state', {}).get("folders"): messagebox.showwarning("注意", "沒有可匯出的計畫。"); return
+        path = filedialog.asksaveasfilename(title="匯出資料夾整理計畫", defaultextension=".csv", filetypes=PLAN_FILETYPES)
+        if not path: return
+        try: count = write_plan(path, self.iter_plan())
+        except OSError as e: messagebox.showerror("錯誤", f"無法寫入計畫檔: {e}"); return
+        self.app.log(f"FolderPane: 已匯出 {count} 筆計畫至 {path}")
 
-            if folder_name != new_name:
-                parent_dir = os.path.dirname(folder_path)
-                self.folder_list_to_process.append((folder_path, os.path.join(parent_dir, new_name)))
+    def _import_plan(self):
+        if self.worker_thread and self.worker_thread.is_alive(): messagebox.showwarning("注意", "目前已有任務執行中。"); return
+        path = filedialog.askopenfilename(title="匯入資料夾整理計畫", filetypes=PLAN_FILETYPES)
+        if not path: return
+        known_folders = getattr(self.app, 'data_state', {}).get("folders", [])
+        try: folder_list, errors = validate_plan(read_plan(path), known_folders)
+        except (OSError, ValueError) as e: messagebox.showerror("錯誤", f"無法讀取計畫檔: {e}"); return
+        if errors:
+            for err in errors[:50]: self.app.log(f"[計畫驗證] {err}")
+            messagebox.showerror("計畫驗證失敗", f"共發現 {len(errors)} 個問題，詳情請見日誌。"); return
+        if not folder_list: messagebox.showinfo("提示", "計畫中沒有需要重新命名的資料夾。"); return
+        if not messagebox.askyesno("確認", f"將依計畫重新命名 {len(folder_list)} 個資料夾，確定要繼續嗎？"): return
+        self._start_worker(folder_list)
 
     def update_folder_button_state(self):
         add_text = self.var_add_string.get().strip()
@@ -143,11 +173,13 @@ class FolderOrganizerPane(ttk.Frame):
             
     def execute_folder_rename(self):
         if not self.folder_list_to_process: messagebox.showwarning("注意", "沒有可重新命名的資料夾。"); return
-        
+        self._start_worker(self.folder_list_to_process.copy())
+
+    def _start_worker(self, folder_list):
         self.btn_execute.config(state="disabled"); self.btn_cancel.config(state="normal")
         self.pbar['value'] = 0; self.cancel_event.clear()
 
-        self.worker_thread = FolderOrganizerWorker(self.folder_list_to_process.copy(), self.ui_queue, self.cancel_event, self.app)
+        self.worker_thread = FolderOrganizerWorker(folder_list, self.ui_queue, self.cancel_event, self.app)
         self.worker_thread.start()
 
     def _on_cancel(self):
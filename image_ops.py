@@ -0,0 +1,651 @@
+# image_ops.py
+# version: 1.9.3 (Quality Search Attempt Budget)
+__version__ = "1.9.3"
+
+# 不依賴 tkinter 的圖像處理核心，可在 ProcessPoolExecutor 的子程序中執行。
+# 子程序只會匯入此模組，因此 Pillow 的全域設定也必須在這裡完成。
+
+import os
+import sys
+import json
+import time
+import shutil
+import struct
+import hashlib
+import subprocess
+from io import BytesIO
+
+try:
+    from PIL import Image, ImageOps
+    Image.MAX_IMAGE_PIXELS = None
+except ImportError:
+    Image, ImageOps = None, None
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# 快速縮圖：JPEG draft 與整數預縮 (reduce) 之後仍保留至少 2 倍於目標的像素，再由 LANCZOS 收尾
+FAST_DOWNSCALE_GAP = 2.0
+# 覆蓋原始檔案時的備份策略
+BACKUP_NONE = "不保留備份"
+BACKUP_KEEP = "保留於 .backup"
+BACKUP_POLICIES = (BACKUP_NONE, BACKUP_KEEP)
+BACKUP_DIR_NAME = ".backup"
+# EXIF 方向 5~8 代表影像需旋轉 90/270 度，轉正後寬高互換
+ROTATED_ORIENTATIONS = (5, 6, 7, 8)
+
+def compute_target_size(w, h, settings):
+    """依調整大小設定計算輸出尺寸；未啟用或無效時回傳原尺寸。"""
+    if not settings["resize_enabled"]: return w, h
+    sw, sh = w, h
+    resize_mode = settings["resize_mode"]
+    w_str = settings["width"]
+    h_str = settings["height"]
+
+    try:
+        if resize_mode == "像素":
+            sw_val = int(w_str) if w_str.isdigit() else 0
+            sh_val = int(h_str) if h_str.isdigit() else 0
+            if settings["keep_ratio"] and w > 0 and h > 0:
+                ratio = w / h
+                if sw_val > 0 and sh_val <=0: sh_val = int(sw_val / ratio)
+                elif sh_val > 0 and sw_val <=0: sw_val = int(sh_val * ratio)
+            sw, sh = sw_val, sh_val
+        elif resize_mode == "百分比":
+            percent_w = int(w_str) if w_str.isdigit() else 0
+            percent_h = int(h_str) if h_str.isdigit() else 0
+            if settings["keep_ratio"]:
+                if percent_w > 0 and percent_h <= 0: percent_h = percent_w
+                elif percent_h > 0 and percent_w <= 0: percent_w = percent_h
+            if percent_w <= 0: percent_w = 100
+            if percent_h <= 0: percent_h = 100
+            sw, sh = int(w * percent_w / 100), int(h * percent_h / 100)
+    except (ValueError, TypeError, ZeroDivisionError): sw, sh = w, h
+
+    if not (sw > 0 and sh > 0): sw, sh = w, h
+    if settings["scale_rule"] == "僅縮小，不放大" and (sw > w or sh > h): sw, sh = w, h
+    return sw, sh
+
+# 寫入 ImageMetaCache 的欄位
+IMAGE_META_KEYS = ("width", "height", "format", "mode", "orientation", "capture_date")
+EXIF_ORIENTATION, EXIF_DATETIME, EXIF_IFD, EXIF_DATETIME_ORIGINAL = 0x0112, 0x0132, 0x8769, 0x9003
+
+def probe_image_meta(path):
+    """
+    只讀取檔頭取得尺寸、格式、色彩模式、EXIF 方向與拍攝日期。
+    Image.open 為延遲解碼；PNG 的 getexif() 在沒有 eXIf 區塊時會觸發完整解碼，因此只在檔頭已帶 EXIF 時才解析。
+    """
+    with Image.open(path) as img:
+        meta = {"width": img.width, "height": img.height, "format": img.format, "mode": img.mode, "orientation": 1, "capture_date": None}
+        if "exif" in img.info or img.format == "TIFF":
+            try:
+                exif = img.getexif()
+                meta["orientation"] = int(exif.get(EXIF_ORIENTATION) or 1)
+                capture_date = exif.get_ifd(EXIF_IFD).get(EXIF_DATETIME_ORIGINAL) or exif.get(EXIF_DATETIME)
+                if capture_date: meta["capture_date"] = str(capture_date).strip("\x00 ")
+            except Exception: pass
+    return meta
+
+# 處理管線改變輸出結果時遞增，讓舊的輸出清單失效
+PIPELINE_VERSION = 2
+# 會影響輸出內容的設定；提示、平行度、記憶體預算等純 UI/排程設定不納入指紋
+FINGERPRINT_KEYS = ("format", "quality", "max_quality_detail", "keep_exif", "fast_downscale", "lossless_jpeg",
+                    "quality_mode", "quality_target", "quality_max_attempts", "variants_enabled", "variants")
+RESIZE_FINGERPRINT_KEYS = ("resize_mode", "width", "height", "keep_ratio", "scale_rule")
+
+def settings_fingerprint(settings):
+    """有效輸出設定的指紋 (含處理管線版本)，未啟用調整大小時忽略尺寸相關欄位。"""
+    effective = {key: settings.get(key) for key in FINGERPRINT_KEYS}
+    effective["resize_enabled"] = bool(settings.get("resize_enabled"))
+    if effective["resize_enabled"]: effective.update({key: settings.get(key) for key in RESIZE_FINGERPRINT_KEYS})
+    effective["pipeline"] = PIPELINE_VERSION
+    return hashlib.sha1(json.dumps(effective, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+def _bytes_per_pixel(mode):
+    # Pillow 內部以 32 位元儲存 RGB/RGBA/CMYK 等多通道影像，只有單通道 8/16 位元模式較小
+    if mode in ("1", "L", "P"): return 1
+    if mode and mode.startswith("I;16"): return 2
+    return 4
+
+def estimate_task_memory(details, settings):
+    """
+    由檔頭資訊估計單一任務的記憶體峰值 (位元組)：解碼後的原圖 (需要轉正時再加一份)
+    加上縮放輸出與編碼前轉換各一份。未經探測的檔案以檔案大小的 8 倍保守估計。
+    """
+    w, h = details.get("width"), details.get("height")
+    if not (w and h): return int((details.get("size") or 0) * 8)
+    bpp = _bytes_per_pixel(details.get("mode"))
+    rotated = details.get("orientation") in ROTATED_ORIENTATIONS
+    transposed = details.get("orientation") not in (1, None)
+    sw, sh = compute_target_size(h, w, settings) if rotated else compute_target_size(w, h, settings)
+    source = w * h * bpp
+    return source * (2 if transposed else 1) + sw * sh * bpp * 2
+
+def _read_orientation(img):
+    if "exif" not in img.info and img.format != "TIFF": return 1
+    try: return int(img.getexif().get(EXIF_ORIENTATION) or 1)
+    except Exception: return 1
+
+def decode_resized(img, settings, orientation=None, low_memory=False):
+    """
+    解碼、轉正並縮放已開啟的影像，回傳處理後的影像。
+    settings["fast_downscale"] 或 low_memory 為真時，先以 JPEG draft (1/2、1/4、1/8 DCT 縮放) 與 reduce 預縮，
+    兩者都會保留 FAST_DOWNSCALE_GAP 倍的餘裕，最後才以 LANCZOS 縮到目標尺寸。
+    """
+    if orientation is None: orientation = _read_orientation(img)
+    rotated = orientation in ROTATED_ORIENTATIONS
+    # 目標尺寸以轉正後的寬高計算，必須在 draft 改變尺寸前決定
+    ow, oh = (img.height, img.width) if rotated else img.size
+    sw, sh = compute_target_size(ow, oh, settings)
+
+    fast = (settings.get("fast_downscale") or low_memory) and (sw < ow or sh < oh)
+    if fast and img.format == "JPEG":
+        dw, dh = (sh, sw) if rotated else (sw, sh)
+        img.draft(img.mode, (int(dw * FAST_DOWNSCALE_GAP), int(dh * FAST_DOWNSCALE_GAP)))
+
+    if orientation != 1: img = ImageOps.exif_transpose(img)
+    if (sw, sh) != img.size:
+        if fast: img = img.resize((sw, sh), Image.Resampling.LANCZOS, reducing_gap=FAST_DOWNSCALE_GAP)
+        else: img = img.resize((sw, sh), Image.Resampling.LANCZOS)
+    return img
+
+def _as_gray_array(img):
+    return np.asarray(img.convert("L"), dtype=np.float64)
+
+def compute_psnr(img_a, img_b):
+    """兩張同尺寸影像的 PSNR (dB，以灰階計算)；完全相同時回傳 inf。需要 numpy。"""
+    if np is None: raise RuntimeError("需要 numpy 才能計算 PSNR")
+    a, b = _as_gray_array(img_a), _as_gray_array(img_b)
+    mse = np.mean((a - b) ** 2)
+    return float("inf") if mse == 0 else float(10 * np.log10(255.0 ** 2 / mse))
+
+def _box_mean(arr, win):
+    # 以積分影像計算 win x win 視窗平均 (valid 區域)
+    c = np.pad(arr, ((1, 0), (1, 0))).cumsum(0).cumsum(1)
+    return (c[win:, win:] - c[:-win, win:] - c[win:, :-win] + c[:-win, :-win]) / (win * win)
+
+def compute_ssim(img_a, img_b, win=8):
+    """兩張同尺寸影像的平均 SSIM (灰階、win x win 均勻視窗)。需要 numpy。"""
+    if np is None: raise RuntimeError("需要 numpy 才能計算 SSIM")
+    a, b = _as_gray_array(img_a), _as_gray_array(img_b)
+    win = max(1, min(win, a.shape[0], a.shape[1]))
+    c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+    mu_a, mu_b = _box_mean(a, win), _box_mean(b, win)
+    var_a = _box_mean(a * a, win) - mu_a ** 2
+    var_b = _box_mean(b * b, win) - mu_b ** 2
+    cov = _box_mean(a * b, win) - mu_a * mu_b
+    ssim_map = ((2 * mu_a * mu_b + c1) * (2 * cov + c2)) / ((mu_a ** 2 + mu_b ** 2 + c1) * (var_a + var_b + c2))
+    return float(ssim_map.mean())
+
+# --- 感知雜湊 (相似圖片比對)：64 位元雜湊，以 Hamming 距離衡量相似度 ---
+# 演算法或縮放方式改變時遞增，讓快取中的舊雜湊失效
+PERCEPTUAL_HASH_VERSION = 1
+PERCEPTUAL_HASH_KINDS = {"pHash": "phash", "dHash": "dhash", "aHash": "ahash"}
+PHASH_INPUT = 32
+_dct_matrix = None
+# 與 ImageOps.exif_transpose 相同的方向對應
+ORIENTATION_TRANSPOSE = {} if Image is None else {
+    2: Image.Transpose.FLIP_LEFT_RIGHT, 3: Image.Transpose.ROTATE_180, 4: Image.Transpose.FLIP_TOP_BOTTOM, 5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270, 7: Image.Transpose.TRANSVERSE, 8: Image.Transpose.ROTATE_90}
+
+def _get_dct_matrix():
+    # 32 點 DCT-II 轉換矩陣 (未正規化；只比較係數與中位數的大小，比例不影響結果)
+    global _dct_matrix
+    if _dct_matrix is None:
+        n = np.arange(PHASH_INPUT)
+        _dct_matrix = np.cos(np.pi * (2 * n[None, :] + 1) * n[:, None] / (2 * PHASH_INPUT))
+    return _dct_matrix
+
+def _bits_to_hex(bits):
+    return np.packbits(bits.astype(np.uint8).ravel()).tobytes().hex()
+
+def compute_perceptual_hashes(path):
+    """
+    計算 aHash / dHash / pHash (各 64 位元，十六進位字串) 與轉正後的原始尺寸。
+    JPEG 以 draft 直接解碼為 1/8 縮小的灰階影像，轉正後才縮到 32x32，旋轉過方向的副本也能比對。需要 numpy。
+    """
+    if np is None: raise RuntimeError("需要 numpy 才能計算感知雜湊")
+    with Image.open(path) as img:
+        orientation = _read_orientation(img)
+        width, height = (img.height, img.width) if orientation in ROTATED_ORIENTATIONS else img.size
+        img.draft("L", (PHASH_INPUT * 2, PHASH_INPUT * 2))
+        gray = img.convert("L")
+    # 灰階影像已不帶 EXIF，直接依方向套用對應的轉置
+    if orientation in ORIENTATION_TRANSPOSE: gray = gray.transpose(ORIENTATION_TRANSPOSE[orientation])
+    small = gray.resize((PHASH_INPUT, PHASH_INPUT), Image.Resampling.LANCZOS, reducing_gap=FAST_DOWNSCALE_GAP)
+    pixels = np.asarray(small, dtype=np.float64)
+    # aHash：8x8 區塊平均與整體平均比較；dHash：9x8 水平相鄰像素比較；pHash：低頻 8x8 DCT 係數與中位數比較
+    blocks = pixels.reshape(8, PHASH_INPUT // 8, 8, PHASH_INPUT // 8).mean(axis=(1, 3))
+    diff_src = np.asarray(small.resize((9, 8), Image.Resampling.BOX), dtype=np.float64)
+    dct = _get_dct_matrix()
+    low = (dct @ pixels @ dct.T)[:8, :8]
+    return {"ahash": _bits_to_hex(blocks > blocks.mean()), "dhash": _bits_to_hex(diff_src[:, 1:] > diff_src[:, :-1]),
+            "phash": _bits_to_hex(low > np.median(low)), "width": width, "height": height, "version": PERCEPTUAL_HASH_VERSION}
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count("1")
+
+_popcount_table = None
+
+def popcount64(x):
+    """uint64 陣列逐元素的位元數 (numpy 2 使用 bitwise_count，舊版以位元組查表)。"""
+    if hasattr(np, "bitwise_count"): return np.bitwise_count(x)
+    global _popcount_table
+    if _popcount_table is None: _popcount_table = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+    return _popcount_table[np.ascontiguousarray(x).view(np.uint8)].reshape(x.shape + (8,)).sum(axis=-1)
+
+def _bucket_pairs(idx, values, radius, max_cells=4_000_000):
+    # 同一桶內分塊計算上三角的 XOR + popcount，限制暫存矩陣大小
+    sub, n, found = values[idx], len(idx), []
+    block = max(1, max_cells // n)
+    for start in range(0, n, block):
+        dist = popcount64(sub[start:start + block, None] ^ sub[None, start:])
+        rows, cols = np.nonzero(dist <= radius)
+        keep = cols > rows
+        found.append(np.stack([idx[start + rows[keep]], idx[start + cols[keep]]], axis=1))
+    return found
+
+def find_similar_pairs(values, radius):
+    """
+    多重索引雜湊 (multi-index hashing)：把 64 位元切成 radius + 1 段，依鴿籠原理距離不超過 radius 的兩個雜湊
+    至少有一段完全相同，因此只需比較同段同值的桶內成員。每段太短 (桶太大) 時退回單一桶的分塊兩兩比較。
+    values 為 uint64 陣列，回傳不重複的索引配對陣列 (i < j)。需要 numpy。
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    n = len(values)
+    if n < 2: return np.empty((0, 2), dtype=np.int64)
+    chunks = radius + 1
+    if chunks > 64 or chunks / 2 ** (64 // chunks) >= 1: tables = [(0, 0)]
+    else:
+        bounds = [64 * k // chunks for k in range(chunks + 1)]
+        tables = [(lo, hi - lo) for lo, hi in zip(bounds[:-1], bounds[1:])]
+    found = []
+    for shift, width in tables:
+        keys = (values >> np.uint64(shift)) & np.uint64((1 << width) - 1)
+        order = np.argsort(keys, kind="stable")
+        cuts = np.flatnonzero(np.diff(keys[order])) + 1
+        for lo, hi in zip(np.concatenate(([0], cuts)), np.concatenate((cuts, [n]))):
+            if hi - lo > 1: found.extend(_bucket_pairs(order[lo:hi], values, radius))
+    pairs = np.concatenate(found) if found else np.empty((0, 2), dtype=np.int64)
+    return np.unique(pairs, axis=0) if len(pairs) else pairs
+
+# --- 無損 JPEG：只改寫區段 (segment)，不解碼也不重新編碼 ---
+JPEG_EXTS = (".jpg", ".jpeg", ".jpe", ".jfif")
+# jpegtran 對應 EXIF 方向 2~8 的無損轉換
+JPEGTRAN_OPS = {2: ["-flip", "horizontal"], 3: ["-rotate", "180"], 4: ["-flip", "vertical"], 5: ["-transpose"],
+                6: ["-rotate", "90"], 7: ["-transverse"], 8: ["-rotate", "270"]}
+
+def _iter_jpeg_segments(data):
+    """逐一產生 (marker, 區段位元組)；SOS 之後的壓縮資料與 EOI 作為最後一個區段整段回傳。"""
+    if data[:2] != b"\xff\xd8": raise ValueError("不是有效的 JPEG 檔案")
+    yield 0xD8, data[:2]
+    pos = 2
+    while pos < len(data):
+        if data[pos] != 0xFF: raise ValueError("JPEG 區段結構錯誤")
+        while pos + 1 < len(data) and data[pos + 1] == 0xFF: pos += 1  # 填充位元組
+        marker = data[pos + 1]
+        if marker == 0xDA: yield marker, data[pos:]; return
+        if marker == 0x01 or 0xD0 <= marker <= 0xD7: yield marker, data[pos:pos + 2]; pos += 2; continue
+        length = struct.unpack(">H", data[pos + 2:pos + 4])[0]
+        yield marker, data[pos:pos + 2 + length]
+        pos += 2 + length
+
+def _keep_segment_when_stripping(marker, segment):
+    # 保留 JFIF (APP0)、ICC 色彩描述檔 (APP2) 與 Adobe 色彩轉換 (APP14)；移除 EXIF/XMP/IPTC/註解等其他 APPn/COM
+    if marker == 0xE0 or marker == 0xEE: return True
+    if marker == 0xE2: return segment[4:16] == b"ICC_PROFILE\x00"
+    return not (0xE1 <= marker <= 0xEF or marker == 0xFE)
+
+def strip_jpeg_metadata(data):
+    return b"".join(seg for marker, seg in _iter_jpeg_segments(data) if _keep_segment_when_stripping(marker, seg))
+
+def _patch_orientation(buf, tiff_start):
+    """就地將 TIFF/EXIF IFD0 中的方向標籤改為 1 (長度不變)。回傳是否有修改。"""
+    byte_order = bytes(buf[tiff_start:tiff_start + 2])
+    if byte_order not in (b"II", b"MM"): return False
+    endian = "<" if byte_order == b"II" else ">"
+    ifd_offset = struct.unpack(endian + "I", buf[tiff_start + 4:tiff_start + 8])[0]
+    entries_pos = tiff_start + ifd_offset
+    count = struct.unpack(endian + "H", buf[entries_pos:entries_pos + 2])[0]
+    for i in range(count):
+        entry = entries_pos + 2 + i * 12
+        tag, field_type = struct.unpack(endian + "HH", buf[entry:entry + 4])
+        if tag == EXIF_ORIENTATION and field_type == 3:
+            buf[entry + 8:entry + 10] = struct.pack(endian + "H", 1)
+            return True
+    return False
+
+def reset_exif_orientation(exif_bytes):
+    """將 EXIF 區塊 (以 'Exif\\0\\0' 開頭，如 img.info['exif']) 的方向重設為 1；無法解析時原樣回傳。"""
+    if not exif_bytes or not exif_bytes.startswith(b"Exif\x00\x00"): return exif_bytes
+    buf = bytearray(exif_bytes)
+    try: _patch_orientation(buf, 6)
+    except struct.error: return exif_bytes
+    return bytes(buf)
+
+def reset_jpeg_orientation(data):
+    """將 JPEG 檔內 APP1 EXIF 的方向標籤重設為 1，其餘位元組不變。"""
+    out = []
+    for marker, seg in _iter_jpeg_segments(data):
+        if marker == 0xE1 and seg[4:10] == b"Exif\x00\x00":
+            seg = seg[:4] + reset_exif_orientation(seg[4:])
+        out.append(seg)
+    return b"".join(out)
+
+def find_jpegtran():
+    app_dir = os.path.dirname(os.path.abspath(sys.argv[0])) if sys.argv and sys.argv[0] else os.getcwd()
+    local_exe = os.path.join(app_dir, "jpegtran.exe" if os.name == 'nt' else "jpegtran")
+    return local_exe if os.path.isfile(local_exe) else shutil.which("jpegtran")
+
+def _run_jpegtran(jpegtran, src, dst, orientation):
+    startupinfo = None
+    if os.name == 'nt': startupinfo = subprocess.STARTUPINFO(); startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+    # -perfect：影像尺寸不是 MCU 整數倍時直接失敗，而不是裁掉邊緣
+    cmd = [jpegtran, "-copy", "all", "-perfect", *JPEGTRAN_OPS[orientation], "-outfile", dst, src]
+    return subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, startupinfo=startupinfo).returncode == 0
+
+def lossless_jpeg_candidate(settings, output_path, source_format, oriented_size):
+    """格式維持 JPEG、不需縮放且為固定品質時，才可走無損路徑 (只處理轉正與中繼資料)；大小上限與 SSIM 下限需要重新編碼。"""
+    if not settings.get("lossless_jpeg") or source_format != "JPEG": return False
+    if settings.get("quality_mode", QUALITY_FIXED) != QUALITY_FIXED: return False
+    if settings["format"] not in ("維持原格式", "JPG") or os.path.splitext(output_path)[1].lower() not in JPEG_EXTS: return False
+    return compute_target_size(oriented_size[0], oriented_size[1], settings) == tuple(oriented_size)
+
+def lossless_jpeg_write(filepath, tmp_path, orientation, keep_exif):
+    """
+    以無損方式寫出 tmp_path：方向需要轉正時呼叫 jpegtran -perfect 並將方向標籤改為 1，
+    不保留 Exif 時移除中繼資料區段。無法無損處理 (沒有 jpegtran 或尺寸不符 MCU) 時回傳 None 讓呼叫端改走一般路徑。
+    """
+    if orientation not in (1, None):
+        jpegtran = find_jpegtran()
+        if not jpegtran or orientation not in JPEGTRAN_OPS: return None
+        if not _run_jpegtran(jpegtran, filepath, tmp_path, orientation):
+            if os.path.exists(tmp_path): os.remove(tmp_path)
+            return None
+        with open(tmp_path, "rb") as f: data = reset_jpeg_orientation(f.read())
+        note = f"無損轉正 ({' '.join(JPEGTRAN_OPS[orientation])})"
+    else:
+        with open(filepath, "rb") as f: data = f.read()
+        note = "無損複製"
+    if not keep_exif: data = strip_jpeg_metadata(data); note += "，移除中繼資料"
+    with open(tmp_path, "wb") as f: f.write(data)
+    return note
+
+# --- 品質搜尋：以 BytesIO 試編碼，二分搜尋符合大小上限或 SSIM 下限的品質值 ---
+QUALITY_FIXED = "固定品質"
+QUALITY_TARGET_SIZE = "目標大小 (KB)"
+QUALITY_SSIM_FLOOR = "SSIM 下限"
+QUALITY_MODES = (QUALITY_FIXED, QUALITY_TARGET_SIZE, QUALITY_SSIM_FLOOR)
+QUALITY_MIN = 10
+
+def search_quality(img, format_name, base_options, settings):
+    """
+    在 [QUALITY_MIN, settings["quality"]] 之間二分搜尋品質值，編碼次數 (含備用品質) 不超過 quality_max_attempts。
+    目標大小模式取「不超過上限的最高品質」；SSIM 模式取「達到下限的最低品質」。
+    回傳 (quality, 編碼後位元組, 編碼次數, 是否達標)。找不到達標值時，大小模式用最低品質、SSIM 模式用最高品質。
+    """
+    size_mode = settings["quality_mode"] == QUALITY_TARGET_SIZE
+    target = float(settings["quality_target"])
+    max_attempts = max(1, int(settings.get("quality_max_attempts", 7)))
+    if not size_mode and np is None: raise RuntimeError("SSIM 下限模式需要 numpy")
+    encoded = {}
+
+    def encode(q):
+        if q not in encoded:
+            buf = BytesIO(); img.save(buf, format=format_name, quality=q, **base_options)
+            encoded[q] = buf.getvalue()
+        return encoded[q]
+
+    def meets(data):
+        if size_mode: return len(data) <= target * 1024
+        with Image.open(BytesIO(data)) as decoded: return compute_ssim(img, decoded) >= target
+
+    lo, hi = QUALITY_MIN, max(QUALITY_MIN, int(settings["quality"]))
+    fallback = lo if size_mode else hi
+    best = None
+    # 尚未找到達標值前保留一次編碼給備用品質 (搜尋過程已編碼過則不必保留)
+    while lo <= hi and len(encoded) < max_attempts - (best is None and fallback not in encoded):
+        mid = (lo + hi) // 2
+        if meets(encode(mid)):
+            best = mid
+            if size_mode: lo = mid + 1
+            else: hi = mid - 1
+        elif size_mode: hi = mid - 1
+        else: lo = mid + 1
+    if best is not None: return best, encoded[best], len(encoded), True
+    if fallback in encoded: return fallback, encoded[fallback], len(encoded), False
+    data = encode(fallback)
+    return fallback, data, len(encoded), meets(data)
+
+# --- 多重輸出：一次解碼，依尺寸由大到小逐級縮放並輸出多個變體 ---
+VARIANT_FORMATS = {"維持原格式": None, "JPG": "JPEG", "JPEG": "JPEG", "WEBP": "WEBP", "PNG": "PNG"}
+VARIANT_EXTS = {"JPEG": "jpg", "WEBP": "webp", "PNG": "png"}
+DEFAULT_VARIANT_PATTERN = "{dir}/variants/{name}_{w}.{ext}"
+
+def parse_variants(text):
+    """
+    解析變體設定，每個變體以分號或換行分隔，欄位為「寬度, 格式, 品質, 目標樣式」，後三者可省略。
+    寬度為 0 或空白表示原尺寸；樣式可用 {dir} {name} {srcext} {ext} {w} {h}，相對路徑以來源資料夾為基準。
+    格式錯誤時拋出 ValueError。
+    """
+    variants = []
+    for index, part in enumerate(filter(None, (p.strip() for p in text.replace("\n", ";").split(";"))), start=1):
+        fields = [f.strip() for f in part.split(",", 3)]
+        fields += [""] * (4 - len(fields))
+        width_str, format_str, quality_str, pattern = fields
+        try: width = int(width_str) if width_str else 0
+        except ValueError: raise ValueError(f"第 {index} 個變體的寬度無效: {width_str}")
+        format_key = format_str.upper() if format_str and format_str != "維持原格式" else "維持原格式"
+        if format_key not in VARIANT_FORMATS: raise ValueError(f"第 {index} 個變體的格式無效: {format_str}")
+        try: quality = int(quality_str) if quality_str else 90
+        except ValueError: raise ValueError(f"第 {index} 個變體的品質無效: {quality_str}")
+        if width < 0 or not 1 <= quality <= 100: raise ValueError(f"第 {index} 個變體的寬度或品質超出範圍")
+        variants.append({"width": width, "format": VARIANT_FORMATS[format_key], "quality": quality, "pattern": pattern or DEFAULT_VARIANT_PATTERN})
+    if not variants: raise ValueError("未設定任何輸出變體")
+    return variants
+
+def render_variant_path(variant, src_path, source_format, size):
+    folder, filename = os.path.split(src_path)
+    name, src_ext = os.path.splitext(filename)
+    format_name = variant["format"] or source_format or "JPEG"
+    ext = VARIANT_EXTS.get(format_name, src_ext.lstrip(".").lower())
+    rendered = variant["pattern"].format(dir=folder, name=name, srcext=src_ext.lstrip("."), ext=ext, w=size[0], h=size[1])
+    return os.path.normpath(rendered if os.path.isabs(rendered) else os.path.join(folder, rendered))
+
+def _variant_size(base_size, width, scale_rule):
+    w, h = base_size
+    if not width or (width > w and scale_rule == "僅縮小，不放大"): return w, h
+    return width, max(1, round(h * width / w))
+
+def process_variants_task(task_info, settings):
+    """
+    多重輸出：來源只解碼與轉正一次，變體依寬度由大到小排序，每個變體從上一個 (較大) 的結果縮放，
+    避免每個尺寸都從原圖重新取樣。每個輸出各自以暫存檔 + os.replace 寫入。
+    """
+    details = task_info["details"]
+    filepath = details["path"]
+    original_size = details.get("size") or 0
+    if not original_size:
+        try: original_size = os.path.getsize(filepath)
+        except OSError: pass
+    result = {"path": filepath, "output_path": None, "ok": False, "original_size": original_size, "new_size": 0,
+              "error": None, "messages": [], "method": None, "quality_note": None, "outputs": []}
+    try:
+        variants = parse_variants(settings.get("variants", ""))
+        with Image.open(filepath) as img:
+            exif_data = img.info.get('exif')
+            source_format = img.format
+            orientation = details.get("orientation") or _read_orientation(img)
+            oriented = (img.height, img.width) if orientation in ROTATED_ORIENTATIONS else img.size
+            planned = sorted(((_variant_size(oriented, v["width"], settings.get("scale_rule")), v) for v in variants),
+                             key=lambda item: item[0][0] * item[0][1], reverse=True)
+            largest = planned[0][0]
+            # 最大的變體決定解碼尺寸：允許 JPEG 以 draft 降階解碼，但保留 2 倍餘裕
+            if largest[0] < oriented[0] and img.format == "JPEG":
+                dw, dh = (largest[1], largest[0]) if orientation in ROTATED_ORIENTATIONS else largest
+                img.draft(img.mode, (int(dw * FAST_DOWNSCALE_GAP), int(dh * FAST_DOWNSCALE_GAP)))
+            current = ImageOps.exif_transpose(img) if orientation != 1 else img
+            current.load()
+
+            seen_outputs = set()
+            for size, variant in planned:
+                output_path = render_variant_path(variant, filepath, source_format, size)
+                key = os.path.normcase(output_path)
+                if key in seen_outputs: raise ValueError(f"變體輸出路徑重複: {output_path}")
+                if _same_path(output_path, filepath): raise ValueError("變體輸出不可覆蓋原始檔案")
+                seen_outputs.add(key)
+
+                if current.size != size: current = current.resize(size, Image.Resampling.LANCZOS, reducing_gap=FAST_DOWNSCALE_GAP)
+                format_name = variant["format"] or source_format or "JPEG"
+                out_img, save_options = current, {"format": format_name}
+                if format_name in ("JPEG", "WEBP"): save_options["quality"] = variant["quality"]
+                if format_name == "JPEG" and current.mode in ("RGBA", "P", "LA"): out_img = current.convert("RGB")
+                if settings.get("keep_exif") and exif_data and format_name in ("JPEG", "WEBP"): save_options["exif"] = reset_exif_orientation(exif_data)
+
+                tmp_path = _sibling_temp_path(output_path)
+                try:
+                    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+                    out_img.save(tmp_path, **save_options)
+                    os.replace(tmp_path, output_path)
+                except Exception:
+                    if os.path.exists(tmp_path): os.remove(tmp_path)
+                    raise
+                out_size = os.path.getsize(output_path)
+                result["outputs"].append((output_path, size, out_size))
+                result["new_size"] += out_size
+        result["ok"] = True
+    except Exception as e:
+        result["error"] = str(e)
+    return result
+
+def run_image_task(task_info, settings):
+    """ImageWorker 的進入點：依設定選擇單一輸出或多重輸出，並附上處理耗時 (elapsed，秒)。"""
+    start = time.perf_counter()
+    result = process_variants_task(task_info, settings) if settings.get("variants_enabled") else process_image_task(task_info, settings)
+    result["elapsed"] = time.perf_counter() - start
+    return result
+
+def _make_hidden_dir(path):
+    os.makedirs(path)
+    if os.name == 'nt':
+        try:
+            import ctypes; FILE_ATTRIBUTE_HIDDEN = 0x02
+            ctypes.windll.kernel32.SetFileAttributesW(path, FILE_ATTRIBUTE_HIDDEN)
+        except Exception: pass
+
+def _sibling_temp_path(output_path):
+    # 暫存檔與輸出位於同一資料夾，os.replace 才能保證原子性；保留副檔名讓 Pillow 判斷輸出格式
+    folder, name = os.path.split(output_path)
+    stem, ext = os.path.splitext(name)
+    return os.path.join(folder, f".{stem}.{os.getpid()}.filepros-tmp{ext}")
+
+def _backup_original(filepath):
+    """以硬連結 (不可用時改為複製) 將原檔保留到同資料夾的 .backup；之後的 os.replace 不會影響備份內容。"""
+    backup_dir = os.path.join(os.path.dirname(filepath), BACKUP_DIR_NAME)
+    if not os.path.isdir(backup_dir):
+        try: _make_hidden_dir(backup_dir)
+        except FileExistsError: pass  # 平行處理時可能已由其他程序建立
+    backup_path = os.path.join(backup_dir, os.path.basename(filepath))
+    if os.path.lexists(backup_path): os.remove(backup_path)
+    try: os.link(filepath, backup_path)
+    except OSError: shutil.copy2(filepath, backup_path)
+    return backup_path
+
+def _same_path(a, b):
+    return os.path.normcase(os.path.abspath(a)) == os.path.normcase(os.path.abspath(b))
+
+def _try_lossless_jpeg(task_info, settings, tmp_path):
+    """
+    符合條件時以無損方式寫出暫存檔，回傳處理說明；不符合或無法無損時回傳 None。
+    回傳 "" 表示原地覆蓋且內容無需任何變更。
+    """
+    details, output_path = task_info["details"], task_info["final_path"]
+    filepath = details["path"]
+    with Image.open(filepath) as img:
+        orientation = details.get("orientation") or _read_orientation(img)
+        oriented_size = (img.height, img.width) if orientation in ROTATED_ORIENTATIONS else img.size
+        if not lossless_jpeg_candidate(settings, output_path, img.format, oriented_size): return None
+    if orientation == 1 and settings["keep_exif"] and _same_path(output_path, filepath): return ""
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    return lossless_jpeg_write(filepath, tmp_path, orientation, settings["keep_exif"])
+
+def _encode_to(task_info, settings, tmp_path):
+    """一般路徑：解碼、轉正、縮放後依輸出格式編碼到暫存檔。啟用品質搜尋時回傳搜尋結果說明。"""
+    details, output_path = task_info["details"], task_info["final_path"]
+    with Image.open(details["path"]) as img:
+        # Capture Exif & format before any operations
+        exif_data = img.info.get('exif')
+        source_format = img.format
+
+        # 已知方向為 1 (含無 EXIF) 時略過轉正；未知 (未經探測) 時由檔頭讀取
+        img = decode_resized(img, settings, details.get("orientation"), task_info.get("low_memory", False))
+
+        save_options = {}
+        target_format_str = settings["format"]
+        output_format_name = (source_format or "JPEG") if target_format_str == "維持原格式" else target_format_str
+
+        lossy = output_format_name.upper() in ["JPEG", "JPG", "WEBP"]
+        if output_format_name.upper() in ["JPEG", "JPG"]:
+            save_options['quality'] = settings["quality"]
+            if settings["quality"] >= 95 and settings["max_quality_detail"]: save_options['subsampling'] = 0
+            if img.mode in ("RGBA", "P"): img = img.convert("RGB")
+        elif output_format_name.upper() == "WEBP":
+            save_options['quality'] = settings["quality"]
+
+        # Inject Exif if requested and available；像素已轉正，因此方向標籤必須重設為 1，避免檢視器重複旋轉
+        if settings["keep_exif"] and exif_data:
+            save_options['exif'] = reset_exif_orientation(exif_data)
+
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        if lossy and settings.get("quality_mode", QUALITY_FIXED) != QUALITY_FIXED:
+            format_name = "WEBP" if output_format_name.upper() == "WEBP" else "JPEG"
+            base_options = {k: v for k, v in save_options.items() if k != 'quality'}
+            quality, data, attempts, met = search_quality(img, format_name, base_options, settings)
+            with open(tmp_path, "wb") as f: f.write(data)
+            return f"品質 {quality}，試編碼 {attempts} 次" + ("" if met else "，未達標")
+        img.save(tmp_path, **save_options)
+    return None
+
+def process_image_task(task_info, settings):
+    """
+    處理單一圖像任務 (解碼、轉正、縮放、編碼；符合條件的 JPEG 改走無損路徑)。
+    先寫到輸出旁的暫存檔，成功後才以 os.replace 原子性地取代目標；失敗時原檔完全不受影響。
+    回傳結果字典，由呼叫端負責記錄日誌與統計，本函式不碰任何 UI。
+    """
+    details = task_info["details"]
+    output_path = task_info["final_path"]
+    filepath = details["path"]
+    original_size = details.get("size") or 0
+    if not original_size:
+        try: original_size = os.path.getsize(filepath)
+        except OSError: pass
+    result = {"path": filepath, "output_path": output_path, "ok": False, "original_size": original_size, "new_size": 0,
+              "error": None, "messages": [], "method": None, "quality_note": None}
+
+    is_overwrite_mode = settings["output_mode"] == "overwrite"
+    tmp_path = _sibling_temp_path(output_path)
+    try:
+        lossless_note = _try_lossless_jpeg(task_info, settings, tmp_path) if settings.get("lossless_jpeg") else None
+        if lossless_note == "":
+            result.update(new_size=original_size, ok=True, method="無損 (內容無需變更)")
+            return result
+        if lossless_note: result["method"] = lossless_note
+        else: result["quality_note"] = _encode_to(task_info, settings, tmp_path)
+
+        # 來源檔已關閉 (Windows 無法取代開啟中的檔案)，再依備份策略處理原檔並原子性地取代
+        if is_overwrite_mode and settings.get("backup_policy") == BACKUP_KEEP:
+            _backup_original(filepath)
+        os.replace(tmp_path, output_path)
+        if is_overwrite_mode and not _same_path(output_path, filepath):
+            os.remove(filepath)  # 覆蓋模式下轉換格式：新檔已就位，移除舊格式的原檔
+
+        result["new_size"] = os.path.getsize(output_path)
+        result["ok"] = True
+    except Exception as e:
+        result["error"] = str(e)
+        if os.path.exists(tmp_path):
+            try: os.remove(tmp_path)
+            except OSError as rm_e: result["messages"].append(f"警告: 無法刪除暫存檔 {os.path.basename(tmp_path)}: {rm_e}")
+    return result
@@ -1,23 +1,30 @@
 # image_pane.py
-# version: 2.6.0 (Cleaned & Exif Support)
-__version__ = "2.6.0"
+# version: 2.20.3 (Probe Result Survives Cache Errors)
+__version__ = "2.20.3"
 
 import os
 import json
 import queue
 import threading
 import time
-import shutil
 import tkinter as tk
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
 from tkinter import ttk, messagebox, filedialog
 from tkinterdnd2 import DND_FILES
 
+from plan_io import PLAN_FILETYPES, write_plan, read_plan, validate_plan
+from image_ops import IMAGE_META_KEYS, BACKUP_NONE, BACKUP_POLICIES, QUALITY_FIXED, QUALITY_MODES, QUALITY_SSIM_FLOOR, estimate_task_memory, run_image_task, probe_image_meta, settings_fingerprint, parse_variants
+from file_cache import CACHE_DB_NAME, ImageMetaCache, OutputManifest, file_signature
+from thumb_cache import THUMB_DIR_NAME, THUMB_SIZE, ThumbnailCache
+from progress import ProgressTracker
+
 try:
-    from PIL import Image, ImageOps
+    from PIL import Image, ImageOps, ImageTk
     Image.MAX_IMAGE_PIXELS = None
 except ImportError:
     messagebox.showerror("缺少函式庫", "此功能需要 Pillow 函式庫。\n請使用 'pip install Pillow' 來安裝。")
-    Image, ImageOps = None, None
+    Image, ImageOps, ImageTk = None, None, None
 
 # 保持與 file_pane.py 的一致性，同時確保獨立執行能力
 try:
@@ -50,6 +57,9 @@ except ImportError:
         return container, tree
 
 class ImageProcessingPane(ttk.Frame):
+    MAX_THUMBNAILS = 40
+    MAX_THUMBNAIL_PHOTOS = 200
+
     def __init__(self, parent, app):
         super().__init__(parent)
         self.app = app
@@ -64,6 +74,28 @@ class ImageProcessingPane(ttk.Frame):
         self.checked_state = {}
         self.last_clicked_item = None
 
+        # 計畫引擎快取：資料、勾選或輸出設定變更時才重新計算
+        self.details_version = 0
+        self.checked_version = 0
+        self.plan_cache_key = None
+        self.plan_final_paths = []
+        self.shown_new_paths = []
+
+        # 背景檔頭探測：path -> details (同一個 dict 物件會被就地補上尺寸)
+        self.probe_cache = {}
+        self.path_to_item = {}
+        self.probe_generation = 0
+        self.probe_stop_event = threading.Event()
+        self.meta_cache = ImageMetaCache(os.path.join(getattr(app, 'app_dir', '.'), CACHE_DB_NAME))
+
+        # 縮圖預覽：PIL 縮圖在背景產生，PhotoImage 只在 Tk 執行緒建立
+        self.thumb_cache = ThumbnailCache(os.path.join(getattr(app, 'app_dir', '.'), THUMB_DIR_NAME))
+        self.thumb_worker = None
+        self.thumb_generation = 0
+        self.thumb_photos = OrderedDict()
+        self.thumb_slots = {}
+        self.thumb_view_key = None
+
         self._setup_ui_variables()
         
         # Extension filters
@@ -75,15 +107,23 @@ class ImageProcessingPane(ttk.Frame):
         self._build_ui()
         self._load_config()
         self.after(100, self._process_ui_queue)
+        self.after(250, self._poll_thumbnail_view)
 
     def _setup_ui_variables(self):
         self.var_format = tk.StringVar(value="維持原格式")
         self.var_quality = tk.IntVar(value=95)
         self.var_max_quality_detail = tk.BooleanVar(value=False)
         self.var_keep_exif = tk.BooleanVar(value=False) # New: Exif support
+        self.var_lossless_jpeg = tk.BooleanVar(value=False)
+        self.var_quality_mode = tk.StringVar(value=QUALITY_FIXED)
+        self.var_quality_target = tk.StringVar(value="300")
+        self.var_quality_max_attempts = tk.IntVar(value=7)
+        self.var_variants_enabled = tk.BooleanVar(value=False)
+        self.var_variants = tk.StringVar(value="2560, JPG, 90; 1280, WEBP, 80; 320, JPG, 75, {dir}/thumbs/{name}.{ext}")
         
         self.var_output_mode = tk.StringVar(value="overwrite")
         self.var_output_dir = tk.StringVar()
+        self.var_backup_policy = tk.StringVar(value=BACKUP_NONE)
         
         self.var_resize_enabled = tk.BooleanVar(value=False)
         self.var_resize_mode = tk.StringVar(value="百分比")
@@ -92,9 +132,14 @@ class ImageProcessingPane(ttk.Frame):
         self.var_keep_ratio = tk.BooleanVar(value=True)
         self.var_scale_rule = tk.StringVar(value="僅縮小，不放大")
         self.var_aspect_ratio = tk.StringVar(value="原始")
+        self.var_fast_downscale = tk.BooleanVar(value=False)
         
         self.var_warn_overwrite = tk.BooleanVar(value=True)
         self.var_notify_complete = tk.BooleanVar(value=True)
+        self.var_workers = tk.IntVar(value=1)
+        self.var_memory_budget_mb = tk.IntVar(value=2048)
+        self.var_skip_unchanged = tk.BooleanVar(value=True)
+        self.var_show_thumbnails = tk.BooleanVar(value=True)
 
     def _build_ui(self):
         main_frame = ttk.LabelFrame(self, text=f"圖像處理 v{__version__}")
@@ -108,6 +153,7 @@ class ImageProcessingPane(ttk.Frame):
         self._create_output_widgets(control_panel)
         self._create_resize_widgets(control_panel)
         self._create_settings_widgets(control_panel)
+        self._create_variant_widgets(control_panel)
         self._create_extension_filter_widgets(main_frame)
 
         frame_preview = ttk.LabelFrame(main_frame, text="檔案預覽區")
@@ -132,6 +178,8 @@ class ImageProcessingPane(ttk.Frame):
         self.file_tree.bind('<Button-1>', self._on_tree_click)
         self.file_tree.bind('<space>', self._on_space_press)
 
+        self._create_thumbnail_widgets(main_frame)
+
         exec_frame = ttk.Frame(main_frame)
         exec_frame.pack(fill="x", padx=10, pady=10)
         exec_frame.columnconfigure(1, weight=1)
@@ -140,6 +188,8 @@ class ImageProcessingPane(ttk.Frame):
         ttk.Button(btn_frame, text="✔", command=self._toggle_selection_check, width=3).pack(side="left")
         ttk.Button(btn_frame, text="全選", command=self._select_all).pack(side="left", padx=5)
         ttk.Button(btn_frame, text="清除", command=self._clear_all).pack(side="left")
+        ttk.Button(btn_frame, text="匯出計畫", command=self._export_plan).pack(side="left", padx=(10, 0))
+        ttk.Button(btn_frame, text="匯入計畫", command=self._import_plan).pack(side="left", padx=(5, 0))
 
         self.pbar = ttk.Progressbar(exec_frame); self.pbar.grid(row=0, column=1, sticky="ew", padx=10)
         self.btn_execute = ttk.Button(exec_frame, text="開始處理", command=self._on_execute); self.btn_execute.grid(row=0, column=2, padx=(10, 0))
@@ -168,15 +218,29 @@ class ImageProcessingPane(ttk.Frame):
         self.chk_keep_exif = ttk.Checkbutton(frame, text="保留相機資訊 (Exif)", variable=self.var_keep_exif)
         self.chk_keep_exif.grid(row=3, column=1, columnspan=2, sticky="w", padx=5, pady=0)
 
-        ttk.Label(frame, text="輸出位置:").grid(row=4, column=0, sticky="w", padx=5, pady=2)
+        self.chk_lossless_jpeg = ttk.Checkbutton(frame, text="JPEG 無損處理 (不縮放時只轉正/移除中繼資料)", variable=self.var_lossless_jpeg)
+        self.chk_lossless_jpeg.grid(row=4, column=1, columnspan=2, sticky="w", padx=5, pady=0)
+
+        ttk.Label(frame, text="品質模式:").grid(row=7, column=0, sticky="w", padx=5, pady=2)
+        quality_mode_frame = ttk.Frame(frame)
+        quality_mode_frame.grid(row=7, column=1, columnspan=2, sticky="ew", padx=5, pady=2)
+        ttk.Combobox(quality_mode_frame, textvariable=self.var_quality_mode, values=list(QUALITY_MODES), state="readonly", width=13).pack(side="left")
+        ttk.Label(quality_mode_frame, text="目標:").pack(side="left", padx=(5, 2))
+        ttk.Entry(quality_mode_frame, textvariable=self.var_quality_target, width=7).pack(side="left")
+        ttk.Label(quality_mode_frame, text="最多試編碼:").pack(side="left", padx=(5, 2))
+        tk.Spinbox(quality_mode_frame, from_=1, to=20, textvariable=self.var_quality_max_attempts, width=3).pack(side="left")
+
+        ttk.Label(frame, text="輸出位置:").grid(row=5, column=0, sticky="w", padx=5, pady=2)
         output_frame = ttk.Frame(frame)
-        output_frame.grid(row=4, column=1, columnspan=2, sticky="ew", padx=5, pady=2)
-        ttk.Radiobutton(output_frame, text="覆蓋原始檔案", variable=self.var_output_mode, value="overwrite", command=self.update_preview).pack(anchor="w")
+        output_frame.grid(row=5, column=1, columnspan=2, sticky="ew", padx=5, pady=2)
+        overwrite_frame = ttk.Frame(output_frame); overwrite_frame.pack(anchor="w")
+        ttk.Radiobutton(overwrite_frame, text="覆蓋原始檔案", variable=self.var_output_mode, value="overwrite", command=self.update_preview).pack(side="left")
+        ttk.Combobox(overwrite_frame, textvariable=self.var_backup_policy, values=list(BACKUP_POLICIES), state="readonly", width=14).pack(side="left", padx=(10, 0))
         ttk.Radiobutton(output_frame, text="儲存到 'resized' 子資料夾", variable=self.var_output_mode, value="resized", command=self.update_preview).pack(anchor="w")
         ttk.Radiobutton(output_frame, text="儲存到自訂資料夾:", variable=self.var_output_mode, value="custom", command=self.update_preview).pack(anchor="w")
         
         custom_dir_frame = ttk.Frame(frame)
-        custom_dir_frame.grid(row=5, column=1, columnspan=2, sticky="ew", padx=5, pady=(0,5))
+        custom_dir_frame.grid(row=6, column=1, columnspan=2, sticky="ew", padx=5, pady=(0,5))
         self.entry_output_dir = ttk.Entry(custom_dir_frame, textvariable=self.var_output_dir)
         self.entry_output_dir.pack(side="left", fill="x", expand=True)
         ttk.Button(custom_dir_frame, text="瀏覽", command=self._browse_output_dir, width=6).pack(side="left", padx=(5,0))
@@ -216,6 +280,8 @@ class ImageProcessingPane(ttk.Frame):
         ttk.Label(frame, text="縮放規則:").grid(row=6, column=0, sticky="w", padx=5, pady=2)
         self.combo_scale_rule = ttk.Combobox(frame, textvariable=self.var_scale_rule, values=["放大或縮小", "僅縮小，不放大"], state="readonly", width=12)
         self.combo_scale_rule.grid(row=6, column=1, sticky="ew", padx=5, pady=2)
+        self.chk_fast_downscale = ttk.Checkbutton(frame, text="快速縮小 (JPEG 草稿解碼)", variable=self.var_fast_downscale)
+        self.chk_fast_downscale.grid(row=7, column=0, columnspan=2, sticky="w", padx=5, pady=2)
         self._toggle_resize_widgets()
 
     def _create_settings_widgets(self, parent):
@@ -223,8 +289,31 @@ class ImageProcessingPane(ttk.Frame):
         frame.grid(row=1, column=0, columnspan=2, sticky="nsew", padx=(0, 5), pady=5)
         ttk.Checkbutton(frame, text="覆蓋前彈出警告", variable=self.var_warn_overwrite).pack(side="left", padx=5)
         ttk.Checkbutton(frame, text="完成後彈出提示", variable=self.var_notify_complete).pack(side="left", padx=5)
+        ttk.Checkbutton(frame, text="略過已是最新的輸出", variable=self.var_skip_unchanged).pack(side="left", padx=5)
+        ttk.Label(frame, text="平行程序數:").pack(side="left", padx=(15, 2))
+        tk.Spinbox(frame, from_=1, to=max(1, os.cpu_count() or 1), textvariable=self.var_workers, width=4).pack(side="left")
+        ttk.Label(frame, text="記憶體預算(MB):").pack(side="left", padx=(15, 2))
+        tk.Spinbox(frame, from_=256, to=262144, increment=256, textvariable=self.var_memory_budget_mb, width=7).pack(side="left")
         ttk.Button(frame, text="儲存設定", command=self._save_config).pack(side="right", padx=5)
 
+    def _create_variant_widgets(self, parent):
+        frame = ttk.LabelFrame(parent, text="多重輸出 (每個來源只解碼一次)")
+        frame.grid(row=2, column=0, columnspan=2, sticky="nsew", padx=(0, 5), pady=(0, 5))
+        frame.columnconfigure(1, weight=1)
+        ttk.Checkbutton(frame, text="啟用", variable=self.var_variants_enabled, command=self.update_preview).grid(row=0, column=0, sticky="w", padx=5)
+        ttk.Entry(frame, textvariable=self.var_variants).grid(row=0, column=1, sticky="ew", padx=5, pady=2)
+        ttk.Label(frame, text="格式: 寬度, 格式, 品質, 目標樣式 (以 ; 分隔)。樣式可用 {dir} {name} {srcext} {ext} {w} {h}，預設 {dir}/variants/{name}_{w}.{ext}", foreground="gray").grid(row=1, column=0, columnspan=2, sticky="w", padx=5)
+
+    def _create_thumbnail_widgets(self, parent):
+        frame = ttk.LabelFrame(parent, text="縮圖預覽 (選取的項目，未選取時為可見的項目)")
+        frame.pack(fill="x", padx=10, pady=(0, 5))
+        ttk.Checkbutton(frame, text="顯示縮圖", variable=self.var_show_thumbnails, command=self._on_toggle_thumbnails).pack(anchor="w", padx=5)
+        self.thumb_canvas = tk.Canvas(frame, height=THUMB_SIZE[1] + 26, highlightthickness=0)
+        thumb_scroll = ttk.Scrollbar(frame, orient="horizontal", command=self.thumb_canvas.xview)
+        self.thumb_canvas.configure(xscrollcommand=thumb_scroll.set)
+        self.thumb_canvas.pack(fill="x", padx=5)
+        thumb_scroll.pack(fill="x", padx=5)
+
     def _create_extension_filter_widgets(self, parent):
         frame = ttk.LabelFrame(parent, text="副檔名篩選")
         frame.pack(fill="x", padx=10, pady=(0, 5))
@@ -234,12 +323,12 @@ class ImageProcessingPane(ttk.Frame):
         for ext in IMAGE_EXTS: 
             if ext in self.img_ext_vars:
                 var = self.img_ext_vars[ext]
-                ttk.Checkbutton(img_frame, text=ext, variable=var, command=self.receive_update).pack(side="left")
+                ttk.Checkbutton(img_frame, text=ext, variable=var, command=self._on_ext_filter_change).pack(side="left")
 
     def _on_select_all_images_toggle(self):
         is_checked = self.var_select_all_images.get()
         for var in self.img_ext_vars.values(): var.set(is_checked)
-        self.receive_update()
+        self._on_ext_filter_change()
 
     def _update_select_all_checkbox_state(self):
         all_checked = all(var.get() for ext, var in self.img_ext_vars.items() if ext in IMAGE_EXTS)
@@ -250,16 +339,30 @@ class ImageProcessingPane(ttk.Frame):
             "format": self.var_format.get(), "quality": self.var_quality.get(), 
             "max_quality_detail": self.var_max_quality_detail.get(), 
             "keep_exif": self.var_keep_exif.get(), # Save exif setting
-            "output_mode": self.var_output_mode.get(), "output_dir": self.var_output_dir.get(), 
+            "lossless_jpeg": self.var_lossless_jpeg.get(),
+            "quality_mode": self.var_quality_mode.get(), "quality_target": self.var_quality_target.get().strip(),
+            "quality_max_attempts": self._get_int_var(self.var_quality_max_attempts, 7, 1),
+            "variants_enabled": self.var_variants_enabled.get(), "variants": self.var_variants.get().strip(),
+            "output_mode": self.var_output_mode.get(), "output_dir": self.var_output_dir.get(), "backup_policy": self.var_backup_policy.get(),
             "resize_enabled": self.var_resize_enabled.get(), "resize_mode": self.var_resize_mode.get(), 
             "width": self.var_width.get(), "height": self.var_height.get(), 
             "keep_ratio": self.var_keep_ratio.get(), "aspect_ratio": self.var_aspect_ratio.get(), 
-            "scale_rule": self.var_scale_rule.get(), "warn_overwrite": self.var_warn_overwrite.get(), 
-            "notify_complete": self.var_notify_complete.get() 
+            "scale_rule": self.var_scale_rule.get(), "fast_downscale": self.var_fast_downscale.get(), "warn_overwrite": self.var_warn_overwrite.get(), 
+            "notify_complete": self.var_notify_complete.get(), "workers": self._get_worker_count(),
+            "show_thumbnails": self.var_show_thumbnails.get(), "memory_budget_mb": self._get_memory_budget_mb(),
+            "skip_unchanged": self.var_skip_unchanged.get()
         }
         settings['img_exts'] = {ext: var.get() for ext, var in self.img_ext_vars.items()}
         return settings
     
+    def _get_worker_count(self): return self._get_int_var(self.var_workers, 1, 1)
+
+    def _get_int_var(self, var, default, minimum):
+        try: return max(minimum, int(var.get()))
+        except (tk.TclError, ValueError): return default
+
+    def _get_memory_budget_mb(self): return self._get_int_var(self.var_memory_budget_mb, 2048, 256)
+
     def _apply_settings_from_dict(self, settings_dict):
         ext_settings = settings_dict.get('img_exts', {})
         for ext, value in ext_settings.items():
@@ -288,85 +391,147 @@ class ImageProcessingPane(ttk.Frame):
         self.app.log("ImagePane: 設定已儲存。")
     
     def receive_update(self, data_state=None):
+        # 新的資料集：捨棄舊的探測結果，並讓仍在執行的探測執行緒停止
+        self.probe_stop_event.set()
+        self.probe_generation += 1
+        self.probe_cache.clear()
+        self.thumb_photos.clear(); self.thumb_view_key = None
+        self._refilter(data_state)
+
+    def _on_ext_filter_change(self):
+        # 只重新篩選已探測的清單，不會重新開啟檔案
+        self._refilter()
+
+    def _refilter(self, data_state=None):
         if data_state is None: data_state = getattr(self.app, 'data_state', {})
         image_files = data_state.get("image_files", [])
+        file_sizes = data_state.get("file_sizes", {})
         
         selected_exts = {ext for ext, var in self.img_ext_vars.items() if var.get()}
         filtered_files = [f for f in image_files if os.path.splitext(f)[1].lower() in selected_exts]
 
         self.image_details_list.clear()
-        sorted_files = sorted(filtered_files, key=natural_sort_key)
-        
-        for f_path in sorted_files:
-            details = {"path": f_path, "dims": "N/A", "size": 0}
-            try:
-                details["size"] = os.path.getsize(f_path)
-                with Image.open(f_path) as img: details["dims"] = f"{img.width}x{img.height}"
-            except Exception as e: self.app.log(f"無法讀取圖片資訊: {os.path.basename(f_path)} - {e}")
+        self.details_version += 1
+        to_probe = []
+        for f_path in sorted(filtered_files, key=natural_sort_key):
+            details = self.probe_cache.get(f_path)
+            if details is None:
+                details = {"path": f_path, "dims": "…", "size": file_sizes.get(f_path, 0)}
+                self.probe_cache[f_path] = details
+                to_probe.append(f_path)
             self.image_details_list.append(details)
         
-        if self.image_details_list:
-            try:
-                with Image.open(self.image_details_list[0]['path']) as img: self.original_aspect_ratio = img.width / img.height
-            except Exception: self.original_aspect_ratio = 16 / 9.0
+        self.original_aspect_ratio = 16 / 9.0
+        if self.image_details_list: self._update_aspect_ratio(self.image_details_list[0])
         
         self.update_preview(is_full_reload=True)
         self.app.log(f"圖像處理：篩選後共 {len(self.image_details_list)} 個圖片檔案。")
+        if to_probe: self._start_probe(to_probe)
+
+    def _start_probe(self, paths):
+        if self.probe_stop_event.is_set(): self.probe_stop_event = threading.Event()
+        ImageProbeWorker(paths, self.probe_generation, self.ui_queue, self.probe_stop_event, self.meta_cache).start()
+
+    def _apply_probe_results(self, generation, batch):
+        if generation != self.probe_generation: return  # 舊資料集的結果
+        first = self.image_details_list[0] if self.image_details_list else None
+        for f_path, info in batch:
+            details = self.probe_cache.get(f_path)
+            if details is None: continue
+            if "error" in info:
+                details["dims"] = "N/A"
+                self.app.log(f"無法讀取圖片資訊: {os.path.basename(f_path)} - {info['error']}")
+            else:
+                details["dims"] = f"{info['width']}x{info['height']}"
+                details.update({key: info[key] for key in IMAGE_META_KEYS if key in info})
+            if info.get("size"): details["size"] = info["size"]
+            if details is first: self._update_aspect_ratio(details)
+            item_id = self.path_to_item.get(f_path)
+            if item_id and self.file_tree.exists(item_id):
+                self.file_tree.set(item_id, column="dimensions", value=details["dims"])
+                self.file_tree.set(item_id, column="size", value=format_size(details["size"]))
+
+    def _update_aspect_ratio(self, details):
+        if details.get("width") and details.get("height"): self.original_aspect_ratio = details["width"] / details["height"]
         
+    def _plan_key(self):
+        return (self.details_version, self.checked_version, self.var_format.get(), self.var_output_mode.get(), self.var_output_dir.get())
+
+    def _get_plan(self):
+        """
+        計畫引擎：回傳與 image_details_list 對齊的目標路徑清單，預覽、執行與匯出共用。
+        單次線性掃描完成衝突處理；資料、勾選與輸出設定皆未變更時直接使用快取。
+        """
+        key = self._plan_key()
+        if key == self.plan_cache_key: return self.plan_final_paths
+
+        item_ids = self.file_tree.get_children('')
+        checked = [self.checked_state.get(item_ids[i], True) if i < len(item_ids) else True for i in range(len(self.image_details_list))]
+        target_format = self.var_format.get()
+        output_mode = self.var_output_mode.get()
+        custom_dir = self.var_output_dir.get()
+
+        # Conflict detection logic (Future Path Prediction)：未勾選的檔案仍佔用原路徑
+        future_paths = {details["path"].lower() for details, is_checked in zip(self.image_details_list, checked) if not is_checked}
+        final_paths = []
+        for details, is_checked in zip(self.image_details_list, checked):
+            f_path = details["path"]
+            if not is_checked: final_paths.append(f_path); continue
+            base, ext = os.path.splitext(os.path.basename(f_path))
+            new_ext = ext.lower() if target_format == "維持原格式" else "." + target_format.lower()
+            dest_folder = os.path.dirname(f_path)
+            if output_mode == "resized": dest_folder = os.path.join(dest_folder, "resized")
+            elif output_mode == "custom": dest_folder = custom_dir or dest_folder
+
+            final_path = os.path.join(dest_folder, f"{base}{new_ext}")
+            counter = 1
+            while final_path.lower() in future_paths:
+                final_path = os.path.join(dest_folder, f"{base}({counter}){new_ext}")
+                counter += 1
+            future_paths.add(final_path.lower())
+            final_paths.append(final_path)
+
+        self.plan_cache_key, self.plan_final_paths = key, final_paths
+        return final_paths
+
     def update_preview(self, event=None, is_full_reload=False):
-            root_folder = getattr(self.app, 'data_state', {}).get("root_folder", ".")
             if is_full_reload:
                 self.file_tree.delete(*self.file_tree.get_children())
                 self.checked_state.clear()
-            
-            # Conflict detection logic (Future Path Prediction)
-            future_paths = set()
-            item_ids = self.file_tree.get_children('')
-            for i, item_id in enumerate(item_ids):
-                if not self.checked_state.get(item_id, False):
-                    future_paths.add(self.image_details_list[i]["path"].lower())
-
-            for i, details in enumerate(self.image_details_list):
-                f_path = details["path"]
-                base, ext = os.path.splitext(os.path.basename(f_path))
-                target_format = self.var_format.get()
-                new_ext = ext.lower() if target_format == "維持原格式" else "." + target_format.lower()
-                
-                output_mode = self.var_output_mode.get()
-                dest_folder = os.path.dirname(f_path)
+                self.path_to_item.clear()
+                self.checked_version += 1
+                self.shown_new_paths = []
 
-                if output_mode == "resized": dest_folder = os.path.join(dest_folder, "resized")
-                elif output_mode == "custom": dest_folder = self.var_output_dir.get() or dest_folder
-                
-                final_name = f"{base}{new_ext}"
-                final_path = os.path.join(dest_folder, final_name)
-                
-                # Resolve conflicts
-                counter = 1
-                base_name, ext_name = os.path.splitext(final_name)
-                while final_path.lower() in future_paths:
-                    final_name = f"{base_name}({counter}){ext_name}"
-                    final_path = os.path.join(dest_folder, final_name)
-                    counter += 1
-                
-                if self.checked_state.get(self.file_tree.get_children('')[i] if i < len(self.file_tree.get_children('')) else None, True):
-                    future_paths.add(final_path.lower())
+            root_folder = getattr(self.app, 'data_state', {}).get("root_folder", ".")
+            root_prefix = os.path.join(root_folder, "") if root_folder else None
+            def display_path(path):
+                return path[len(root_prefix):] if root_prefix and path.startswith(root_prefix) else os.path.basename(path)
 
-                original_rel_path = os.path.relpath(f_path, root_folder) if root_folder and os.path.commonpath([f_path, root_folder]) == root_folder else os.path.basename(f_path)
-                new_rel_path = os.path.relpath(final_path, root_folder) if root_folder and os.path.commonpath([final_path, root_folder]) == root_folder else os.path.basename(final_path)
-                values = ('☑', original_rel_path, new_rel_path, details["dims"], format_size(details["size"]))
+            variant_label = None
+            if self.var_variants_enabled.get():
+                try: variant_label = f"[多重輸出 × {len(parse_variants(self.var_variants.get()))}]"
+                except ValueError as e: variant_label = f"[多重輸出設定錯誤: {e}]"
 
-                if is_full_reload:
+            final_paths = self._get_plan()
+            if is_full_reload:
+                for details, final_path in zip(self.image_details_list, final_paths):
+                    f_path = details["path"]
+                    new_rel_path = variant_label or display_path(final_path)
+                    values = ('☑', display_path(f_path), new_rel_path, details["dims"], format_size(details["size"]))
                     item_id = self.file_tree.insert("", "end", values=values, tags=('checked',))
                     self.checked_state[item_id] = True
-                else:
-                    try:
-                        item_id = self.file_tree.get_children('')[i]
-                        if self.checked_state.get(item_id, False):
-                            self.file_tree.set(item_id, column="new_path", value=new_rel_path)
-                        else:
-                            self.file_tree.set(item_id, column="new_path", value=original_rel_path)
-                    except IndexError: pass
+                    self.path_to_item[f_path] = item_id
+                    self.shown_new_paths.append(new_rel_path)
+                return
+
+            item_ids = self.file_tree.get_children('')
+            for i, (item_id, details) in enumerate(zip(item_ids, self.image_details_list)):
+                if self.checked_state.get(item_id, False): new_rel_path = variant_label or display_path(final_paths[i])
+                else: new_rel_path = display_path(details["path"])
+                # 只更新有變動的儲存格，避免數萬次 Tk 呼叫
+                if i < len(self.shown_new_paths) and self.shown_new_paths[i] == new_rel_path: continue
+                self.file_tree.set(item_id, column="new_path", value=new_rel_path)
+                if i < len(self.shown_new_paths): self.shown_new_paths[i] = new_rel_path
 
     def _toggle_resize_widgets(self):
         state = "normal" if self.var_resize_enabled.get() else "disabled"
@@ -399,62 +564,74 @@ class ImageProcessingPane(ttk.Frame):
                     if h_str.isdigit(): self.var_width.set(str(int(int(h_str) * aspect_ratio)))
             except (ValueError, ZeroDivisionError): pass
             
-    def _on_execute(self):
-        # 1. Path Calculation
-        final_path_map = {}
-        future_paths = set()
-        item_ids = self.file_tree.get_children('')
+    def iter_plan(self):
+        """以產生器逐筆輸出 (src, dst, checked)，供計畫匯出使用。"""
+        final_paths = self._get_plan()
+        for item_id, details, final_path in zip(self.file_tree.get_children(''), self.image_details_list, final_paths):
+            yield details["path"], final_path, self.checked_state.get(item_id, False)
 
-        for i, item_id in enumerate(item_ids):
-            if i >= len(self.image_details_list): continue
-            details = self.image_details_list[i]
-            f_path = details["path"]
-            
-            if not self.checked_state.get(item_id, True):
-                future_paths.add(f_path.lower())
-                final_path_map[f_path] = f_path
-                continue
+    def _export_plan(self):
+        if not self.image_details_list: messagebox.showwarning("注意", "沒有可匯出的計畫。"); return
+        path = filedialog.asksaveasfilename(title="匯出圖像處理計畫", defaultextension=".csv", filetypes=PLAN_FILETYPES)
+        if not path: return
+        try: count = write_plan(path, self.iter_plan())
+        except OSError as e: messagebox.showerror("錯誤", f"無法寫入計畫檔: {e}"); return
+        self.app.log(f"ImagePane: 已匯出 {count} 筆計畫至 {path}")
 
-            base, ext = os.path.splitext(os.path.basename(f_path))
-            target_format = self.var_format.get()
-            new_ext = ext.lower() if target_format == "維持原格式" else "." + target_format.lower()
-            output_mode = self.var_output_mode.get()
-            dest_folder = os.path.dirname(f_path)
+    def _import_plan(self):
+        if self.worker_thread and self.worker_thread.is_alive(): messagebox.showwarning("注意", "目前已有任務執行中。"); return
+        path = filedialog.askopenfilename(title="匯入圖像處理計畫", filetypes=PLAN_FILETYPES)
+        if not path: return
+        known_images = getattr(self.app, 'data_state', {}).get("image_files", [])
+        in_place = self.var_output_mode.get() == "overwrite"
+        # 只有原地覆蓋 (覆蓋模式) 或與面板自身計算相同的輸出可寫入既有檔案，手動改寫的目標不可覆蓋其他檔案
+        allowed_existing = [(d["path"], final) for d, final in zip(self.image_details_list, self._get_plan())]
+        if in_place: allowed_existing += [(p, p) for p in known_images]
+        try: plan_tasks, errors = validate_plan(read_plan(path), known_images, allowed_existing=allowed_existing, include_in_place=in_place)
+        except (OSError, ValueError) as e: messagebox.showerror("錯誤", f"無法讀取計畫檔: {e}"); return
+        if errors:
+            for err in errors[:50]: self.app.log(f"[計畫驗證] {err}")
+            messagebox.showerror("計畫驗證失敗", f"共發現 {len(errors)} 個問題，詳情請見日誌。"); return
 
-            if output_mode == "resized": dest_folder = os.path.join(dest_folder, "resized")
-            elif output_mode == "custom": dest_folder = self.var_output_dir.get() or dest_folder
-
-            ideal_name = f"{base}{new_ext}"
-            final_path = os.path.join(dest_folder, ideal_name)
-            counter = 1
-            base_name, ext_name = os.path.splitext(ideal_name)
+        details_by_path = {os.path.normcase(d["path"]): d for d in self.image_details_list}
+        tasks_to_run = []
+        for src, dst in plan_tasks:
+            details = details_by_path.get(os.path.normcase(src))
+            if details is None:
+                details = {"path": src, "dims": "N/A", "size": 0}
+                try: details["size"] = os.path.getsize(src)
+                except OSError: pass
+                meta = self.meta_cache.get(src)
+                if meta: details.update(meta)
+            tasks_to_run.append({"details": details, "final_path": dst})
+        self._start_worker(tasks_to_run)
 
-            while final_path.lower() in future_paths:
-                final_name = f"{base_name}({counter}){ext_name}"
-                final_path = os.path.join(dest_folder, final_name)
-                counter += 1
-                
-            future_paths.add(final_path.lower())
-            final_path_map[f_path] = final_path
+    def _on_execute(self):
+        # 1. Path Calculation (與預覽共用同一份計畫，未變更時不會重新計算)
+        final_paths = self._get_plan()
+        item_ids = self.file_tree.get_children('')
 
         # 2. Task Packaging
-        tasks_to_run = []
-        for i, item_id in enumerate(item_ids):
-            if i >= len(self.image_details_list): continue
-            if self.checked_state.get(item_id, False):
-                original_path = self.image_details_list[i]['path']
-                task_info = {
-                    "details": self.image_details_list[i],
-                    "final_path": final_path_map.get(original_path, original_path)
-                }
-                tasks_to_run.append(task_info)
+        tasks_to_run = [{"details": details, "final_path": final_path}
+                        for item_id, details, final_path in zip(item_ids, self.image_details_list, final_paths)
+                        if self.checked_state.get(item_id, False)]
+        self._start_worker(tasks_to_run)
 
+    def _start_worker(self, tasks_to_run):
         if not tasks_to_run: messagebox.showwarning("注意", "沒有勾選任何可處理的檔案。"); return
             
-        if self.var_output_mode.get() == "overwrite" and self.var_warn_overwrite.get():
+        if self.var_variants_enabled.get():
+            try: parse_variants(self.var_variants.get())
+            except ValueError as e: messagebox.showerror("輸入錯誤", f"多重輸出設定錯誤: {e}"); return
+        elif self.var_output_mode.get() == "overwrite" and self.var_warn_overwrite.get():
             if not messagebox.askyesno("重大警告", f"您選擇了【覆蓋原始檔案】！\n此操作將修改 {len(tasks_to_run)} 個檔案且無法復原，確定要繼續嗎？"): return
         
         settings = self._get_settings_as_dict()
+        if settings["quality_mode"] != QUALITY_FIXED:
+            try: target = float(settings["quality_target"])
+            except ValueError: target = 0
+            if target <= 0 or (settings["quality_mode"] == QUALITY_SSIM_FLOOR and target > 1):
+                messagebox.showerror("輸入錯誤", "品質目標必須是正數 (目標大小以 KB 計，SSIM 下限介於 0 到 1 之間)。"); return
         if settings["resize_enabled"]:
             w_str, h_str = settings["width"], settings["height"]
             if (not w_str.isdigit() and w_str != "") or (not h_str.isdigit() and h_str != ""):
@@ -482,35 +659,83 @@ class ImageProcessingPane(ttk.Frame):
                     elif kind == "status": self.app.update_status(payload)
                     elif kind == "log": self.app.log(f"[圖像處理] {payload}")
                     elif kind == "summary": self.last_summary = payload
+                    elif kind == "probe": self._apply_probe_results(*payload)
+                    elif kind == "thumb": self._apply_thumbnail(*payload)
                     elif kind == "done":
-                        (status_code, status_text), summary, temp_dirs_to_delete = payload
+                        (status_code, status_text), summary = payload
                         self.app.update_status(f"狀態：{status_text}")
                         self.app.log(f"\n{'-'*20}\n[圖像處理] 總結報告:\n{summary}\n{'-'*20}\n")
 
                         if self.var_notify_complete.get():
                             title = "任務報告"
-                            if status_code == "cancel":
-                                msg = "圖像處理任務已被使用者中斷。"
-                                messagebox.showinfo(title, msg)
-                                if temp_dirs_to_delete and messagebox.askyesno("清理確認", "任務已中斷，是否要刪除已產生的暫存備份 (.temp) 資料夾？"):
-                                    self._cleanup_temp_dirs(temp_dirs_to_delete)
-                            else:
-                                msg = f"圖像處理任務已完成！\n\n{summary}"
-                                messagebox.showinfo(title, msg)
-                                self._cleanup_temp_dirs(temp_dirs_to_delete)
-                        else:
-                            if status_code == "ok": self._cleanup_temp_dirs(temp_dirs_to_delete)
+                            if status_code == "cancel": messagebox.showinfo(title, "圖像處理任務已被使用者中斷。\n已完成的檔案已寫入，未處理的原檔維持不變。")
+                            else: messagebox.showinfo(title, f"圖像處理任務已完成！\n\n{summary}")
                         
                         self.btn_execute.config(state="normal"); self.btn_cancel.config(state="disabled")
             finally: self.after(100, self._process_ui_queue)
                 
-    def _cleanup_temp_dirs(self, dirs_to_delete):
-        if not dirs_to_delete: return
-        for temp_dir in dirs_to_delete:
-            try:
-                shutil.rmtree(temp_dir)
-            except Exception as e:
-                self.app.log(f"警告: 無法自動刪除暫存資料夾 {temp_dir}: {e}")
+    def _on_toggle_thumbnails(self):
+        self.thumb_view_key = None
+        if not self.var_show_thumbnails.get():
+            self.thumb_generation += 1
+            self.thumb_canvas.delete("all"); self.thumb_slots.clear()
+
+    def _visible_thumbnail_paths(self):
+        all_items = self.file_tree.get_children('')
+        if not all_items or not self.image_details_list: return []
+        selection = self.file_tree.selection()
+        if selection:
+            indices = sorted(self.file_tree.index(item_id) for item_id in selection[:self.MAX_THUMBNAILS])
+        else:
+            top, bottom = self.file_tree.yview()
+            first = int(top * len(all_items))
+            last = min(len(all_items), int(bottom * len(all_items)) + 1, first + self.MAX_THUMBNAILS)
+            indices = range(first, last)
+        return [self.image_details_list[i]["path"] for i in indices if i < len(self.image_details_list)]
+
+    def _poll_thumbnail_view(self):
+        # 輪詢選取與捲動位置，變動時才重新排版與請求縮圖
+        try:
+            if self.var_show_thumbnails.get() and ImageTk is not None:
+                view_key = (self.file_tree.selection(), self.file_tree.yview(), len(self.image_details_list))
+                if view_key != self.thumb_view_key:
+                    self.thumb_view_key = view_key
+                    self._refresh_thumbnails()
+        finally: self.after(250, self._poll_thumbnail_view)
+
+    def _refresh_thumbnails(self):
+        paths = self._visible_thumbnail_paths()
+        self.thumb_generation += 1
+        self.thumb_canvas.delete("all"); self.thumb_slots.clear()
+        cell_w = THUMB_SIZE[0] + 10
+        missing = []
+        for i, f_path in enumerate(paths):
+            x = i * cell_w + 5
+            self.thumb_slots[f_path] = x
+            self.thumb_canvas.create_rectangle(x, 2, x + THUMB_SIZE[0], 2 + THUMB_SIZE[1], outline="#cccccc")
+            self.thumb_canvas.create_text(x + THUMB_SIZE[0] // 2, THUMB_SIZE[1] + 14, text=os.path.basename(f_path)[:22], width=THUMB_SIZE[0])
+            if f_path in self.thumb_photos:
+                self.thumb_photos.move_to_end(f_path)
+                self._draw_thumbnail(f_path)
+            else: missing.append(f_path)
+        self.thumb_canvas.configure(scrollregion=(0, 0, max(1, len(paths) * cell_w + 5), THUMB_SIZE[1] + 26))
+        if missing:
+            if self.thumb_worker is None or not self.thumb_worker.is_alive():
+                self.thumb_worker = ThumbnailWorker(self.thumb_cache, self.ui_queue); self.thumb_worker.start()
+            self.thumb_worker.request(self.thumb_generation, missing)
+
+    def _apply_thumbnail(self, generation, f_path, thumb):
+        if thumb is None or ImageTk is None: return
+        self.thumb_photos[f_path] = ImageTk.PhotoImage(thumb)
+        self.thumb_photos.move_to_end(f_path)
+        while len(self.thumb_photos) > self.MAX_THUMBNAIL_PHOTOS: self.thumb_photos.popitem(last=False)
+        if generation == self.thumb_generation: self._draw_thumbnail(f_path)
+
+    def _draw_thumbnail(self, f_path):
+        x = self.thumb_slots.get(f_path)
+        photo = self.thumb_photos.get(f_path)
+        if x is None or photo is None: return
+        self.thumb_canvas.create_image(x + THUMB_SIZE[0] // 2, 2 + THUMB_SIZE[1] // 2, image=photo)
 
     def _browse_output_dir(self):
         path = filedialog.askdirectory(title="選擇自訂輸出資料夾")
@@ -522,6 +747,7 @@ class ImageProcessingPane(ttk.Frame):
         else: messagebox.showwarning("注意", "自訂輸出路徑無效或不存在。")
 
     def _update_visual_check_state(self, item_ids, state):
+        self.checked_version += 1
         tag, symbol = (('checked',), '☑') if state else ((), '☐')
         for item_id in item_ids:
             values = list(self.file_tree.item(item_id, 'values')); values[0] = symbol
@@ -563,120 +789,130 @@ class ImageProcessingPane(ttk.Frame):
     def _select_all(self): self._set_all_checks(True)
     def _clear_all(self): self._set_all_checks(False)
 
+class ImageProbeWorker(threading.Thread):
+    """以執行緒池只讀取檔頭取得中繼資料 (優先使用持久化快取)，結果分批送回 UI 佇列。"""
+    BATCH_SIZE = 200
+
+    def __init__(self, paths, generation, ui_queue, stop_event, meta_cache=None, max_workers=None):
+        super().__init__(daemon=True)
+        self.paths = paths
+        self.generation = generation
+        self.ui_queue = ui_queue
+        self.stop_event = stop_event
+        self.meta_cache = meta_cache
+        self.max_workers = max_workers or min(8, (os.cpu_count() or 1) * 2)
+
+    def _probe(self, path):
+        info = {}
+        signature = file_signature(path)
+        if signature: info["size"] = signature[0]
+        cached = self.meta_cache.get(path, signature) if self.meta_cache and signature else None
+        if cached: info.update(cached); return path, info
+        try: meta = probe_image_meta(path)
+        except Exception as e: info["error"] = str(e); return path, info
+        info.update(meta)
+        if self.meta_cache: self.meta_cache.put(path, signature, meta)
+        return path, info
+
+    def run(self):
+        path_iter = iter(self.paths)
+        pending, batch = set(), []
+        last_flush = time.time()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while True:
+                while not self.stop_event.is_set() and len(pending) < self.max_workers * 4:
+                    path = next(path_iter, None)
+                    if path is None: break
+                    pending.add(executor.submit(self._probe, path))
+                if not pending: break
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                batch.extend(fut.result() for fut in finished)
+                now = time.time()
+                if len(batch) >= self.BATCH_SIZE or now - last_flush > 0.1:
+                    self._flush(batch); batch = []; last_flush = now
+        if batch and not self.stop_event.is_set(): self._flush(batch)
+        if self.meta_cache: self.meta_cache.flush()
+
+    def _flush(self, batch):
+        if batch and not self.stop_event.is_set(): self.ui_queue.put(("probe", (self.generation, batch)))
+
+class ThumbnailWorker(threading.Thread):
+    """
+    常駐的縮圖產生執行緒。只處理最新一次的請求：捲動或改變選取後，舊請求中尚未產生的縮圖會被放棄。
+    結果以 PIL 影像送回 UI 佇列，由 Tk 執行緒轉為 PhotoImage。
+    """
+    def __init__(self, thumb_cache, ui_queue, max_workers=None):
+        super().__init__(daemon=True)
+        self.thumb_cache = thumb_cache
+        self.ui_queue = ui_queue
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self._request = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+
+    def request(self, generation, paths):
+        with self._lock: self._request = (generation, list(paths))
+        self._wakeup.set()
+
+    def _is_current(self, generation):
+        with self._lock: return self._request is not None and self._request[0] == generation
+
+    def _make(self, f_path):
+        try: return f_path, self.thumb_cache.get_or_create(f_path)
+        except Exception: return f_path, None
+
+    def run(self):
+        self.thumb_cache.prune_disk()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while True:
+                self._wakeup.wait(); self._wakeup.clear()
+                with self._lock: generation, paths = self._request
+                for start in range(0, len(paths), self.max_workers):
+                    if not self._is_current(generation): break
+                    for f_path, thumb in executor.map(self._make, paths[start:start + self.max_workers]):
+                        self.ui_queue.put(("thumb", (generation, f_path, thumb)))
+
 class ImageWorker(threading.Thread):
     def __init__(self, tasks_to_run, settings, ui_queue, cancel_event):
         super().__init__(daemon=True)
-        self.tasks = tasks_to_run
+        # details 與 probe_cache 是同一個物件，Tk 執行緒仍會更新它；在 Tk 執行緒建立淺複本，避免送進程序池序列化時被改動
+        self.tasks = [dict(task_info, details=dict(task_info["details"])) for task_info in tasks_to_run]
         self.settings = settings
         self.ui_queue = ui_queue
         self.cancel_event = cancel_event
         self.total_original_size = 0
         self.total_processed_size = 0
         self.processed_count = 0
+        self.skipped_count = 0
+        self.skipped_work = 0
+        self.lossless_count = 0
         self.start_time = time.time()
+        # 覆蓋模式的輸出即來源本身，無法判斷是否已處理過，因此只在輸出到其他位置時使用清單
+        # 多重輸出的檔名取決於解碼後的尺寸，無法事先比對，因此也不使用清單
+        self.use_manifest = settings.get("skip_unchanged", True) and settings["output_mode"] != "overwrite" and not settings.get("variants_enabled")
+        self.settings_fp = settings_fingerprint(settings)
+        self.manifests = {}
 
     def run(self):
         total_files = len(self.tasks)
-        created_temp_dirs = set()
+        try: workers = max(1, int(self.settings.get("workers", 1)))
+        except (TypeError, ValueError): workers = 1
+        self._assign_work()
+        self.tracker = ProgressTracker(total_files, sum(task_info["work"] for task_info in self.tasks))
+        if self.use_manifest: self._skip_up_to_date()
+        self.tracker.skip(self.skipped_count, self.skipped_work)
+        self._plan_memory()
+        tasks_by_path = {task_info["details"]["path"]: task_info for task_info in self.tasks}
 
-        for i, task_info in enumerate(self.tasks):
-            if self.cancel_event.is_set(): break
-            
-            details = task_info["details"]
-            output_path = task_info["final_path"]
-            filepath, original_size = details["path"], details["size"]
-            self.total_original_size += original_size
-            
-            try:
-                is_overwrite_mode = self.settings["output_mode"] == "overwrite"
-                backup_path = filepath
-
-                if is_overwrite_mode:
-                    parent_dir = os.path.dirname(filepath)
-                    temp_dir = os.path.join(parent_dir, ".temp")
-                    if not os.path.exists(temp_dir):
-                        os.makedirs(temp_dir)
-                        if os.name == 'nt':
-                            try:
-                                import ctypes; FILE_ATTRIBUTE_HIDDEN = 0x02
-                                ctypes.windll.kernel32.SetFileAttributesW(temp_dir, FILE_ATTRIBUTE_HIDDEN)
-                            except Exception: pass
-                    created_temp_dirs.add(temp_dir)
-                    backup_target_path = os.path.join(temp_dir, os.path.basename(filepath))
-                    if os.path.exists(filepath): shutil.move(filepath, backup_target_path)
-                    backup_path = backup_target_path
-
-                with Image.open(backup_path) as img:
-                    # Capture Exif before any operations
-                    exif_data = img.info.get('exif')
-                    
-                    img = ImageOps.exif_transpose(img)
-                    
-                    if self.settings["resize_enabled"]:
-                        w, h = img.size
-                        sw, sh = w, h
-                        resize_mode = self.settings["resize_mode"]
-                        w_str = self.settings["width"]
-                        h_str = self.settings["height"]
-                        
-                        try:
-                            if resize_mode == "像素":
-                                sw_val = int(w_str) if w_str.isdigit() else 0
-                                sh_val = int(h_str) if h_str.isdigit() else 0
-                                if self.settings["keep_ratio"] and w > 0 and h > 0:
-                                    ratio = w / h
-                                    if sw_val > 0 and sh_val <=0: sh_val = int(sw_val / ratio)
-                                    elif sh_val > 0 and sw_val <=0: sw_val = int(sh_val * ratio)
-                                sw, sh = sw_val, sh_val
-                            elif resize_mode == "百分比":
-                                percent_w = int(w_str) if w_str.isdigit() else 0
-                                percent_h = int(h_str) if h_str.isdigit() else 0
-                                if self.settings["keep_ratio"]:
-                                    if percent_w > 0 and percent_h <= 0: percent_h = percent_w
-                                    elif percent_h > 0 and percent_w <= 0: percent_w = percent_h
-                                if percent_w <= 0: percent_w = 100
-                                if percent_h <= 0: percent_h = 100
-                                sw, sh = int(w * percent_w / 100), int(h * percent_h / 100)
-                        except (ValueError, TypeError, ZeroDivisionError): sw, sh = w, h
-                        
-                        if not (sw > 0 and sh > 0): sw, sh = w, h
-                        if self.settings["scale_rule"] == "僅縮小，不放大" and (sw > w or sh > h): sw, sh = w, h
-                        if (sw, sh) != (w, h): img = img.resize((sw, sh), Image.Resampling.LANCZOS)
-                    
-                    save_options = {}
-                    target_format_str = self.settings["format"]
-                    output_format_name = img.format or "JPEG" if target_format_str == "維持原格式" else target_format_str
-
-                    if output_format_name.upper() in ["JPEG", "JPG"]:
-                        save_options['quality'] = self.settings["quality"]
-                        if self.settings["quality"] >= 95 and self.settings["max_quality_detail"]: save_options['subsampling'] = 0
-                        if img.mode in ("RGBA", "P"): img = img.convert("RGB")
-                    elif output_format_name.upper() == "WEBP":
-                        save_options['quality'] = self.settings["quality"]
-                    
-                    # Inject Exif if requested and available
-                    if self.settings["keep_exif"] and exif_data:
-                         save_options['exif'] = exif_data
-
-                    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-                    img.save(output_path, **save_options)
-                    
-                    new_size = os.path.getsize(output_path)
-                    self.total_processed_size += new_size
-                    self.processed_count += 1
-                    percent_change = ((new_size - original_size) / original_size) * 100 if original_size > 0 else 0
-                    self.ui_queue.put(("log", f"成功: {os.path.basename(filepath)} ({format_size(original_size)} -> {format_size(new_size)}, {percent_change:+.1f}%)"))
-
-            except Exception as e:
-                self.ui_queue.put(("log", f"❌ 失敗: {os.path.basename(filepath)} - {e}"))
-                if is_overwrite_mode and os.path.exists(backup_path):
-                    try:
-                        shutil.move(backup_path, filepath)
-                        self.ui_queue.put(("log", f"還原: 已成功還原原始檔案 {os.path.basename(filepath)}"))
-                    except Exception as move_back_e:
-                        self.ui_queue.put(("log", f"嚴重錯誤: 無法還原檔案 {os.path.basename(filepath)}: {move_back_e}"))
-            finally:
-                self._update_status(i + 1, total_files, self.start_time)
+        results = self._iter_pool_results(workers) if workers > 1 and len(self.tasks) > 1 else self._iter_serial_results()
+        for result in results:
+            self._handle_result(result)
+            task_info = tasks_by_path.get(result["path"], {})
+            self.tracker.item_done(task_info.get("work", 0), name=os.path.basename(result["path"]), seconds=result.get("elapsed"),
+                                   bytes_count=result["original_size"], pixels=task_info.get("pixels", 0) if result["ok"] else 0)
+            self._update_status()
+        if self.skipped_count == total_files: self._update_status()
+        for manifest in self.manifests.values(): manifest.save()
         
         end_time = time.time()
         duration = end_time - self.start_time
@@ -689,23 +925,113 @@ class ImageWorker(threading.Thread):
             f"總大小比例: {total_percent_change:+.1f}%\n"
             f"總花費時間: {duration:.2f} 秒"
         )
-        final_status_tuple = ("cancel", "任務已中斷 (備份未刪除)") if self.cancel_event.is_set() else ("ok", "完成")
-        payload = (final_status_tuple, summary, list(created_temp_dirs))
+        if self.lossless_count: summary += f"\n無損處理 (未重新編碼): {self.lossless_count}"
+        if self.skipped_count: summary += f"\n略過 (輸出已是最新): {self.skipped_count}"
+        if workers > 1: summary += f"\n平行程序數: {workers}"
+        if self.oversized_count: summary += f"\n超過記憶體預算 (單獨處理): {self.oversized_count}"
+        summary += f"\n{self.tracker.summary_text()}"
+        final_status_tuple = ("cancel", "任務已中斷") if self.cancel_event.is_set() else ("ok", "完成")
+        payload = (final_status_tuple, summary)
         self.ui_queue.put(("done", payload))
 
-    def _update_status(self, current, total, start_time):
-        now = time.time()
-        if now - getattr(self, 'last_update_time', 0) > 0.1:
-            self.last_update_time = now
-            elapsed = now - self.start_time
-            speed = current / elapsed if elapsed > 0 else 0
-            remaining_items = total - current
-            eta_str = "..."
-            if speed > 0:
-                eta = remaining_items / speed
-                eta_str = f"{int(eta // 60)} 分 {int(eta % 60)} 秒" if eta > 60 else f"{eta:.1f} 秒"
-            self.ui_queue.put(("progress", int((current / total) * 100)))
-            self.ui_queue.put(("status", f"處理中... ({current}/{total}, 剩餘 {remaining_items:,} 個, 預計 {eta_str})"))
+    def _iter_serial_results(self):
+        for task_info in self.tasks:
+            if self.cancel_event.is_set(): break
+            yield run_image_task(task_info, self.settings)
+
+    def _assign_work(self):
+        """以像素數作為每個任務的工作量；尚未探測到尺寸的檔案，依已知圖片的平均每位元組像素數由檔案大小推估。"""
+        known_pixels = known_bytes = 0
+        for task_info in self.tasks:
+            details = task_info["details"]
+            if details.get("width") and details.get("height") and details.get("size"):
+                known_pixels += details["width"] * details["height"]; known_bytes += details["size"]
+        pixels_per_byte = known_pixels / known_bytes if known_bytes else 1.0
+        for task_info in self.tasks:
+            details = task_info["details"]
+            task_info["pixels"] = (details.get("width") or 0) * (details.get("height") or 0)
+            task_info["work"] = task_info["pixels"] or max(1, int((details.get("size") or 0) * pixels_per_byte))
+
+    def _manifest_for(self, output_path):
+        out_dir = os.path.dirname(os.path.abspath(output_path))
+        if out_dir not in self.manifests: self.manifests[out_dir] = OutputManifest(out_dir)
+        return self.manifests[out_dir]
+
+    def _skip_up_to_date(self):
+        """來源簽章、設定指紋與輸出簽章皆與清單相符的任務直接略過。"""
+        remaining = []
+        for task_info in self.tasks:
+            if self._manifest_for(task_info["final_path"]).is_up_to_date(task_info["final_path"], task_info["details"]["path"], self.settings_fp):
+                self.skipped_count += 1; self.skipped_work += task_info["work"]
+            else: remaining.append(task_info)
+        self.tasks = remaining
+        if self.skipped_count: self.ui_queue.put(("log", f"略過 {self.skipped_count} 個輸出已是最新的檔案。"))
+
+    def _plan_memory(self):
+        """依檔頭估計每個任務的記憶體峰值；超過預算的任務標記為 low_memory (JPEG 強制草稿解碼) 並於排程時單獨執行。"""
+        try: self.memory_budget = max(256, int(self.settings.get("memory_budget_mb", 2048))) * 1024 * 1024
+        except (TypeError, ValueError): self.memory_budget = 2048 * 1024 * 1024
+        self.oversized_count = 0
+        for task_info in self.tasks:
+            task_info["memory_estimate"] = estimate_task_memory(task_info["details"], self.settings)
+            if task_info["memory_estimate"] > self.memory_budget:
+                task_info["low_memory"] = True
+                self.oversized_count += 1
+
+    def _iter_pool_results(self, workers):
+        """
+        以 ProcessPool 平行處理；送出前檢查進行中任務的估計記憶體總和不超過預算，
+        超過預算的大型圖像會等其他任務完成後單獨執行。取消時停止送出新任務，並等待進行中的任務完成後回報。
+        """
+        task_iter = iter(self.tasks)
+        pending = {}
+        in_flight_bytes = 0
+        next_task = next(task_iter, None)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            while True:
+                while not self.cancel_event.is_set() and next_task is not None and len(pending) < workers * 2:
+                    estimate = next_task["memory_estimate"]
+                    if pending and (next_task.get("low_memory") or in_flight_bytes + estimate > self.memory_budget): break
+                    if next_task.get("low_memory"):
+                        self.ui_queue.put(("log", f"大型圖像 (估計 {format_size(estimate)}) 單獨處理: {os.path.basename(next_task['details']['path'])}"))
+                    pending[executor.submit(run_image_task, next_task, self.settings)] = next_task
+                    in_flight_bytes += estimate
+                    running_alone = next_task.get("low_memory")
+                    next_task = next(task_iter, None)
+                    if running_alone: break
+                if not pending: break
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    task_info = pending.pop(fut)
+                    in_flight_bytes -= task_info["memory_estimate"]
+                    try: yield fut.result()
+                    except Exception as e:
+                        yield {"path": task_info["details"]["path"], "output_path": task_info["final_path"], "ok": False, "original_size": task_info["details"].get("size", 0),
+                               "new_size": 0, "error": str(e), "messages": []}
+
+    def _handle_result(self, result):
+        filepath, original_size = result["path"], result["original_size"]
+        self.total_original_size += original_size
+        if result["ok"]:
+            new_size = result["new_size"]
+            self.total_processed_size += new_size
+            self.processed_count += 1
+            if self.use_manifest: self._manifest_for(result["output_path"]).record(result["output_path"], filepath, self.settings_fp)
+            percent_change = ((new_size - original_size) / original_size) * 100 if original_size > 0 else 0
+            method = "".join(f" [{result[key]}]" for key in ("method", "quality_note") if result.get(key))
+            if result.get("method"): self.lossless_count += 1
+            self.ui_queue.put(("log", f"成功: {os.path.basename(filepath)} ({format_size(original_size)} -> {format_size(new_size)}, {percent_change:+.1f}%){method}"))
+        else:
+            self.ui_queue.put(("log", f"❌ 失敗: {os.path.basename(filepath)} - {result['error']}"))
+        for output_path, (w, h), out_size in result.get("outputs", []):
+            self.ui_queue.put(("log", f"  → {output_path} ({w}x{h}, {format_size(out_size)})"))
+        for message in result["messages"]: self.ui_queue.put(("log", message))
+
+    def _update_status(self):
+        # 進度與 ETA 以像素數加權，單張超大圖不會讓估計失準
+        if not self.tracker.should_emit(0.1): return
+        self.ui_queue.put(("progress", self.tracker.percent()))
+        self.ui_queue.put(("status", self.tracker.status_text("處理中...")))
 
 if __name__ == '__main__':
     root = ensure_tk_with_dnd()
@@ -1,6 +1,6 @@
 # main.py
-# version: 4.1.1 (Res 720x1080 & Fixed Layout Ratio)
-__version__ = "4.1.1"
+# version: 4.2.0 (Duplicate Finder & File Size Index)
+__version__ = "4.2.0"
 
 import os
 import sys
@@ -8,6 +8,7 @@ import time
 import json
 import queue
 import threading
+import multiprocessing
 import tkinter as tk
 from tkinter import ttk, filedialog
 from tkinterdnd2 import DND_FILES
@@ -18,6 +19,7 @@ from folder_pane import FolderOrganizerPane
 from image_pane import ImageProcessingPane
 from video_pane import VideoOrganizerPane
 from delete_pane import DeletePane
+from dupe_pane import DuplicateFinderPane
 from utils import format_size, ensure_tk_with_dnd
 
 sys.setrecursionlimit(2000)
@@ -36,7 +38,7 @@ class ModularOrganizerApp:
         self.data_state = { 
             "root_folder": "", 
             "all_files": [], "image_files": [], "video_files": [], "other_files": [], 
-            "folders": [], "total_size": 0 
+            "folders": [], "total_size": 0, "file_sizes": {}
         }
         self.scan_queue = queue.Queue()
         
@@ -110,13 +112,15 @@ class ModularOrganizerApp:
         self.panes["image"] = ImageProcessingPane(self.content_area, self)
         self.panes["video"] = VideoOrganizerPane(self.content_area, self)
         self.panes["delete"] = DeletePane(self.content_area, self, app_dir=self.app_dir)
+        self.panes["dupe"] = DuplicateFinderPane(self.content_area, self)
 
         tabs_info = [
             ("file", "📁 檔案整理"), 
             ("folder", "📂 資料夾整理"), 
             ("image", "🎨 圖像處理"), 
             ("video", "🎬 影像處理"),
-            ("delete", "💥 資料夾刪除")
+            ("delete", "💥 資料夾刪除"),
+            ("dupe", "🧬 重複檔案")
         ]
         
         for key, text in tabs_info:
@@ -158,7 +162,7 @@ class ModularOrganizerApp:
             self.data_state = { 
                 "root_folder": folder, 
                 "all_files": [], "image_files": [], "video_files": [], "other_files": [], 
-                "folders": [], "total_size": 0 
+                "folders": [], "total_size": 0, "file_sizes": {}
             }
             self._notify_panes(clear_only=True)
             self.update_status(f"分析結構中... {folder}")
@@ -170,6 +174,7 @@ class ModularOrganizerApp:
         all_files, img_files, vid_files, other_files = [], [], [], []
         folders = []
         total_size = 0
+        file_sizes = {}
 
         for p in paths:
             if os.path.isfile(p):
@@ -178,7 +183,7 @@ class ModularOrganizerApp:
                 if ext in IMAGE_EXTS: img_files.append(p)
                 elif ext in VIDEO_EXTS: vid_files.append(p)
                 else: other_files.append(p)
-                try: total_size += os.path.getsize(p)
+                try: file_sizes[p] = os.path.getsize(p); total_size += file_sizes[p]
                 except: pass
             elif os.path.isdir(p):
                 folders.append(p)
@@ -186,7 +191,7 @@ class ModularOrganizerApp:
                     for f in fs:
                         f_path = os.path.join(r, f)
                         all_files.append(f_path)
-                        try: total_size += os.path.getsize(f_path)
+                        try: file_sizes[f_path] = os.path.getsize(f_path); total_size += file_sizes[f_path]
                         except: pass
                         ext = os.path.splitext(f)[1].lower()
                         if ext in IMAGE_EXTS: img_files.append(f_path)
@@ -202,7 +207,8 @@ class ModularOrganizerApp:
                 "video_files": vid_files,
                 "other_files": other_files,
                 "folders": folders,
-                "total_size": total_size
+                "total_size": total_size,
+                "file_sizes": file_sizes
             }
             self._notify_panes()
             if vid_files and not img_files:
@@ -221,6 +227,7 @@ class ModularOrganizerApp:
         root_folder = self.data_state["root_folder"]
         all_files, img_files, vid_files, other_files, folders = [], [], [], [], []
         total_size = 0
+        file_sizes = {}
         last_update_time = time.time()
         stack = [root_folder]
         try:
@@ -233,7 +240,7 @@ class ModularOrganizerApp:
                                 folders.append(entry.path); stack.append(entry.path)
                             elif entry.is_file():
                                 f_path = entry.path; all_files.append(f_path)
-                                try: total_size += entry.stat().st_size
+                                try: file_sizes[f_path] = entry.stat().st_size; total_size += file_sizes[f_path]
                                 except OSError: pass
                                 ext = os.path.splitext(entry.name)[1].lower()
                                 if ext in IMAGE_EXTS: img_files.append(f_path)
@@ -244,7 +251,7 @@ class ModularOrganizerApp:
                         last_update_time = time.time()
                 except (PermissionError, OSError): continue
 
-            final_data_state = { "all_files": all_files, "image_files": img_files, "video_files": vid_files, "other_files": other_files, "folders": folders, "total_size": total_size }
+            final_data_state = { "all_files": all_files, "image_files": img_files, "video_files": vid_files, "other_files": other_files, "folders": folders, "total_size": total_size, "file_sizes": file_sizes }
             self.scan_queue.put(("done", final_data_state))
         except Exception as e:
             self.log(f"掃描錯誤: {e}"); self.scan_queue.put(("done", {}))
@@ -280,6 +287,8 @@ class ModularOrganizerApp:
         self.log_text.see("end"); self.log_text.config(state="disabled")
 
 if __name__ == "__main__":
+    # 重複檔案搜尋等功能使用 ProcessPool，打包成 exe 後需要此呼叫
+    multiprocessing.freeze_support()
     root = ensure_tk_with_dnd()
     app = ModularOrganizerApp(root)
     root.mainloop()
\ No newline at end of file
@@ -0,0 +1,100 @@
+# plan_io.py
+# version: 1.0.1 (Scoped Overwrite Allowance)
+__version__ = "1.0.1"
+
+import os
+import csv
+import json
+
+# 計畫檔欄位：來源路徑、目標路徑、是否勾選
+PLAN_FIELDS = ("src", "dst", "checked")
+PLAN_FILETYPES = [("CSV 計畫檔", "*.csv"), ("JSONL 計畫檔", "*.jsonl"), ("所有檔案", "*.*")]
+
+def _plan_format(path):
+    return "jsonl" if os.path.splitext(path)[1].lower() in (".jsonl", ".ndjson", ".json") else "csv"
+
+def _parse_checked(value):
+    if isinstance(value, bool): return value
+    return str(value).strip().lower() in ("1", "true", "yes", "y", "☑")
+
+def _norm(path):
+    return os.path.normcase(os.path.normpath(path))
+
+def write_plan(path, rows):
+    """逐列串流寫出 (src, dst, checked)，rows 可為產生器，不會另外複製一份完整計畫。回傳寫出筆數。"""
+    count = 0
+    if _plan_format(path) == "csv":
+        # utf-8-sig 讓 Excel 可以正確顯示中文路徑，方便手動編修
+        with open(path, "w", encoding="utf-8-sig", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(PLAN_FIELDS)
+            for src, dst, checked in rows:
+                writer.writerow((src, dst, 1 if checked else 0)); count += 1
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            for src, dst, checked in rows:
+                f.write(json.dumps({"src": src, "dst": dst, "checked": bool(checked)}, ensure_ascii=False) + "\n"); count += 1
+    return count
+
+def read_plan(path):
+    """逐列串流讀取計畫檔，產生 (line_no, src, dst, checked)。格式錯誤時拋出 ValueError。"""
+    if _plan_format(path) == "csv":
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            reader = csv.reader(f)
+            header = next(reader, None)
+            if not header or [h.strip().lower() for h in header[:3]] != list(PLAN_FIELDS):
+                raise ValueError(f"CSV 標題列必須為: {','.join(PLAN_FIELDS)}")
+            for line_no, row in enumerate(reader, start=2):
+                if not row or not any(cell.strip() for cell in row): continue
+                if len(row) < 2: raise ValueError(f"第 {line_no} 行欄位不足")
+                checked = _parse_checked(row[2]) if len(row) > 2 else True
+                yield line_no, row[0].strip(), row[1].strip(), checked
+    else:
+        with open(path, "r", encoding="utf-8-sig") as f:
+            for line_no, line in enumerate(f, start=1):
+                if not line.strip(): continue
+                try: entry = json.loads(line)
+                except json.JSONDecodeError as e: raise ValueError(f"第 {line_no} 行 JSON 格式錯誤: {e}")
+                if not isinstance(entry, dict) or "src" not in entry or "dst" not in entry:
+                    raise ValueError(f"第 {line_no} 行缺少 src/dst 欄位")
+                yield line_no, str(entry["src"]).strip(), str(entry["dst"]).strip(), _parse_checked(entry.get("checked", True))
+
+def validate_plan(entries, known_sources, allowed_existing=(), include_in_place=False):
+    """
+    依目前 data_state 驗證計畫。回傳 (tasks, errors)：
+    tasks 為勾選且有變更的 (src, dst) 清單，errors 為人類可讀的錯誤訊息。
+    allowed_existing 為允許寫入既有檔案的 (src, dst) 組合 (例如圖像原地覆蓋或與面板自身計算相同的輸出)，其餘既有目標一律視為衝突；
+    include_in_place=True 時 src == dst 的勾選項目也視為任務 (原地覆蓋處理)。
+    """
+    known = {_norm(p) for p in known_sources}
+    allowed = {(_norm(src), _norm(dst)) for src, dst in allowed_existing}
+    tasks, errors = [], []
+    seen_src, seen_dst = set(), set()
+    occupied = []
+
+    for line_no, src, dst, checked in entries:
+        if not src: errors.append(f"第 {line_no} 行: 來源路徑為空"); continue
+        n_src = _norm(src)
+        if n_src not in known: errors.append(f"第 {line_no} 行: 來源不在目前載入的資料中 ({src})"); continue
+        if n_src in seen_src: errors.append(f"第 {line_no} 行: 來源重複 ({src})"); continue
+        seen_src.add(n_src)
+        if not os.path.exists(src): errors.append(f"第 {line_no} 行: 來源不存在 ({src})"); continue
+
+        in_place = bool(dst) and n_src == _norm(dst)
+        if not checked or not dst or (in_place and not include_in_place):
+            # 未處理的項目仍佔用其原始路徑
+            if n_src in seen_dst: errors.append(f"第 {line_no} 行: 與其他項目的目標衝突 ({src})")
+            seen_dst.add(n_src)
+            continue
+
+        n_dst = _norm(dst)
+        if n_dst in seen_dst: errors.append(f"第 {line_no} 行: 目標重複 ({dst})"); continue
+        seen_dst.add(n_dst)
+        occupied.append((line_no, n_src, dst))
+        tasks.append((src, dst))
+
+    # 依序執行時既有目標可能被覆蓋 (例如 a→b、b→a 互換)，因此除明確允許的組合外一律視為衝突
+    for line_no, n_src, dst in occupied:
+        if (n_src, _norm(dst)) not in allowed and os.path.exists(dst):
+            errors.append(f"第 {line_no} 行: 目標已存在 ({dst})")
+    return tasks, errors
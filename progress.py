@@ -0,0 +1,124 @@
+# progress.py
+# version: 1.0.0 (Work-Weighted Progress & Throughput)
+__version__ = "1.0.0"
+
+# 不依賴 tkinter 的共用進度模型：進度與 ETA 以工作量 (位元組、像素或媒體秒數) 計算而非項目數，
+# 速率以指數移動平均 (EMA) 平滑，並記錄每個項目的處理時間，供任務結束後列出最慢的項目。
+
+import time
+import heapq
+
+def format_duration(seconds):
+    if seconds is None: return "..."
+    if seconds >= 3600: return f"{int(seconds // 3600)} 時 {int(seconds % 3600 // 60)} 分"
+    if seconds >= 60: return f"{int(seconds // 60)} 分 {int(seconds % 60)} 秒"
+    return f"{seconds:.1f} 秒"
+
+class ProgressTracker:
+    """
+    total_work 為所有項目的工作量總和，單位由呼叫端決定，只要與 item_done/advance 一致即可。
+    advance() 回報進行中項目目前已完成的工作量 (以 key 區分可同時進行多個項目)，item_done() 時清除。
+    非執行緒安全，應由單一工作執行緒使用。
+    """
+    def __init__(self, total_items, total_work, alpha=0.3, sample_interval=0.5, slowest_n=5):
+        self.total_items = total_items
+        self.total_work = max(0, total_work)
+        self.alpha = alpha
+        self.sample_interval = sample_interval
+        self.slowest_n = slowest_n
+        self.done_items = self.skipped_items = 0
+        self.done_work = self.skipped_work = 0.0
+        self.bytes_done = self.pixels_done = 0
+        self.start_time = time.time()
+        self.last_emit = 0
+        self._partial = {}
+        self._rate = None
+        self._sample_time, self._sample_work = self.start_time, 0.0
+        self._slowest = []
+        self._seq = 0
+
+    @property
+    def completed_work(self):
+        return min(self.total_work, self.done_work + sum(self._partial.values())) if self.total_work else self.done_work
+
+    def skip(self, items=1, work=0):
+        """不需處理即已完成的項目 (例如輸出已是最新)：計入進度，但不拉高速率估計。"""
+        self.done_items += items; self.skipped_items += items
+        self.done_work += work; self.skipped_work += work; self._sample_work += work
+
+    def advance(self, work, key=None):
+        self._partial[key] = work
+        self._sample()
+
+    def item_done(self, work, name=None, seconds=None, bytes_count=0, pixels=0, key=None):
+        self._partial.pop(key, None)
+        self.done_items += 1; self.done_work += work
+        self.bytes_done += bytes_count; self.pixels_done += pixels
+        if name is not None and seconds is not None:
+            self._seq += 1
+            entry = (seconds, self._seq, name)
+            if len(self._slowest) < self.slowest_n: heapq.heappush(self._slowest, entry)
+            else: heapq.heappushpop(self._slowest, entry)
+        self._sample()
+
+    def _sample(self):
+        # 每隔 sample_interval 以這段期間的工作量計算瞬時速率，再併入 EMA
+        now = time.time()
+        if now - self._sample_time < self.sample_interval: return
+        completed = self.completed_work
+        rate = (completed - self._sample_work) / (now - self._sample_time)
+        self._rate = rate if self._rate is None else self.alpha * rate + (1 - self.alpha) * self._rate
+        self._sample_time, self._sample_work = now, completed
+
+    @property
+    def fraction(self):
+        if self.total_work: return self.completed_work / self.total_work
+        return self.done_items / self.total_items if self.total_items else 1.0
+
+    def percent(self):
+        return int(self.fraction * 100)
+
+    def eta(self):
+        """剩餘秒數；尚無足夠樣本時回傳 None。"""
+        remaining = self.total_work - self.completed_work
+        if remaining <= 0: return 0.0
+        rate = self._rate
+        if not rate:
+            # 第一個取樣前以整體平均估計
+            elapsed = time.time() - self.start_time
+            worked = self.completed_work - self.skipped_work
+            rate = worked / elapsed if elapsed > 0 else 0
+        return remaining / rate if rate > 0 else None
+
+    def should_emit(self, interval=0.2):
+        """節流 UI 更新：距離上次超過 interval 秒或已全部完成時回傳 True。"""
+        now = time.time()
+        if now - self.last_emit < interval and self.done_items < self.total_items: return False
+        self.last_emit = now
+        return True
+
+    def rates(self):
+        elapsed = max(time.time() - self.start_time, 1e-6)
+        return {"items": (self.done_items - self.skipped_items) / elapsed, "mb": self.bytes_done / elapsed / (1024 * 1024), "mp": self.pixels_done / elapsed / 1e6}
+
+    def rates_text(self):
+        rates = self.rates()
+        parts = [f"{rates['items']:.1f} 個/秒"]
+        if self.bytes_done: parts.append(f"{rates['mb']:.1f} MB/秒")
+        if self.pixels_done: parts.append(f"{rates['mp']:.1f} MP/秒")
+        return ", ".join(parts)
+
+    def status_text(self, label):
+        remaining = self.total_items - self.done_items
+        return f"{label} ({self.done_items:,}/{self.total_items:,}, 剩餘 {remaining:,} 個, {self.rates_text()}, 預計 {format_duration(self.eta())})"
+
+    def slowest(self):
+        return [(seconds, name) for seconds, _, name in sorted(self._slowest, reverse=True)]
+
+    def summary_text(self):
+        lines = [f"平均速率: {self.rates_text()}"]
+        slowest = self.slowest()
+        if slowest:
+            lines.append(f"最慢的 {len(slowest)} 個項目:")
+            lines.extend(f"  {seconds:7.2f} 秒  {name}" for seconds, name in slowest)
+        return "\n".join(lines)
@@ -0,0 +1,132 @@
+# thumb_cache.py
+# version: 1.1.0 (Pluggable Thumbnail Producer)
+__version__ = "1.1.0"
+
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+
+try:
+    from PIL import Image, ImageOps
+    Image.MAX_IMAGE_PIXELS = None
+except ImportError:
+    Image, ImageOps = None, None
+
+from file_cache import file_signature
+
+# 放在 app_dir 下的縮圖快取資料夾
+THUMB_DIR_NAME = "FilePros.thumbs"
+THUMB_SIZE = (160, 160)
+
+def make_thumbnail(path, size=THUMB_SIZE):
+    """
+    產生縮圖：Image.thumbnail 會先以 JPEG draft 降階解碼，並在縮圖後才轉正，
+    因此大圖不會以完整解析度解碼。回傳 RGB 影像 (透明區域以白底填滿)。
+    """
+    with Image.open(path) as img:
+        img.thumbnail(size, Image.Resampling.LANCZOS)
+        img = ImageOps.exif_transpose(img)
+        if img.mode in ("RGBA", "LA", "P"):
+            img = img.convert("RGBA")
+            background = Image.new("RGB", img.size, (255, 255, 255))
+            background.paste(img, mask=img.getchannel("A"))
+            return background
+        return img.convert("RGB") if img.mode != "RGB" else img.copy()
+
+class ThumbnailCache:
+    """
+    兩層縮圖快取：記憶體中的 LRU (OrderedDict，筆數上限) 與磁碟快取 (總容量上限，依存取時間淘汰)。
+    鍵為 (path, size, mtime_ns, 縮圖尺寸)，檔案變更後自動失效。可跨執行緒共用。
+    子類別可覆寫 _variant (鍵中的版面描述) 與 _create (產生影像) 以快取其他種類的預覽圖。
+    """
+    def __init__(self, cache_dir, thumb_size=THUMB_SIZE, memory_items=300, max_disk_bytes=256 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.thumb_size = tuple(thumb_size)
+        self.memory_items = memory_items
+        self.max_disk_bytes = max_disk_bytes
+        self.memory_hits = self.disk_hits = self.generated = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        try: os.makedirs(cache_dir, exist_ok=True)
+        except OSError: self.cache_dir = None  # 無法寫入時只使用記憶體快取
+
+    def _key(self, path, signature):
+        raw = f"{os.path.normcase(os.path.abspath(path))}|{signature[0]}|{signature[1]}|{self._variant()}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def _variant(self):
+        return f"{self.thumb_size[0]}x{self.thumb_size[1]}"
+
+    def _create(self, path, **kwargs):
+        return make_thumbnail(path, self.thumb_size)
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ".jpg")
+
+    def _remember(self, key, img):
+        with self._lock:
+            self._memory[key] = img
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_items: self._memory.popitem(last=False)
+
+    def get(self, path, signature=None):
+        """只查快取 (記憶體 → 磁碟)，未命中回傳 None，不會解碼原圖。"""
+        if signature is None: signature = file_signature(path)
+        if signature is None: return None
+        key = self._key(path, signature)
+        with self._lock:
+            img = self._memory.get(key)
+            if img is not None:
+                self._memory.move_to_end(key); self.memory_hits += 1
+                return img
+        if not self.cache_dir: return None
+        disk_path = self._disk_path(key)
+        try:
+            with Image.open(disk_path) as cached: img = cached.convert("RGB")
+            os.utime(disk_path)  # 更新存取時間，供磁碟 LRU 淘汰使用
+        except (OSError, ValueError): return None
+        with self._lock: self.disk_hits += 1
+        self._remember(key, img)
+        return img
+
+    def get_or_create(self, path, **kwargs):
+        signature = file_signature(path)
+        if signature is None: raise FileNotFoundError(path)
+        img = self.get(path, signature)
+        if img is not None: return img
+        img = self._create(path, **kwargs)
+        key = self._key(path, signature)
+        if self.cache_dir:
+            disk_path = self._disk_path(key)
+            try:
+                os.makedirs(os.path.dirname(disk_path), exist_ok=True)
+                tmp_path = f"{disk_path}.{threading.get_ident()}.tmp"
+                img.save(tmp_path, "JPEG", quality=85)
+                os.replace(tmp_path, disk_path)
+            except OSError: pass
+        with self._lock: self.generated += 1
+        self._remember(key, img)
+        return img
+
+    def prune_disk(self):
+        """磁碟快取超過容量上限時，依最後存取時間由舊到新刪除。回傳刪除的檔案數。"""
+        if not self.cache_dir or not os.path.isdir(self.cache_dir): return 0
+        entries, total = [], 0
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                full = os.path.join(root, name)
+                try: st = os.stat(full)
+                except OSError: continue
+                entries.append((st.st_mtime, st.st_size, full)); total += st.st_size
+        removed = 0
+        if total <= self.max_disk_bytes: return 0
+        for _, size, full in sorted(entries):
+            try: os.remove(full); total -= size; removed += 1
+            except OSError: continue
+            if total <= self.max_disk_bytes * 0.9: break
+        return removed
+
+    def stats(self):
+        with self._lock:
+            return {"memory_hits": self.memory_hits, "disk_hits": self.disk_hits, "generated": self.generated, "memory_items": len(self._memory)}
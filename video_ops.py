@@ -0,0 +1,402 @@
+# video_ops.py
+# version: 1.6.3 (Pipeline Version 2)
+__version__ = "1.6.3"
+
+# 不依賴 tkinter 的影片工具：ffprobe 探測與中繼資料格式化、ffmpeg 進度通道解析、縮圖總覽 (contact sheet)，
+# 供影片面板的背景探測、VideoWorker 與縮圖總覽共用。
+
+import io
+import os
+import json
+import shutil
+import hashlib
+import threading
+import subprocess
+from collections import deque
+
+try:
+    from PIL import Image, ImageDraw
+except ImportError:
+    Image, ImageDraw = None, None
+
+from thumb_cache import ThumbnailCache
+
+# 寫入 VideoMetaCache 的欄位
+VIDEO_META_KEYS = ("duration", "container", "bit_rate", "video_codec", "width", "height", "fps", "pix_fmt", "audio_codecs")
+
+def hidden_startupinfo():
+    """Windows 下隱藏子程序的主控台視窗；其他平台回傳 None。"""
+    if os.name != 'nt': return None
+    startupinfo = subprocess.STARTUPINFO()
+    startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+    return startupinfo
+
+def get_ffprobe_path(ffmpeg_path):
+    """與 ffmpeg 同目錄、同命名方式的 ffprobe；ffmpeg 來自 PATH 時同樣從 PATH 尋找。"""
+    directory, name = os.path.split(ffmpeg_path)
+    probe_name = name.replace("ffmpeg", "ffprobe") if "ffmpeg" in name else "ffprobe"
+    return os.path.join(directory, probe_name) if directory else probe_name
+
+def _parse_rate(text):
+    # "30000/1001" -> 29.97；"0/0" 或空值回傳 None
+    try:
+        num, _, den = str(text).partition("/")
+        value = float(num) / float(den or 1)
+        return round(value, 3) if value > 0 else None
+    except (ValueError, ZeroDivisionError): return None
+
+def _float_or_none(value):
+    try: return float(value)
+    except (TypeError, ValueError): return None
+
+def _run_ffprobe(ffprobe_path, path, timeout):
+    """回傳 (format, 影片本體的視訊串流, 音訊串流清單)；失敗時拋出 RuntimeError。"""
+    cmd = [ffprobe_path, "-v", "error", "-print_format", "json", "-show_format", "-show_streams", path]
+    proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=timeout, startupinfo=hidden_startupinfo())
+    if proc.returncode != 0:
+        lines = proc.stderr.decode("utf-8", "replace").strip().splitlines()
+        raise RuntimeError(lines[-1] if lines else f"ffprobe 結束代碼 {proc.returncode}")
+    data = json.loads(proc.stdout.decode("utf-8", "replace") or "{}")
+    fmt, streams = data.get("format", {}), data.get("streams", [])
+    # 封面圖 (attached_pic) 也是 video 串流，不應視為影片本體
+    video = next((s for s in streams if s.get("codec_type") == "video" and not s.get("disposition", {}).get("attached_pic")), {})
+    return fmt, video, [s for s in streams if s.get("codec_type") == "audio"]
+
+def probe_video(ffprobe_path, path, timeout=30):
+    """以 ffprobe 的 JSON 輸出取得長度、容器、位元率、視訊編碼/解析度/FPS 與音軌編碼。失敗時拋出 RuntimeError。"""
+    fmt, video, audio = _run_ffprobe(ffprobe_path, path, timeout)
+    try: duration = float(fmt.get("duration") or video.get("duration") or 0)
+    except ValueError: duration = 0.0
+    try: bit_rate = int(fmt.get("bit_rate") or 0)
+    except ValueError: bit_rate = 0
+    return {
+        "duration": duration, "container": fmt.get("format_name"), "bit_rate": bit_rate,
+        "video_codec": video.get("codec_name"), "width": video.get("width"), "height": video.get("height"),
+        "fps": _parse_rate(video.get("avg_frame_rate")) or _parse_rate(video.get("r_frame_rate")), "pix_fmt": video.get("pix_fmt"),
+        "audio_codecs": [s.get("codec_name") for s in audio],
+    }
+
+def probe_timing(ffprobe_path, path, timeout=30):
+    """
+    分段編碼用的時間軸資訊：長度、容器起始時間、視訊與第一條音軌的起始時間 (無此串流時為 None) 及音軌數。
+    不寫入快取，每次都重新探測。失敗時拋出 RuntimeError。
+    """
+    fmt, video, audio = _run_ffprobe(ffprobe_path, path, timeout)
+    return {
+        "duration": _float_or_none(fmt.get("duration")) or _float_or_none(video.get("duration")) or 0.0,
+        "start": _float_or_none(fmt.get("start_time")) or 0.0,
+        "video_start": _float_or_none(video.get("start_time")) if video else None,
+        "audio_start": _float_or_none(audio[0].get("start_time")) if audio else None,
+        "audio_streams": len(audio),
+    }
+
+def format_hms(seconds):
+    seconds = int(seconds or 0)
+    h, m, s = seconds // 3600, seconds % 3600 // 60, seconds % 60
+    return f"{h}:{m:02d}:{s:02d}" if h else f"{m}:{s:02d}"
+
+def format_video_info(meta):
+    """樹狀列表用的一行摘要，例如 "1920x1080 h264 29.97fps · 2:03 · aac"。"""
+    if not meta: return ""
+    if meta.get("error"): return "N/A"
+    parts = []
+    if meta.get("video_codec"):
+        video = f"{meta.get('width')}x{meta.get('height')} {meta['video_codec']}"
+        if meta.get("fps"): video += f" {meta['fps']:g}fps"
+        parts.append(video)
+    else: parts.append("無視訊")
+    if meta.get("duration"): parts.append(format_hms(meta["duration"]))
+    audio = meta.get("audio_codecs") or []
+    parts.append("+".join(audio) if audio else "無音訊")
+    return " · ".join(parts)
+
+# --- 串流複製 (remux)：來源串流已符合目標容器與設定時，以 -c copy 重新封裝而不重新編碼 ---
+STREAM_AUTO = "自動 (相容時重新封裝)"
+STREAM_REMUX_ONLY = "僅重新封裝"
+STREAM_ENCODE = "一律重新編碼"
+STREAM_MODES = (STREAM_AUTO, STREAM_REMUX_ONLY, STREAM_ENCODE)
+
+DECISION_COPY, DECISION_COPY_VIDEO, DECISION_ENCODE, DECISION_SKIP = "copy", "copy_video", "encode", "skip"
+DECISION_LABELS = {DECISION_COPY: "重新封裝", DECISION_COPY_VIDEO: "重新封裝 + 音訊轉檔", DECISION_ENCODE: "重新編碼", DECISION_SKIP: "略過"}
+
+# 各容器可直接封裝的 (視訊編碼, 音訊編碼)；None 代表不限制
+CONTAINER_CODECS = {
+    "MP4": ({"h264", "hevc", "av1", "mpeg4"}, {"aac", "mp3", "ac3", "eac3", "alac"}),
+    "MOV": ({"h264", "hevc", "mpeg4", "prores", "mjpeg"}, {"aac", "mp3", "alac", "pcm_s16le", "pcm_s24le"}),
+    "MKV": (None, None),
+    "AVI": ({"h264", "mpeg4", "mjpeg", "msmpeg4v3"}, {"mp3", "ac3", "pcm_s16le"}),
+}
+
+def target_video_codec(settings):
+    """重新編碼時會產生的視訊編碼 (與 VideoWorker._build_ffmpeg_cmd 一致)。"""
+    return "hevc" if settings.get("preset") == "GPU (NVENC)" and settings.get("10bit") else "h264"
+
+def stream_copy_decision(meta, settings, src_path):
+    """
+    回傳 (decision, reason)。自動模式只在容器改變、畫面不調整且來源視訊編碼與重新編碼的結果相同時才重新封裝；
+    同容器視為壓縮需求而重新編碼。僅重新封裝模式不要求編碼相同，無法封裝的檔案略過。
+    音訊與目標容器不相容或指定 AAC 時，只轉檔音訊、視訊仍直接複製。
+    """
+    mode = settings.get("stream_mode", STREAM_AUTO)
+    if mode == STREAM_ENCODE: return DECISION_ENCODE, "設定為一律重新編碼"
+    fallback = DECISION_SKIP if mode == STREAM_REMUX_ONLY else DECISION_ENCODE
+    fmt = settings["format"]
+    if fmt not in CONTAINER_CODECS: return fallback, f"{fmt} 必須重新編碼"
+    if not meta: return fallback, "沒有探測資料"
+    if meta.get("error"): return fallback, "探測失敗"
+    if settings.get("resize"): return fallback, "已啟用調整大小"
+    if settings.get("fps", "維持原始") != "維持原始": return fallback, "已設定 FPS 限制"
+    vcodec = meta.get("video_codec")
+    if not vcodec: return fallback, "沒有視訊串流"
+    video_codecs, audio_codecs = CONTAINER_CODECS[fmt]
+    if video_codecs is not None and vcodec not in video_codecs: return fallback, f"{fmt} 不支援 {vcodec}"
+    if settings.get("10bit") and "10" not in (meta.get("pix_fmt") or ""): return fallback, "來源不是 10-bit"
+    if mode == STREAM_AUTO:
+        if os.path.splitext(src_path)[1].lower() == "." + fmt.lower(): return DECISION_ENCODE, "容器相同 (壓縮)"
+        if vcodec != target_video_codec(settings): return DECISION_ENCODE, f"來源為 {vcodec}"
+    sources = meta.get("audio_codecs") or []
+    if settings.get("audio") == "No Audio" or not sources: return DECISION_COPY, "串流相容"
+    if settings.get("audio") == "AAC" and any(c != "aac" for c in sources): return DECISION_COPY_VIDEO, "音訊轉為 AAC"
+    unsupported = sorted({c for c in sources if audio_codecs is not None and c not in audio_codecs})
+    if unsupported: return DECISION_COPY_VIDEO, f"{fmt} 不支援 {'/'.join(map(str, unsupported))} 音訊"
+    return DECISION_COPY, "串流相容"
+
+def format_decision(decision, reason):
+    return f"{DECISION_LABELS[decision]} ({reason})"
+
+# --- ffmpeg 進度通道：以 -progress 的 key=value 輸出取代解析 stderr 的人類可讀文字 ---
+# stderr 只保留警告與錯誤，由 StderrTail 讀取；-nostats 關閉以 \r 覆寫的統計列
+PROGRESS_ARGS = ["-hide_banner", "-loglevel", "warning", "-nostats", "-progress", "pipe:1"]
+
+def iter_progress(stream):
+    """逐行讀取 -progress 輸出，每遇到 progress=continue/end 產出一個區塊 dict。"""
+    block = {}
+    for line in stream:
+        key, sep, value = line.strip().partition("=")
+        if not sep: continue
+        block[key] = value
+        if key == "progress":
+            yield block
+            block = {}
+
+def progress_seconds(block):
+    """區塊中已輸出的媒體秒數；舊版 ffmpeg 只有 out_time_ms (單位其實也是微秒)，開始前可能為 N/A。"""
+    for key in ("out_time_us", "out_time_ms"):
+        try: return max(0.0, int(block[key]) / 1e6)
+        except (KeyError, ValueError): continue
+    return None
+
+def progress_speed(block):
+    try: return float(block.get("speed", "").rstrip("x"))
+    except ValueError: return None
+
+class StderrTail(threading.Thread):
+    """在背景讀完子程序的 stderr (避免管線塞滿卡住 ffmpeg)，只保留最後 maxlen 行，供失敗時顯示真正的錯誤。"""
+    def __init__(self, stream, maxlen=10):
+        super().__init__(daemon=True)
+        self.stream = stream
+        self.lines = deque(maxlen=maxlen)
+        self.start()
+
+    def run(self):
+        try:
+            for line in self.stream:
+                for part in line.replace("\r", "\n").split("\n"):
+                    if part.strip(): self.lines.append(part.strip())
+        except (OSError, ValueError): pass  # 管線被關閉
+
+    def text(self, indent="    "):
+        self.join(timeout=1)
+        return "\n".join(indent + line for line in self.lines)
+
+# --- 長片分段平行編碼 ---
+SEGMENT_MIN_DURATION = 10 * 60   # 短於此長度的影片，切割與合併的成本不划算
+SEGMENT_MIN_SECONDS = 30         # 每段至少 30 秒，避免過多段落的關鍵影格與啟動成本
+SEGMENT_THREADS = 4              # x264 在此處的 preset 下超過數條執行緒後擴展性差，改以多個程序分擔
+SEGMENT_DURATION_TOLERANCE = 1.0  # 合併後長度與來源相差超過 1 秒 (或 0.5%) 視為分段有誤
+SEGMENT_AV_TOLERANCE = 0.1        # 影音起始差與來源相差超過 0.1 秒視為音畫不同步
+
+def segment_length(duration, workers):
+    """每個平行程序約分到 4 段，讓各段速度差異可以互相平衡。"""
+    return max(SEGMENT_MIN_SECONDS, duration / (workers * 4))
+
+def check_segmented_output(src_timing, out_timing, keep_audio):
+    """比對合併後的輸出與來源的長度、音軌數與影音起始差；不符時回傳說明文字，符合時回傳 None。"""
+    duration = src_timing["duration"]
+    if abs(out_timing["duration"] - duration) > max(SEGMENT_DURATION_TOLERANCE, duration * 0.005):
+        return f"分段輸出長度 {out_timing['duration']:.2f} 秒與來源 {duration:.2f} 秒不符"
+    if not keep_audio or not src_timing["audio_streams"]: return None
+    if out_timing["audio_streams"] != src_timing["audio_streams"]:
+        return f"分段輸出音軌數 {out_timing['audio_streams']} 與來源 {src_timing['audio_streams']} 不符"
+    def av_offset(timing):
+        start = timing["start"]
+        video = timing["video_start"] if timing["video_start"] is not None else start
+        audio = timing["audio_start"] if timing["audio_start"] is not None else start
+        return video - audio
+    src_av, out_av = av_offset(src_timing), av_offset(out_timing)
+    if abs(out_av - src_av) > SEGMENT_AV_TOLERANCE:
+        return f"分段輸出影音起始差 {out_av:+.3f} 秒與來源 {src_av:+.3f} 秒不符"
+    return None
+
+def concat_list_line(path):
+    """concat demuxer 清單的一行；路徑中的單引號需寫成 '\\''。"""
+    return "file '" + path.replace("'", "'\\''") + "'\n"
+
+# --- 可續傳的批次：輸出先寫到 .partial，成功後才改名；完成的工作記錄在輸出資料夾的清單中 ---
+PARTIAL_SUFFIX = ".partial"
+# .partial 副檔名無法讓 ffmpeg 推斷容器，必須以 -f 明確指定
+OUTPUT_MUXERS = {"MP4": "mp4", "MKV": "matroska", "MOV": "mov", "GIF": "gif", "AVI": "avi"}
+
+def plan_output_paths(paths, output_mode, fmt, subfolder="", custom_dir=""):
+    """
+    回傳 {來源: 輸出路徑}。不同來源對應到同一輸出時 (例如 a.mkv 與 a.avi、自訂資料夾中不同子資料夾的同名檔)，
+    依清單順序在後者加上 (1)、(2)…，與圖像面板的計畫引擎相同；否則平行工作會同時寫入同一個 .partial。
+    """
+    ext = "." + fmt.lower()
+    taken, outputs = set(), {}
+    for src_path in paths:
+        dest_dir = os.path.dirname(src_path)
+        if output_mode == "subfolder": dest_dir = os.path.join(dest_dir, subfolder)
+        elif output_mode == "custom": dest_dir = custom_dir
+        base = os.path.splitext(os.path.basename(src_path))[0]
+        dest = os.path.join(dest_dir, base + ext)
+        counter = 1
+        while os.path.normpath(dest).lower() in taken:
+            dest = os.path.join(dest_dir, f"{base}({counter}){ext}"); counter += 1
+        taken.add(os.path.normpath(dest).lower())
+        outputs[src_path] = dest
+    return outputs
+
+# 提高此版本會讓所有既有的清單紀錄失效 (編碼指令有影響輸出的變更時)
+VIDEO_PIPELINE_VERSION = 2
+VIDEO_FINGERPRINT_KEYS = ("format", "crf", "preset", "audio", "fps", "10bit", "stream_mode")
+VIDEO_RESIZE_FINGERPRINT_KEYS = ("resize_mode", "w", "h")
+
+def video_settings_fingerprint(settings):
+    """有效輸出設定的指紋：取自面板的設定字典，忽略同時工作數、輸出位置等不影響輸出內容的欄位。"""
+    effective = {key: settings.get(key) for key in VIDEO_FINGERPRINT_KEYS}
+    effective["resize"] = bool(settings.get("resize"))
+    if effective["resize"]: effective.update({key: settings.get(key) for key in VIDEO_RESIZE_FINGERPRINT_KEYS})
+    effective["pipeline"] = VIDEO_PIPELINE_VERSION
+    return hashlib.sha1(json.dumps(effective, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+# --- ffmpeg 能力探測：-hwaccels / -encoders / -filters 只列出編譯進去的功能，
+# 硬體加速與硬體編碼器另以 1 個影格的實測確認裝置真的可用；結果依 ffmpeg 執行檔快取，每個程序只探測一次 ---
+HARDWARE_ENCODERS = ("h264_nvenc", "hevc_nvenc")
+_capabilities = {}
+_capabilities_lock = threading.Lock()
+
+def _run_ffmpeg_quiet(cmd, timeout=30):
+    try: return subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=timeout, startupinfo=hidden_startupinfo())
+    except (OSError, subprocess.SubprocessError): return None
+
+def _list_output(ffmpeg_path, option):
+    proc = _run_ffmpeg_quiet([ffmpeg_path, "-hide_banner", option])
+    return proc.stdout.decode("utf-8", "replace") if proc and proc.returncode == 0 else ""
+
+def parse_hwaccels(text):
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    return [line for line in lines if not line.endswith(":")]
+
+def parse_encoders(text):
+    """-encoders 在 "------" 分隔線之後每行為 "<6 個旗標> <名稱> <說明>"。"""
+    names, started = [], False
+    for line in text.splitlines():
+        parts = line.split()
+        if not started: started = bool(parts) and set(parts[0]) == {"-"}; continue
+        if len(parts) >= 2: names.append(parts[1])
+    return names
+
+def parse_filters(text):
+    """-filters 每行為 "<旗標> <名稱> <輸入->輸出> <說明>"，以 "->" 欄位辨認，略過開頭的圖例。"""
+    return [parts[1] for parts in (line.split() for line in text.splitlines()) if len(parts) >= 3 and "->" in parts[2]]
+
+def probe_capabilities(ffmpeg_path):
+    hwaccels = parse_hwaccels(_list_output(ffmpeg_path, "-hwaccels"))
+    encoders = parse_encoders(_list_output(ffmpeg_path, "-encoders"))
+    filters = parse_filters(_list_output(ffmpeg_path, "-filters"))
+    test_args = [ffmpeg_path, "-hide_banner", "-loglevel", "error"]
+    test_input = ["-f", "lavfi", "-i", "color=c=black:s=256x256:d=0.1", "-frames:v", "1"]
+    cuda = False
+    if "cuda" in hwaccels:
+        proc = _run_ffmpeg_quiet(test_args + ["-init_hw_device", "cuda=gpu"] + test_input + ["-f", "null", "-"])
+        cuda = bool(proc and proc.returncode == 0)
+    usable = [name for name in encoders if name not in HARDWARE_ENCODERS]
+    for name in HARDWARE_ENCODERS:
+        if name not in encoders: continue
+        proc = _run_ffmpeg_quiet(test_args + test_input + ["-c:v", name, "-f", "null", "-"])
+        if proc and proc.returncode == 0: usable.append(name)
+    return {"hwaccels": hwaccels, "encoders": usable, "filters": filters, "cuda": cuda}
+
+def get_capabilities(ffmpeg_path):
+    """依解析後的執行檔路徑與大小/修改時間快取；更換或更新 ffmpeg 後會重新探測。"""
+    resolved = shutil.which(ffmpeg_path) or ffmpeg_path
+    try: st = os.stat(resolved); key = (os.path.normcase(os.path.abspath(resolved)), st.st_size, st.st_mtime_ns)
+    except OSError: key = (resolved, None, None)
+    with _capabilities_lock:
+        if key not in _capabilities: _capabilities[key] = probe_capabilities(resolved)
+        return _capabilities[key]
+
+# --- 縮圖總覽：每部影片取 N 個關鍵影格拼成一張圖 ---
+SHEET_DIR_NAME = "FilePros.sheets"
+SHEET_COLUMNS = 4
+SHEET_TILE_WIDTH = 320
+SHEET_GAP = 4
+
+def extract_keyframe(ffmpeg_path, path, seconds, tile_width=SHEET_TILE_WIDTH, timeout=60):
+    """
+    -ss 放在 -i 之前以索引快速跳轉，-skip_frame nokey 只解碼關鍵影格，-noaccurate_seek 直接輸出跳轉點的關鍵影格
+    (否則會為了精確時間解碼並丟棄其後的影格)。以 BMP 經管線回傳，失敗時回傳 None。
+    """
+    cmd = [ffmpeg_path, "-hide_banner", "-loglevel", "error", "-skip_frame", "nokey", "-noaccurate_seek", "-ss", f"{seconds:.3f}", "-i", path,
+           "-map", "0:v:0", "-an", "-sn", "-frames:v", "1", "-vf", f"scale={tile_width}:-2", "-f", "image2pipe", "-c:v", "bmp", "-"]
+    try: proc = subprocess.run(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=timeout, startupinfo=hidden_startupinfo())
+    except (OSError, subprocess.SubprocessError): return None
+    if proc.returncode != 0 or not proc.stdout: return None
+    try:
+        with Image.open(io.BytesIO(proc.stdout)) as img: return img.convert("RGB")
+    except (OSError, ValueError): return None
+
+def sheet_timestamps(duration, count):
+    """平均分布在影片中段的時間點 (避開片頭與片尾的黑畫面)；長度未知時只取開頭。"""
+    if not duration or duration <= 0: return [0.0]
+    return [duration * (i + 0.5) / count for i in range(count)]
+
+def make_contact_sheet(ffmpeg_path, path, duration, count=12, columns=SHEET_COLUMNS, tile_width=SHEET_TILE_WIDTH):
+    """擷取關鍵影格並拼成 columns 欄的總覽圖，每格左下角標示時間；沒有任何影格可用時拋出 RuntimeError。"""
+    timestamps = sheet_timestamps(duration, count)
+    frames = [(seconds, extract_keyframe(ffmpeg_path, path, seconds, tile_width)) for seconds in timestamps]
+    sizes = [frame.size for _, frame in frames if frame is not None]
+    if not sizes: raise RuntimeError("無法擷取任何影格")
+    tile_height = max(height for _, height in sizes)
+    columns = min(columns, len(frames)); rows = (len(frames) + columns - 1) // columns
+    sheet = Image.new("RGB", (columns * (tile_width + SHEET_GAP) + SHEET_GAP, rows * (tile_height + SHEET_GAP) + SHEET_GAP), (32, 32, 32))
+    draw = ImageDraw.Draw(sheet)
+    for index, (seconds, frame) in enumerate(frames):
+        x = SHEET_GAP + (index % columns) * (tile_width + SHEET_GAP)
+        y = SHEET_GAP + (index // columns) * (tile_height + SHEET_GAP)
+        if frame is not None: sheet.paste(frame, (x, y + (tile_height - frame.height) // 2))
+        label = format_hms(seconds)
+        draw.rectangle((x, y + tile_height - 14, x + 6 * len(label) + 6, y + tile_height), fill=(0, 0, 0))
+        draw.text((x + 3, y + tile_height - 13), label, fill=(255, 255, 255))
+    return sheet
+
+class ContactSheetCache(ThumbnailCache):
+    """
+    縮圖總覽的記憶體 + 磁碟快取，沿用 ThumbnailCache 的 (path, size, mtime_ns) 鍵與 LRU 淘汰；
+    張數與版面也是鍵的一部分。長度未提供時以 ffprobe 探測。
+    """
+    def __init__(self, cache_dir, ffmpeg_path, count=12, memory_items=20, max_disk_bytes=512 * 1024 * 1024):
+        super().__init__(cache_dir, thumb_size=(SHEET_TILE_WIDTH, SHEET_TILE_WIDTH), memory_items=memory_items, max_disk_bytes=max_disk_bytes)
+        self.ffmpeg_path = ffmpeg_path
+        self.count = count
+
+    def _variant(self):
+        return f"sheet{self.count}x{SHEET_COLUMNS}@{SHEET_TILE_WIDTH}"
+
+    def _create(self, path, duration=None):
+        if Image is None: raise RuntimeError("需要安裝 Pillow")
+        if duration is None:
+            try: duration = probe_video(get_ffprobe_path(self.ffmpeg_path), path)["duration"]
+            except Exception: duration = 0
+        return make_contact_sheet(self.ffmpeg_path, path, duration, self.count)
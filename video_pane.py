@@ -1,6 +1,6 @@
 # video_pane.py
-# version: 1.4.0 (Fix NVENC Quality Control & 10-bit Logic)
-__version__ = "1.4.0"
+# version: 1.13.4 (Unique Output Paths)
+__version__ = "1.13.4"
 
 import os
 import sys
@@ -9,9 +9,9 @@ import threading
 import time
 import subprocess
 import shutil
-import re
 import json
 import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from tkinter import ttk, messagebox, filedialog
 
 try:
@@ -45,6 +45,22 @@ except ImportError:
         try: from tkinterdnd2 import TkinterDND; return TkinterDND.Tk()
         except ImportError: return tk.Tk()
 
+try:
+    from PIL import ImageTk
+except ImportError:
+    ImageTk = None  # 縮圖總覽需要 Pillow，壓制功能不受影響
+
+from progress import ProgressTracker, format_duration
+from file_cache import CACHE_DB_NAME, VideoMetaCache, OutputManifest, file_signature
+from video_ops import (get_ffprobe_path, probe_video, format_video_info, hidden_startupinfo, STREAM_MODES, STREAM_AUTO,
+                       DECISION_COPY, DECISION_COPY_VIDEO, DECISION_SKIP, stream_copy_decision, format_decision,
+                       DECISION_ENCODE, PROGRESS_ARGS, iter_progress, progress_seconds, progress_speed, StderrTail,
+                       SEGMENT_MIN_DURATION, SEGMENT_THREADS, segment_length, concat_list_line, probe_timing, check_segmented_output,
+                       PARTIAL_SUFFIX, OUTPUT_MUXERS, plan_output_paths, video_settings_fingerprint, get_capabilities, SHEET_DIR_NAME, ContactSheetCache)
+
+# 重新封裝只搬移封包，工作量以相同長度重新編碼的一小部分估計
+REMUX_WORK_FACTOR = 0.05
+
 def get_ffmpeg_path():
     if getattr(sys, 'frozen', False):
         bundled_path = os.path.join(sys._MEIPASS, 'ffmpeg.exe')
@@ -69,6 +85,17 @@ class VideoOrganizerPane(ttk.Frame):
         
         self.ffmpeg_exe = get_ffmpeg_path()
         self.ffmpeg_available = self._check_ffmpeg()
+        self.ffprobe_exe = get_ffprobe_path(self.ffmpeg_exe)
+
+        # 背景 ffprobe 探測：path -> 中繼資料 (含 size)，以世代編號丟棄舊資料集的結果
+        self.file_sizes = {}
+        self.video_meta = {}
+        self.path_to_item = {}
+        self.probe_generation = 0
+        self.probe_stop_event = threading.Event()
+        self.meta_cache = VideoMetaCache(os.path.join(getattr(app, 'app_dir', '.'), CACHE_DB_NAME))
+        self.sheet_cache = ContactSheetCache(os.path.join(getattr(app, 'app_dir', '.'), SHEET_DIR_NAME), self.ffmpeg_exe)
+        self.sheet_viewer = None
 
         self._setup_ui_variables()
         self._build_ui()
@@ -97,6 +124,7 @@ class VideoOrganizerPane(ttk.Frame):
         self.var_preset = tk.StringVar(value="medium")
         self.var_audio_codec = tk.StringVar(value="Keep") 
         self.var_10bit = tk.BooleanVar(value=False)
+        self.var_stream_mode = tk.StringVar(value=STREAM_AUTO)
         self.var_crf_desc = tk.StringVar(value="初始化中...")
         self.var_preset_desc = tk.StringVar(value="初始化中...")
 
@@ -113,6 +141,10 @@ class VideoOrganizerPane(ttk.Frame):
 
         self.var_warn_overwrite = tk.BooleanVar(value=True)
         self.var_notify_complete = tk.BooleanVar(value=True)
+        self.var_jobs = tk.IntVar(value=1)
+        self.var_segment = tk.BooleanVar(value=False)
+        self.var_skip_unchanged = tk.BooleanVar(value=True)
+        self.var_sheet_count = tk.IntVar(value=12)
         self.var_select_all_videos = tk.BooleanVar(value=True)
         self.vid_ext_vars = {ext: tk.BooleanVar(value=True) for ext in VIDEO_EXTS}
 
@@ -151,6 +183,10 @@ class VideoOrganizerPane(ttk.Frame):
         settings_frame.pack(fill="x", padx=10, pady=5)
         ttk.Checkbutton(settings_frame, text="覆蓋前警告", variable=self.var_warn_overwrite).pack(side="left")
         ttk.Checkbutton(settings_frame, text="完成後提示", variable=self.var_notify_complete).pack(side="left", padx=10)
+        ttk.Checkbutton(settings_frame, text="略過已是最新的輸出", variable=self.var_skip_unchanged).pack(side="left", padx=(0, 10))
+        ttk.Label(settings_frame, text="同時工作數:").pack(side="left")
+        tk.Spinbox(settings_frame, from_=1, to=max(1, os.cpu_count() or 1), textvariable=self.var_jobs, width=4).pack(side="left", padx=(2, 0))
+        ttk.Checkbutton(settings_frame, text=f"長片分段平行編碼 (≥{SEGMENT_MIN_DURATION // 60} 分鐘)", variable=self.var_segment).pack(side="left", padx=10)
         ttk.Button(settings_frame, text="儲存設定", command=self._save_config).pack(side="right")
 
         filter_frame = ttk.LabelFrame(main_frame, text="副檔名篩選")
@@ -167,16 +203,19 @@ class VideoOrganizerPane(ttk.Frame):
         tree_container, self.file_tree = create_scrollable_treeview(preview_frame)
         tree_container.pack(fill="both", expand=True) 
         
-        cols = ("checked", "original", "new", "size", "status")
+        cols = ("checked", "original", "new", "size", "info", "decision", "status")
         self.file_tree.configure(columns=cols, show="headings")
         self.file_tree.heading("checked", text="✔"); self.file_tree.column("checked", width=40, anchor="center", stretch=False)
         self.file_tree.heading("original", text="原檔案路徑"); self.file_tree.column("original", width=250, anchor="w")
         self.file_tree.heading("new", text="新檔案名稱 (預覽)"); self.file_tree.column("new", width=250, anchor="w")
         self.file_tree.heading("size", text="檔案大小"); self.file_tree.column("size", width=100, anchor="e")
+        self.file_tree.heading("info", text="影片資訊"); self.file_tree.column("info", width=220, anchor="w")
+        self.file_tree.heading("decision", text="處理方式"); self.file_tree.column("decision", width=170, anchor="w")
         self.file_tree.heading("status", text="狀態/備註"); self.file_tree.column("status", width=120, anchor="center")
         self.file_tree.tag_configure('checked', foreground='blue')
         self.file_tree.bind('<Button-1>', self._on_tree_click)
         self.file_tree.bind('<space>', self._on_space_press)
+        self.file_tree.bind('<Double-1>', self._on_tree_double_click)
 
         exec_frame = ttk.Frame(main_frame)
         exec_frame.pack(fill="x", padx=10, pady=10)
@@ -184,10 +223,16 @@ class VideoOrganizerPane(ttk.Frame):
         ttk.Button(btn_box, text="✔", width=3, command=self._toggle_selection_check).pack(side="left")
         ttk.Button(btn_box, text="全選", command=self._select_all).pack(side="left", padx=5)
         ttk.Button(btn_box, text="清除", command=self._clear_all).pack(side="left")
+        self.btn_sheets = ttk.Button(btn_box, text="🎞 縮圖總覽", command=self._on_contact_sheets); self.btn_sheets.pack(side="left", padx=(10, 2))
+        tk.Spinbox(btn_box, from_=4, to=36, increment=4, textvariable=self.var_sheet_count, width=3).pack(side="left")
+        ttk.Label(btn_box, text="張").pack(side="left")
         self.pbar = ttk.Progressbar(exec_frame); self.pbar.pack(side="left", fill="x", expand=True, padx=10)
         self.btn_run = ttk.Button(exec_frame, text="開始壓制", command=self._on_execute); self.btn_run.pack(side="left")
         self.btn_cancel = ttk.Button(exec_frame, text="取消", command=self._on_cancel, state="disabled"); self.btn_cancel.pack(side="left", padx=(5,0))
         
+        # 影響輸出檔名或串流複製判斷的設定變更時，更新預覽的「新檔案名稱」與「處理方式」
+        for var in (self.var_format, self.var_10bit, self.var_preset, self.var_audio_codec, self.var_fps_limit, self.var_stream_mode):
+            var.trace_add("write", lambda *_: self.update_preview())
         self._update_ui_state()
 
     def _build_quality_controls(self, parent):
@@ -234,6 +279,10 @@ class VideoOrganizerPane(ttk.Frame):
         ttk.Label(r4, text="音訊處理:").pack(side="left")
         ttk.Combobox(r4, textvariable=self.var_audio_codec, values=["Keep", "AAC", "No Audio"], width=8, state="readonly").pack(side="left", padx=5)
 
+        r5 = ttk.Frame(f); r5.pack(fill="x", pady=(0, 5))
+        ttk.Label(r5, text="串流處理:").pack(side="left")
+        ttk.Combobox(r5, textvariable=self.var_stream_mode, values=STREAM_MODES, width=18, state="readonly").pack(side="left", padx=5)
+
     def _build_resize_controls(self, parent):
         f = ttk.Frame(parent); f.pack(fill="x", padx=5, pady=5)
         ttk.Checkbutton(f, text="啟用調整大小", variable=self.var_resize_enabled, command=self._update_ui_state).pack(anchor="w")
@@ -325,45 +374,68 @@ class VideoOrganizerPane(ttk.Frame):
 
     def receive_update(self, data_state=None):
         if data_state is None: data_state = getattr(self.app, 'data_state', {})
+        else:
+            # 新的資料來源：停止舊的探測並清除記憶體中的結果 (持久化快取仍有效)
+            self.probe_stop_event.set()
+            self.probe_generation += 1
+            self.video_meta.clear()
+        self.file_sizes = data_state.get("file_sizes", {})
         raw_videos = data_state.get("video_files", [])
         active_exts = {ext for ext, var in self.vid_ext_vars.items() if var.get()}
         filtered = [f for f in raw_videos if os.path.splitext(f)[1].lower() in active_exts]
         self.video_details_list = sorted(filtered, key=natural_sort_key)
         self.app.log(f"VideoPane: 載入 {len(self.video_details_list)} 個影片檔案。")
         self.update_preview(full_reload=True)
+        to_probe = [f for f in self.video_details_list if f not in self.video_meta]
+        if to_probe and self.ffmpeg_available:
+            for f_path in to_probe: self.video_meta[f_path] = None  # None = 探測中
+            if self.probe_stop_event.is_set(): self.probe_stop_event = threading.Event()
+            VideoProbeWorker(to_probe, self.probe_generation, self.ffprobe_exe, self.ui_queue, self.probe_stop_event, self.meta_cache).start()
+
+    def _apply_probe_results(self, generation, batch):
+        if generation != self.probe_generation: return  # 舊資料集的結果
+        settings = self._stream_settings()
+        for f_path, meta in batch:
+            self.video_meta[f_path] = meta
+            item_id = self.path_to_item.get(f_path)
+            if item_id is None or not self.file_tree.exists(item_id): continue
+            self.file_tree.set(item_id, column="info", value=format_video_info(meta))
+            self.file_tree.set(item_id, column="decision", value=format_decision(*stream_copy_decision(meta, settings, f_path)))
+            if meta.get("size") and f_path not in self.file_sizes: self.file_tree.set(item_id, column="size", value=format_size(meta["size"]))
 
     def update_preview(self, full_reload=False):
         if full_reload:
             self.file_tree.delete(*self.file_tree.get_children())
-            self.checked_state.clear()
+            self.checked_state.clear(); self.path_to_item.clear()
         root_folder = getattr(self.app, 'data_state', {}).get("root_folder", ".")
         mode = self.var_output_mode.get()
-        target_ext = "." + self.var_format.get().lower()
+        settings = self._stream_settings()
+        children = () if full_reload else self.file_tree.get_children()
+        outputs = plan_output_paths(self.video_details_list, mode, self.var_format.get(), self.var_subfolder_name.get(), self.var_output_dir.get())
 
         for i, f_path in enumerate(self.video_details_list):
-            try: size_str = format_size(os.path.getsize(f_path))
-            except: size_str = "Unknown"
-            fname = os.path.basename(f_path)
-            base, _ = os.path.splitext(fname)
-            new_fname = base + target_ext
-            dest_dir = os.path.dirname(f_path)
-            if mode == "subfolder": dest_dir = os.path.join(dest_dir, self.var_subfolder_name.get())
-            elif mode == "custom": dest_dir = self.var_output_dir.get()
+            # 大小取自載入時的掃描結果或探測結果，不在 Tk 執行緒上逐列 stat
+            meta = self.video_meta.get(f_path)
+            size = self.file_sizes.get(f_path) or (meta or {}).get("size")
+            size_str = format_size(size) if size is not None else "…"
+            info_str = format_video_info(meta) if meta else ("探測中…" if f_path in self.video_meta else "")
+            decision_str = "…" if meta is None and f_path in self.video_meta else format_decision(*stream_copy_decision(meta, settings, f_path))
+            dest_dir, new_fname = os.path.split(outputs[f_path])
             try: display_orig = os.path.relpath(f_path, root_folder)
             except ValueError: display_orig = f_path
             display_new = new_fname
             if mode != "overwrite":
                  display_new = os.path.join(os.path.basename(dest_dir) if mode=="subfolder" else "Custom", new_fname)
-            values = ("☑", display_orig, display_new, size_str, "待命")
+            values = ("☑", display_orig, display_new, size_str, info_str, decision_str, "待命")
             if full_reload:
                 item = self.file_tree.insert("", "end", values=values, tags=('checked',))
                 self.checked_state[item] = True
+                self.path_to_item[f_path] = item
             else:
-                children = self.file_tree.get_children()
                 if i < len(children):
                     item = children[i]
                     current_values = list(self.file_tree.item(item, "values"))
-                    current_values[2] = display_new
+                    current_values[2] = display_new; current_values[5] = decision_str
                     self.file_tree.item(item, values=current_values)
 
     def _get_settings_dict(self):
@@ -374,9 +446,26 @@ class VideoOrganizerPane(ttk.Frame):
             "resize": self.var_resize_enabled.get(), "resize_mode": self.var_resize_mode.get(),
             "w": self.var_width.get(), "h": self.var_height.get(), "fps": self.var_fps_limit.get(),
             "exts": {k: v.get() for k, v in self.vid_ext_vars.items()},
-            "10bit": self.var_10bit.get() 
+            "10bit": self.var_10bit.get(), "jobs": self._get_jobs(), "stream_mode": self.var_stream_mode.get(),
+            "segment": self.var_segment.get(), "skip_unchanged": self.var_skip_unchanged.get(), "sheet_count": self._get_sheet_count()
+        }
+
+    def _stream_settings(self):
+        # 串流複製判斷只需要這些欄位；不經過 _get_settings_dict，避免 CRF 輸入框暫時無效時預覽無法更新
+        return {
+            "format": self.var_format.get(), "preset": self.var_preset.get(), "audio": self.var_audio_codec.get(),
+            "resize": self.var_resize_enabled.get(), "fps": self.var_fps_limit.get(), "10bit": self.var_10bit.get(),
+            "stream_mode": self.var_stream_mode.get()
         }
 
+    def _get_sheet_count(self):
+        try: return min(36, max(1, int(self.var_sheet_count.get())))
+        except (tk.TclError, ValueError): return 12
+
+    def _get_jobs(self):
+        try: return max(1, int(self.var_jobs.get()))
+        except (tk.TclError, ValueError): return 1
+
     def _load_config(self):
         cfg = self.app.load_app_config().get(self.pane_name, {})
         if not cfg: return
@@ -396,6 +485,12 @@ class VideoOrganizerPane(ttk.Frame):
             self.var_height.set(cfg.get("h", "100"))
             self.var_fps_limit.set(cfg.get("fps", "維持原始"))
             self.var_10bit.set(cfg.get("10bit", False)) 
+            self.var_jobs.set(cfg.get("jobs", 1))
+            self.var_segment.set(cfg.get("segment", False))
+            self.var_skip_unchanged.set(cfg.get("skip_unchanged", True))
+            self.var_sheet_count.set(cfg.get("sheet_count", 12))
+            stream_mode = cfg.get("stream_mode", STREAM_AUTO)
+            self.var_stream_mode.set(stream_mode if stream_mode in STREAM_MODES else STREAM_AUTO)
             exts = cfg.get("exts", {})
             for k, v in exts.items():
                 if k in self.vid_ext_vars: self.vid_ext_vars[k].set(v)
@@ -420,15 +515,43 @@ class VideoOrganizerPane(ttk.Frame):
         if not tasks: messagebox.showwarning("提示", "未選擇任何檔案。"); return
         if self.var_output_mode.get() == "overwrite" and self.var_warn_overwrite.get():
              if not messagebox.askyesno("警告", "您選擇了【覆蓋原始檔案】！\n為了安全，系統將會把原始檔移動到 .temp 資料夾暫存。\n確定要繼續嗎？"): return
-        self.btn_run.config(state="disabled"); self.btn_cancel.config(state="normal")
+        self.btn_run.config(state="disabled"); self.btn_sheets.config(state="disabled"); self.btn_cancel.config(state="normal")
         self.cancel_event.clear()
         
         worker_settings = self._get_settings_dict()
         worker_settings["ffmpeg_path"] = self.ffmpeg_exe
+        worker_settings["ffprobe_path"] = self.ffprobe_exe
         
-        self.worker_thread = VideoWorker(tasks, worker_settings, self.ui_queue, self.cancel_event)
+        self.worker_thread = VideoWorker(tasks, worker_settings, self.ui_queue, self.cancel_event, {f: self.video_meta.get(f) for f in tasks})
         self.worker_thread.start()
 
+    def _checked_paths(self):
+        children = self.file_tree.get_children()
+        return [self.video_details_list[i] for i, item in enumerate(children) if self.checked_state.get(item, False) and i < len(self.video_details_list)]
+
+    def _on_contact_sheets(self):
+        if ImageTk is None: messagebox.showerror("缺少函式庫", "縮圖總覽需要 Pillow 函式庫。\n請使用 'pip install Pillow' 來安裝。"); return
+        if not self.ffmpeg_available: messagebox.showerror("錯誤", "找不到 FFmpeg，無法執行。"); return
+        paths = self._checked_paths()
+        if not paths: messagebox.showwarning("提示", "未選擇任何檔案。"); return
+        self.btn_run.config(state="disabled"); self.btn_sheets.config(state="disabled"); self.btn_cancel.config(state="normal")
+        self.cancel_event.clear()
+        self.sheet_cache.count = self._get_sheet_count()
+        durations = {f: (self.video_meta.get(f) or {}).get("duration") for f in paths}
+        self.worker_thread = ContactSheetWorker(paths, self.sheet_cache, durations, self.ui_queue, self.cancel_event)
+        self.worker_thread.start()
+
+    def _on_tree_double_click(self, event):
+        item = self.file_tree.identify_row(event.y)
+        if not item or self.file_tree.identify_column(event.x) == '#1': return
+        index = self.file_tree.index(item)
+        if index < len(self.video_details_list): self._open_sheet_viewer(self._checked_paths() or self.video_details_list, self.video_details_list[index])
+
+    def _open_sheet_viewer(self, paths, current=None):
+        if ImageTk is None: return
+        if self.sheet_viewer is not None and self.sheet_viewer.winfo_exists(): self.sheet_viewer.destroy()
+        self.sheet_viewer = ContactSheetViewer(self, self.sheet_cache, paths, current)
+
     def _on_cancel(self):
         if self.worker_thread and self.worker_thread.is_alive():
             self.cancel_event.set(); self.app.log("正在取消影片任務...")
@@ -441,9 +564,20 @@ class VideoOrganizerPane(ttk.Frame):
                 if msg == "progress": self.pbar['value'] = payload
                 elif msg == "status": self.app.update_status(payload)
                 elif msg == "log": self.app.log(payload)
+                elif msg == "probe": self._apply_probe_results(*payload)
+                elif msg == "sheet":
+                    f_path, ok = payload
+                    item_id = self.path_to_item.get(f_path)
+                    if item_id and self.file_tree.exists(item_id): self.file_tree.set(item_id, column="status", value="🎞 已產生總覽" if ok else "🎞 擷取失敗")
+                elif msg == "sheet_done":
+                    summary, paths = payload
+                    self.btn_run.config(state="normal"); self.btn_sheets.config(state="normal"); self.btn_cancel.config(state="disabled"); self.pbar['value'] = 0
+                    self.app.update_status(f"狀態：縮圖總覽{'已取消' if self.cancel_event.is_set() else '完成'}")
+                    self.app.log(f"\n{'-'*20}\n[縮圖總覽] 總結報告:\n{summary}\n{'-'*20}\n")
+                    if paths: self._open_sheet_viewer(paths)
                 elif msg == "done":
                     (status_code, status_text), summary, temp_dirs_to_delete = payload
-                    self.btn_run.config(state="normal"); self.btn_cancel.config(state="disabled"); self.pbar['value'] = 0
+                    self.btn_run.config(state="normal"); self.btn_sheets.config(state="normal"); self.btn_cancel.config(state="disabled"); self.pbar['value'] = 0
                     self.app.update_status(f"狀態：{status_text}")
                     self.app.log(f"\n{'-'*20}\n[影片處理] 總結報告:\n{summary}\n{'-'*20}\n")
                     if self.var_notify_complete.get():
@@ -520,135 +654,241 @@ class VideoOrganizerPane(ttk.Frame):
             self.file_tree.item(item, values=("☐", *self.file_tree.item(item, "values")[1:]), tags=())
     def _on_space_press(self, e): self._toggle_selection_check()
 
+class VideoProbeWorker(threading.Thread):
+    """以執行緒池呼叫 ffprobe 探測影片 (優先使用持久化快取)，結果分批送回 UI 佇列。"""
+    BATCH_SIZE = 50
+
+    def __init__(self, paths, generation, ffprobe_exe, ui_queue, stop_event, meta_cache=None, max_workers=None):
+        super().__init__(daemon=True)
+        self.paths = paths
+        self.generation = generation
+        self.ffprobe_exe = ffprobe_exe
+        self.ui_queue = ui_queue
+        self.stop_event = stop_event
+        self.meta_cache = meta_cache
+        self.max_workers = max_workers or min(8, os.cpu_count() or 1)
+
+    def _probe(self, path):
+        info = {}
+        signature = file_signature(path)
+        if signature: info["size"] = signature[0]
+        cached = self.meta_cache.get(path, signature) if self.meta_cache and signature else None
+        if cached: info.update(cached); return path, info
+        try: meta = probe_video(self.ffprobe_exe, path)
+        except Exception as e: info["error"] = str(e); return path, info
+        info.update(meta)
+        if self.meta_cache: self.meta_cache.put(path, signature, meta)
+        return path, info
+
+    def run(self):
+        path_iter = iter(self.paths)
+        pending, batch = set(), []
+        last_flush = time.time()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while True:
+                while not self.stop_event.is_set() and len(pending) < self.max_workers * 2:
+                    path = next(path_iter, None)
+                    if path is None: break
+                    pending.add(executor.submit(self._probe, path))
+                if not pending: break
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                batch.extend(fut.result() for fut in finished)
+                now = time.time()
+                if len(batch) >= self.BATCH_SIZE or now - last_flush > 0.2:
+                    self._flush(batch); batch = []; last_flush = now
+        if batch: self._flush(batch)
+        if self.meta_cache: self.meta_cache.flush()
+
+    def _flush(self, batch):
+        if not self.stop_event.is_set(): self.ui_queue.put(("probe", (self.generation, batch)))
+
+class ContactSheetWorker(threading.Thread):
+    """以執行緒池平行產生多部影片的縮圖總覽；已快取 (路徑/大小/修改時間相同) 的影片直接命中，不會再呼叫 ffmpeg。"""
+    def __init__(self, paths, sheet_cache, durations, ui_queue, cancel_event, max_workers=None):
+        super().__init__(daemon=True)
+        self.paths = paths
+        self.sheet_cache = sheet_cache
+        self.durations = durations
+        self.ui_queue = ui_queue
+        self.cancel_event = cancel_event
+        self.max_workers = max_workers or min(8, os.cpu_count() or 1)
+
+    def _make(self, path):
+        start = time.time()
+        try: self.sheet_cache.get_or_create(path, duration=self.durations.get(path)); ok, error = True, None
+        except Exception as e: ok, error = False, str(e)
+        return path, ok, error, time.time() - start
+
+    def run(self):
+        self.sheet_cache.prune_disk()
+        before = self.sheet_cache.stats()["generated"]
+        tracker = ProgressTracker(len(self.paths), len(self.paths))
+        done_paths, failed = [], 0
+        path_iter = iter(self.paths)
+        pending = set()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while True:
+                while not self.cancel_event.is_set() and len(pending) < self.max_workers * 2:
+                    path = next(path_iter, None)
+                    if path is None: break
+                    pending.add(executor.submit(self._make, path))
+                if not pending: break
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    path, ok, error, seconds = fut.result()
+                    tracker.item_done(1, name=os.path.basename(path), seconds=seconds)
+                    self.ui_queue.put(("sheet", (path, ok)))
+                    if ok: done_paths.append(path)
+                    else: failed += 1; self.ui_queue.put(("log", f"❌ 縮圖總覽失敗: {os.path.basename(path)} - {error}"))
+                self.ui_queue.put(("progress", tracker.percent()))
+                if tracker.should_emit(0.2): self.ui_queue.put(("status", tracker.status_text("產生縮圖總覽中")))
+        generated = self.sheet_cache.stats()["generated"] - before
+        summary = (
+            f"影片數: {len(self.paths)}\n"
+            f"新產生: {generated}\n"
+            f"快取命中: {len(done_paths) - generated}\n"
+            f"失敗: {failed}\n"
+            f"{tracker.summary_text()}"
+        )
+        order = {path: i for i, path in enumerate(self.paths)}
+        self.ui_queue.put(("sheet_done", (summary, sorted(done_paths, key=order.get))))
+
+class ContactSheetViewer(tk.Toplevel):
+    """縮圖總覽檢視器：左側清單切換影片，右側顯示快取中的總覽圖 (只讀快取，不會觸發擷取)。"""
+    def __init__(self, parent, sheet_cache, paths, current=None):
+        super().__init__(parent)
+        self.title("縮圖總覽")
+        self.geometry("1400x800")
+        self.sheet_cache = sheet_cache
+        self.paths = list(paths)
+        self.photo = None
+
+        self.listbox = tk.Listbox(self, width=36, exportselection=False)
+        self.listbox.pack(side="left", fill="y")
+        for path in self.paths: self.listbox.insert("end", os.path.basename(path))
+        self.listbox.bind("<<ListboxSelect>>", self._on_select)
+
+        view = ttk.Frame(self); view.pack(side="left", fill="both", expand=True)
+        self.canvas = tk.Canvas(view, background="#202020", highlightthickness=0)
+        scroll_y = ttk.Scrollbar(view, orient="vertical", command=self.canvas.yview)
+        scroll_x = ttk.Scrollbar(view, orient="horizontal", command=self.canvas.xview)
+        self.canvas.configure(yscrollcommand=scroll_y.set, xscrollcommand=scroll_x.set)
+        self.canvas.grid(row=0, column=0, sticky="nsew"); scroll_y.grid(row=0, column=1, sticky="ns"); scroll_x.grid(row=1, column=0, sticky="ew")
+        view.grid_rowconfigure(0, weight=1); view.grid_columnconfigure(0, weight=1)
+
+        if self.paths:
+            index = self.paths.index(current) if current in self.paths else 0
+            self.listbox.selection_set(index); self.listbox.see(index); self._show(index)
+
+    def _on_select(self, event=None):
+        selection = self.listbox.curselection()
+        if selection: self._show(selection[0])
+
+    def _show(self, index):
+        path = self.paths[index]
+        self.title(f"縮圖總覽 - {os.path.basename(path)}")
+        self.canvas.delete("all")
+        sheet = self.sheet_cache.get(path)
+        if sheet is None:
+            self.photo = None
+            self.canvas.create_text(20, 20, anchor="nw", fill="white", text="尚未產生縮圖總覽 (或檔案已變更)，請勾選後按「🎞 縮圖總覽」。")
+            self.canvas.configure(scrollregion=(0, 0, 0, 0))
+            return
+        self.photo = ImageTk.PhotoImage(sheet)
+        self.canvas.create_image(0, 0, anchor="nw", image=self.photo)
+        self.canvas.configure(scrollregion=(0, 0, sheet.width, sheet.height))
+
 class VideoWorker(threading.Thread):
-    def __init__(self, tasks, settings, ui_queue, cancel_event):
+    """
+    影片工作排程器：同時執行最多 settings["jobs"] 個 ffmpeg，並以 -threads 平分 CPU 核心。
+    每個 ffmpeg 由排程執行緒池中的一條執行緒讀取輸出，進度彙整到共用的 ProgressTracker；取消時終止所有子程序。
+    來源串流已符合目標設定的檔案以 -c copy 重新封裝；僅重新封裝模式下無法封裝的檔案直接略過。
+    輸出先寫到 .partial 再改名，完成的工作記錄在輸出資料夾的清單中，重新執行時略過已完成的檔案。
+    """
+    def __init__(self, tasks, settings, ui_queue, cancel_event, video_meta=None):
         super().__init__(daemon=True)
         self.tasks = tasks; self.settings = settings; self.ui_queue = ui_queue; self.cancel_event = cancel_event
+        self.video_meta = video_meta or {}
         self.total_original_size = 0
         self.total_processed_size = 0
         self.start_time = time.time()
+        self.lock = threading.Lock()
+        self.processes = set()
+        self.job_progress = {}
+        # 覆蓋模式的輸出即來源本身，無法判斷是否已處理過，因此只在輸出到其他位置時使用清單
+        self.use_manifest = settings.get("skip_unchanged", True) and settings["output_mode"] != "overwrite"
+        self.manifests = {}
 
     def run(self):
         total = len(self.tasks); success_count = 0
         created_temp_dirs = set()
-        self.ui_queue.put(("log", f"開始處理 {total} 個影片任務..."))
-        
-        time_pattern = re.compile(r"time=(\d+):(\d+):(\d+\.\d+)")
-        duration_pattern = re.compile(r"Duration: (\d+):(\d+):(\d+\.\d+)")
-
-        for i, src_path in enumerate(self.tasks):
-            if self.cancel_event.is_set(): break
-            fname = os.path.basename(src_path)
-            self.ui_queue.put(("status", f"正在處理 ({i+1}/{total}): {fname}"))
-            
-            try: self.total_original_size += os.path.getsize(src_path)
-            except: pass
-
-            dest_dir = os.path.dirname(src_path)
-            mode = self.settings["output_mode"]
-            if mode == "subfolder": dest_dir = os.path.join(dest_dir, self.settings["subfolder"])
-            elif mode == "custom": dest_dir = self.settings["custom_dir"]
-            if not os.path.exists(dest_dir): os.makedirs(dest_dir, exist_ok=True)
-            target_ext = "." + self.settings["format"].lower()
-            
-            if mode == "overwrite":
-                 temp_dir = os.path.join(dest_dir, ".temp")
-                 if not os.path.exists(temp_dir):
-                     os.makedirs(temp_dir)
-                     if os.name == 'nt':
-                         try:
-                             import ctypes; FILE_ATTRIBUTE_HIDDEN = 0x02
-                             ctypes.windll.kernel32.SetFileAttributesW(temp_dir, FILE_ATTRIBUTE_HIDDEN)
-                         except: pass
-                 created_temp_dirs.add(temp_dir)
-                 final_dest_path = os.path.join(dest_dir, os.path.splitext(fname)[0] + target_ext)
-                 temp_output = os.path.join(dest_dir, f"{os.path.splitext(fname)[0]}.temp{target_ext}")
-                 dest_path = final_dest_path 
-            else:
-                 dest_path = os.path.join(dest_dir, os.path.splitext(fname)[0] + target_ext)
-                 temp_output = dest_path
-
-            cmd = self._build_ffmpeg_cmd(src_path, temp_output)
-            
-            try:
-                startupinfo = None
-                if os.name == 'nt': startupinfo = subprocess.STARTUPINFO(); startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-                
-                process = subprocess.Popen(
-                    cmd, 
-                    stdout=subprocess.PIPE, 
-                    stderr=subprocess.PIPE, 
-                    startupinfo=startupinfo, 
-                    text=True, 
-                    encoding='utf-8', 
-                    errors='replace',
-                    universal_newlines=True
-                )
-                
-                total_duration_sec = 0
-                start_time_real = time.time()
-                
-                while True:
-                    if self.cancel_event.is_set(): process.terminate(); break
-                    line = process.stderr.readline()
-                    if not line and process.poll() is not None: break
-                    
-                    if line:
-                        if "Duration:" in line and total_duration_sec == 0:
-                            m = duration_pattern.search(line)
-                            if m:
-                                h, m, s = map(float, m.groups())
-                                total_duration_sec = h*3600 + m*60 + s
-                        
-                        if "time=" in line:
-                            m = time_pattern.search(line)
-                            if m and total_duration_sec > 0:
-                                h, m, s = map(float, m.groups())
-                                current_sec = h*3600 + m*60 + s
-                                
-                                elapsed_real = time.time() - start_time_real
-                                if elapsed_real > 0:
-                                    speed_factor = current_sec / elapsed_real
-                                    remaining_sec = (total_duration_sec - current_sec) / speed_factor
-                                    eta_str = f"{int(remaining_sec//60)}分{int(remaining_sec%60)}秒"
-                                    single_progress = (current_sec / total_duration_sec)
-                                    total_progress = ((i + single_progress) / total) * 100
-                                    
-                                    self.ui_queue.put(("progress", int(total_progress)))
-                                    status_msg = f"處理中 ({i+1}/{total}): {fname} | 進度 {int(single_progress*100)}% | 剩餘約 {eta_str} | 速度 {speed_factor:.1f}x"
-                                    self.ui_queue.put(("status", status_msg))
-                
-                if process.returncode == 0 and not self.cancel_event.is_set():
-                    if mode == "overwrite":
-                        backup_path = os.path.join(temp_dir, fname)
-                        if os.path.exists(src_path):
-                            if os.path.exists(backup_path): 
-                                try: os.remove(backup_path)
-                                except: pass
-                            shutil.move(src_path, backup_path)
-                        if os.path.exists(temp_output):
-                            shutil.move(temp_output, dest_path)
-                    
-                    try:
-                        orig_size = 0
-                        if mode == "overwrite": 
-                            try: orig_size = os.path.getsize(os.path.join(temp_dir, fname))
-                            except: pass
-                        else:
-                            orig_size = os.path.getsize(src_path)
-
-                        new_size = os.path.getsize(dest_path)
-                        self.total_processed_size += new_size
-                        percent_change = ((new_size - orig_size) / orig_size) * 100 if orig_size > 0 else 0
-                        self.ui_queue.put(("log", f"✔ 成功: {fname} ({format_size(orig_size)} ➜ {format_size(new_size)}, {percent_change:+.1f}%)"))
-                    except: self.ui_queue.put(("log", f"✔ 成功: {fname}"))
-                    success_count += 1
-                else:
-                    if not self.cancel_event.is_set(): self.ui_queue.put(("log", f"❌ 失敗: {fname}"))
-                    if os.path.exists(temp_output): os.remove(temp_output)
-            
-            except Exception as e: self.ui_queue.put(("log", f"❌ 例外錯誤: {fname} - {e}"))
-            self.ui_queue.put(("progress", int(((i+1)/total)*100)))
+        try: jobs = max(1, min(int(self.settings.get("jobs", 1)), total))
+        except (TypeError, ValueError): jobs = 1
+        # 單一工作時交給 ffmpeg 自行決定執行緒數；多個工作同時執行時平分核心，避免彼此搶占
+        self.threads_per_job = max(1, (os.cpu_count() or 1) // jobs) if jobs > 1 else 0
+        self.jobs = jobs
+        self.caps = get_capabilities(self.settings.get("ffmpeg_path", "ffmpeg"))
+        self._resolve_encoder()
+        # 指紋以實際採用的設定計算 (NVENC 不可用而改用 CPU 時，之後有 GPU 會再以 NVENC 處理)
+        self.settings_fp = video_settings_fingerprint(self.settings)
+        # 輸出路徑在排程前一次決定，撞名的來源改用 name(1).ext，同一時間不會有兩個工作寫入同一檔案
+        s = self.settings
+        self.output_paths = plan_output_paths(self.tasks, s["output_mode"], s["format"], s.get("subfolder", ""), s.get("custom_dir", ""))
+        renamed = [p for p in self.tasks if os.path.splitext(os.path.basename(self.output_paths[p]))[0] != os.path.splitext(os.path.basename(p))[0]]
+        if renamed: self.ui_queue.put(("log", f"⚠️ {len(renamed)} 個檔案的輸出檔名重複，已改名: " + ", ".join(os.path.basename(self.output_paths[p]) for p in renamed[:5]) + (" …" if len(renamed) > 5 else "")))
+        self.sizes = {}
+        for src_path in self.tasks:
+            try: self.sizes[src_path] = os.path.getsize(src_path)
+            except OSError: self.sizes[src_path] = 0
+        self._cleanup_partials()
+        up_to_date = self._skip_up_to_date() if self.use_manifest else []
+        self._probe_missing()
+        self.decisions = {p: stream_copy_decision(self.video_meta.get(p), self.settings, p) for p in self.tasks}
+        skipped = [p for p in self.tasks if self.decisions[p][0] == DECISION_SKIP]
+        remux_count = sum(1 for p in self.tasks if self.decisions[p][0] in (DECISION_COPY, DECISION_COPY_VIDEO))
+        self.tasks = [p for p in self.tasks if self.decisions[p][0] != DECISION_SKIP]
+        self._plan_work()
+        self.segmented = {p for p in self.tasks if self._can_segment(p)}
+        # 多個工作同時執行時由長到短排程，避免最長的影片最後才開始
+        if jobs > 1: self.tasks = sorted(self.tasks, key=lambda p: -self.work[p])
+        self.tracker = ProgressTracker(total, sum(self.work.values()))
+        self.tracker.skip(len(skipped) + len(up_to_date))
+        self.ui_queue.put(("log", f"開始處理 {total} 個影片任務..." + (f" (同時 {jobs} 個，每個 {self.threads_per_job} 執行緒)" if jobs > 1 else "")))
+        if up_to_date: self.ui_queue.put(("log", f"略過 {len(up_to_date)} 個輸出已是最新的檔案。"))
+        if remux_count: self.ui_queue.put(("log", f"其中 {remux_count} 個串流相容，將直接重新封裝 (不重新編碼)"))
+        for src_path in skipped: self.ui_queue.put(("log", f"⏭ 略過: {os.path.basename(src_path)} ({self.decisions[src_path][1]})"))
+
+        task_iter = iter(self.tasks)
+        pending = {}
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            while True:
+                while not self.cancel_event.is_set() and len(pending) < jobs:
+                    src_path = next(task_iter, None)
+                    if src_path is None: break
+                    pending[executor.submit(self._run_job, src_path)] = src_path
+                if not pending: break
+                finished, _ = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+                if self.cancel_event.is_set(): self._terminate_all()
+                for fut in finished:
+                    src_path = pending.pop(fut)
+                    fname = os.path.basename(src_path)
+                    try: result = fut.result()
+                    except Exception as e:
+                        result = {"ok": False, "cancelled": False, "elapsed": 0}
+                        self.ui_queue.put(("log", f"❌ 例外錯誤: {fname} - {e}"))
+                    if result.get("temp_dir"): created_temp_dirs.add(result["temp_dir"])
+                    if result["ok"]:
+                        success_count += 1
+                        if self.use_manifest:
+                            # 每完成一個就寫回清單，程式中途關閉時已完成的工作仍會被記住
+                            manifest = self._manifest_for(result["output_path"])
+                            manifest.record(result["output_path"], src_path, self.settings_fp); manifest.save()
+                    with self.lock:
+                        self.job_progress.pop(src_path, None)
+                        if not result.get("cancelled"):
+                            self.tracker.item_done(self.work[src_path], name=fname, seconds=result["elapsed"], bytes_count=self.sizes[src_path], key=src_path)
+                    self.ui_queue.put(("progress", self.tracker.percent()))
+                self._emit_status(total)
 
         end_time = time.time()
         duration = end_time - self.start_time
@@ -660,40 +900,338 @@ class VideoWorker(threading.Thread):
             f"總輸入大小: {format_size(self.total_original_size)}\n"
             f"總輸出大小: {format_size(self.total_processed_size)}\n"
             f"總空間節省: {total_change:+.1f}%\n"
-            f"總花費時間: {duration:.1f} 秒"
+            f"總花費時間: {duration:.1f} 秒\n"
         )
+        if remux_count: summary += f"重新封裝: {remux_count} (未重新編碼)\n"
+        if self.segmented: summary += f"分段平行編碼: {len(self.segmented)}\n"
+        if skipped: summary += f"略過 (無法重新封裝): {len(skipped)}\n"
+        if up_to_date: summary += f"略過 (輸出已是最新): {len(up_to_date)}\n"
+        if jobs > 1: summary += f"同時工作數: {jobs} (每個 {self.threads_per_job} 執行緒)\n"
+        summary += self.tracker.summary_text()
 
         final_status = "cancel" if self.cancel_event.is_set() else "ok"
         final_msg = "任務已取消" if self.cancel_event.is_set() else "處理完成"
         self.ui_queue.put(("done", ((final_status, final_msg), summary, list(created_temp_dirs))))
 
-    def _build_ffmpeg_cmd(self, src, dest):
+    def _resolve_encoder(self):
+        """選擇 GPU (NVENC) 但實測無法使用時 (沒有 NVIDIA 顯示卡或驅動程式)，整批改用 CPU 編碼。"""
+        s = self.settings
+        if s["preset"] != "GPU (NVENC)" or s["format"] == "GIF": return
+        encoder = "hevc_nvenc" if s.get("10bit") else "h264_nvenc"
+        if encoder in self.caps["encoders"]: return
+        self.settings = dict(s, preset="medium")
+        self.ui_queue.put(("log", f"⚠️ {encoder} 無法使用，改以 CPU 編碼 (medium)。"))
+
+    def _output_path(self, src_path):
+        return self.output_paths[src_path]
+
+    def _manifest_for(self, output_path):
+        out_dir = os.path.dirname(os.path.abspath(output_path))
+        if out_dir not in self.manifests: self.manifests[out_dir] = OutputManifest(out_dir)
+        return self.manifests[out_dir]
+
+    def _skip_up_to_date(self):
+        """來源簽章、設定指紋與輸出簽章皆與清單相符的任務直接略過，回傳略過的來源路徑。"""
+        up_to_date = [p for p in self.tasks if self._manifest_for(self._output_path(p)).is_up_to_date(self._output_path(p), p, self.settings_fp)]
+        skipped = set(up_to_date)
+        self.tasks = [p for p in self.tasks if p not in skipped]
+        return up_to_date
+
+    def _cleanup_partials(self):
+        """刪除上次中斷 (取消或程式關閉) 留下的 .partial 輸出與分段暫存資料夾；只處理本批次的輸出，已完成的輸出不受影響。"""
+        removed = 0
+        for src_path in self.tasks:
+            partial = self._output_path(src_path) + PARTIAL_SUFFIX
+            segments_dir = os.path.join(os.path.dirname(partial), f".{os.path.basename(partial)}.segments")
+            if os.path.isdir(segments_dir): shutil.rmtree(segments_dir, ignore_errors=True)
+            if os.path.exists(partial):
+                try: os.remove(partial); removed += 1
+                except OSError: pass
+        if removed: self.ui_queue.put(("log", f"已清除 {removed} 個上次未完成的 {PARTIAL_SUFFIX} 輸出。"))
+
+    def _probe_missing(self):
+        """背景探測尚未完成的影片在開始前補探測，串流複製判斷與工作量規劃都需要中繼資料。"""
+        ffprobe_path = self.settings.get("ffprobe_path")
+        missing = [p for p in self.tasks if not self.video_meta.get(p)]
+        if not missing or not ffprobe_path: return
+        def probe(path):
+            try: return path, probe_video(ffprobe_path, path)
+            except Exception as e: return path, {"error": str(e)}
+        with ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1)) as executor:
+            self.video_meta.update(executor.map(probe, missing))
+
+    def _plan_work(self):
+        """
+        工作量以探測到的影片長度 (秒) 計算；尚未探測到長度的影片，依已知影片的平均每位元組秒數由檔案大小推估。
+        重新封裝的影片只計 REMUX_WORK_FACTOR 倍。編碼中的影片依 time= 除以長度回報部分進度。
+        """
+        self.durations = {p: (self.video_meta.get(p) or {}).get("duration") or 0 for p in self.tasks}
+        known = [(self.durations[p], self.sizes[p]) for p in self.tasks if self.durations[p] and self.sizes[p]]
+        known_bytes = sum(size for _, size in known)
+        seconds_per_byte = sum(d for d, _ in known) / known_bytes if known_bytes else 1.0
+        self.work = {p: self.durations[p] or max(1e-6, self.sizes[p] * seconds_per_byte) for p in self.tasks}
+        for p in self.tasks:
+            if self.decisions[p][0] in (DECISION_COPY, DECISION_COPY_VIDEO): self.work[p] *= REMUX_WORK_FACTOR
+
+    def _terminate_all(self):
+        with self.lock: processes = list(self.processes)
+        for process in processes:
+            try: process.terminate()
+            except OSError: pass
+
+    def _emit_status(self, total):
+        with self.lock:
+            if not self.tracker.should_emit(0.2): return
+            running = list(self.job_progress.items())
+            overall = f"{self.tracker.rates_text()} | 全部剩餘約 {format_duration(self.tracker.eta())}"
+            done = self.tracker.done_items
+            self.ui_queue.put(("progress", self.tracker.percent()))
+        if len(running) == 1:
+            src_path, (fraction, speed) = running[0]
+            status_msg = f"處理中 ({done + 1}/{total}): {os.path.basename(src_path)} | 進度 {int(fraction * 100)}% | 速度 {speed:.1f}x | {overall}"
+        elif running:
+            jobs_text = ", ".join(f"{os.path.basename(p)} {int(fraction * 100)}%" for p, (fraction, _) in running)
+            status_msg = f"同時處理 {len(running)} 個 ({done}/{total} 完成): {jobs_text} | {overall}"
+        else: return
+        self.ui_queue.put(("status", status_msg))
+
+    def _run_job(self, src_path):
+        """在排程執行緒中執行單一 ffmpeg 工作，回傳 {"ok", "cancelled", "elapsed", "temp_dir", "output_path"}。"""
+        fname = os.path.basename(src_path)
+        job_start = time.time()
+        dest_path = self._output_path(src_path)
+        result = {"ok": False, "cancelled": False, "elapsed": 0, "temp_dir": None, "output_path": dest_path}
+        with self.lock: self.total_original_size += self.sizes[src_path]; self.job_progress[src_path] = (0.0, 0.0)
+
+        dest_dir = os.path.dirname(dest_path)
+        mode = self.settings["output_mode"]
+        os.makedirs(dest_dir, exist_ok=True)
+        # 輸出先寫到 .partial，成功後才改成正式檔名，中斷時不會留下看似完整的半成品
+        temp_output = dest_path + PARTIAL_SUFFIX
+        
+        if mode == "overwrite":
+             temp_dir = os.path.join(dest_dir, ".temp")
+             if not os.path.exists(temp_dir):
+                 os.makedirs(temp_dir, exist_ok=True)
+                 if os.name == 'nt':
+                     try:
+                         import ctypes; FILE_ATTRIBUTE_HIDDEN = 0x02
+                         ctypes.windll.kernel32.SetFileAttributesW(temp_dir, FILE_ATTRIBUTE_HIDDEN)
+                     except: pass
+             result["temp_dir"] = temp_dir
+
+        decision = self.decisions[src_path][0]
+        remux = decision in (DECISION_COPY, DECISION_COPY_VIDEO)
+        total_duration_sec = self.durations[src_path]
+        start_time_real = time.time()
+
+        def report(current_sec, speed_factor):
+            if total_duration_sec <= 0: return
+            elapsed_real = time.time() - start_time_real
+            single_progress = min(1.0, current_sec / total_duration_sec)
+            if speed_factor is None: speed_factor = current_sec / elapsed_real if elapsed_real > 0 else 0.0
+            with self.lock:
+                self.tracker.advance(self.work[src_path] * single_progress, key=src_path)
+                self.job_progress[src_path] = (single_progress, speed_factor)
+        
+        try:
+            if src_path in self.segmented:
+                returncode, error_text = self._encode_segmented(src_path, temp_output, report)
+            else:
+                cmd = self._build_remux_cmd(src_path, temp_output, decision) if remux else self._build_ffmpeg_cmd(src_path, temp_output)
+                if self.threads_per_job and decision != DECISION_COPY: cmd[-1:-1] = ["-threads", str(self.threads_per_job)]
+                cmd[-1:-1] = ["-f", OUTPUT_MUXERS[self.settings["format"]]]
+                returncode, error_text = self._run_ffmpeg(cmd, report)
+            
+            if returncode == 0 and not self.cancel_event.is_set():
+                if mode == "overwrite":
+                    backup_path = os.path.join(temp_dir, fname)
+                    if os.path.exists(src_path):
+                        if os.path.exists(backup_path): 
+                            try: os.remove(backup_path)
+                            except: pass
+                        shutil.move(src_path, backup_path)
+                    if os.path.exists(temp_output):
+                        shutil.move(temp_output, dest_path)
+                else: os.replace(temp_output, dest_path)
+                
+                try:
+                    orig_size = 0
+                    if mode == "overwrite": 
+                        try: orig_size = os.path.getsize(os.path.join(temp_dir, fname))
+                        except: pass
+                    else:
+                        orig_size = os.path.getsize(src_path)
+
+                    new_size = os.path.getsize(dest_path)
+                    with self.lock: self.total_processed_size += new_size
+                    percent_change = ((new_size - orig_size) / orig_size) * 100 if orig_size > 0 else 0
+                    self.ui_queue.put(("log", f"✔ {'重新封裝' if remux else '成功'}: {fname} ({format_size(orig_size)} ➜ {format_size(new_size)}, {percent_change:+.1f}%)"))
+                except: self.ui_queue.put(("log", f"✔ {'重新封裝' if remux else '成功'}: {fname}"))
+                result["ok"] = True
+            else:
+                result["cancelled"] = self.cancel_event.is_set()
+                if not result["cancelled"]:
+                    self.ui_queue.put(("log", f"❌ 失敗: {fname} (ffmpeg 結束代碼 {returncode})" + (f"\n{error_text}" if error_text else "")))
+                if os.path.exists(temp_output): os.remove(temp_output)
+        
+        except Exception as e: self.ui_queue.put(("log", f"❌ 例外錯誤: {fname} - {e}"))
+        result["elapsed"] = time.time() - job_start
+        return result
+
+    def _run_ffmpeg(self, cmd, on_progress=None):
+        """
+        執行一個 ffmpeg 並等待結束，回傳 (結束代碼, stderr 最後幾行)。進度走 stdout 上的 -progress 通道，
+        每個區塊以 (已輸出秒數, 速度) 呼叫 on_progress；stderr 由另一條執行緒讀取。取消時終止子程序。
+        """
+        process = subprocess.Popen(
+            cmd[:1] + PROGRESS_ARGS + cmd[1:],
+            stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            startupinfo=hidden_startupinfo(), text=True, encoding='utf-8', errors='replace'
+        )
+        with self.lock: self.processes.add(process)
+        stderr_tail = StderrTail(process.stderr)
+        try:
+            for block in iter_progress(process.stdout):
+                if self.cancel_event.is_set(): process.terminate(); break
+                current_sec = progress_seconds(block)
+                if current_sec is not None and on_progress: on_progress(current_sec, progress_speed(block))
+            process.wait()
+        finally:
+            with self.lock: self.processes.discard(process)
+        return process.returncode, stderr_tail.text()
+
+    def _can_segment(self, src_path):
+        """分段平行編碼只用於需要重新編碼的長片；GIF 與 NVENC (並行工作階段有限) 不分段。"""
+        s = self.settings
+        if not s.get("segment") or self.decisions[src_path][0] != DECISION_ENCODE: return False
+        if s["format"] == "GIF" or s["preset"] == "GPU (NVENC)": return False
+        return self.durations[src_path] >= SEGMENT_MIN_DURATION and bool((self.video_meta.get(src_path) or {}).get("video_codec"))
+
+    def _encode_segmented(self, src_path, dest, on_progress):
+        """
+        長片分段平行編碼：先以串流複製在關鍵影格切開視訊 (segment muxer，每段時間戳歸零)，
+        再以多個 ffmpeg 平行編碼各段 (只處理視訊)，最後用 concat demuxer 接回並從原檔取音訊，
+        音訊不經切割因此不會在段落交界斷裂。視訊相對於來源起點的偏移以 -itsoffset 補回，
+        合併後再探測輸出，長度、音軌數或影音起始差與來源不符時視為失敗。回傳值與 _run_ffmpeg 相同。
+        """
+        ffprobe_path = self.settings.get("ffprobe_path", "ffprobe")
+        try: src_timing = probe_timing(ffprobe_path, src_path)
+        except Exception as e: return 1, f"    無法探測來源時間軸: {e}"
+        duration = self.durations[src_path]
+        workers = max(2, (os.cpu_count() or 1) // (SEGMENT_THREADS * self.jobs))
+        work_dir = os.path.join(os.path.dirname(dest), f".{os.path.basename(dest)}.segments")
+        shutil.rmtree(work_dir, ignore_errors=True); os.makedirs(work_dir)
+        try:
+            split_cmd = [self.settings.get("ffmpeg_path", "ffmpeg"), "-y", "-i", src_path, "-map", "0:V:0", "-c", "copy", "-f", "segment",
+                         "-segment_time", f"{segment_length(duration, workers):.3f}", "-reset_timestamps", "1", os.path.join(work_dir, "src_%05d.mkv")]
+            returncode, error_text = self._run_ffmpeg(split_cmd)
+            if returncode != 0 or self.cancel_event.is_set(): return returncode, error_text
+            segments = sorted(f for f in os.listdir(work_dir) if f.startswith("src_"))
+            self.ui_queue.put(("log", f"✂ 分段編碼: {os.path.basename(src_path)} ({len(segments)} 段，同時 {workers} 個)"))
+
+            # 各段進度 (已輸出秒數) 加總後換算成整部影片的進度
+            segment_seconds = [0.0] * len(segments)
+            start_time = time.time()
+            def encode(index):
+                if self.cancel_event.is_set(): return None, ""
+                def report(current_sec, _speed):
+                    segment_seconds[index] = current_sec
+                    done = sum(segment_seconds)
+                    on_progress(done, done / max(time.time() - start_time, 1e-6))
+                seg_src = os.path.join(work_dir, segments[index])
+                cmd = self._build_ffmpeg_cmd(seg_src, os.path.join(work_dir, "enc" + segments[index][3:]), video_only=True)
+                cmd[-1:-1] = ["-threads", str(SEGMENT_THREADS)]
+                returncode, error_text = self._run_ffmpeg(cmd, report)
+                return returncode, f"    [{segments[index]}]\n{error_text}" if error_text else ""
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(encode, range(len(segments))))
+            if self.cancel_event.is_set(): return None, ""
+            failed = next(((code, text) for code, text in results if code != 0), None)
+            if failed: return failed
+
+            list_path = os.path.join(work_dir, "concat.txt")
+            with open(list_path, "w", encoding="utf-8") as f:
+                for name in segments: f.write(concat_list_line(os.path.join(work_dir, "enc" + name[3:])))
+            # 各段時間戳已歸零，ffmpeg 又會扣掉每個輸入的起始時間，因此把來源中視訊晚於容器起點的部分加回，音訊才能對齊
+            video_start = src_timing["video_start"] if src_timing["video_start"] is not None else src_timing["start"]
+            video_offset = video_start - src_timing["start"]
+            concat_cmd = [self.settings.get("ffmpeg_path", "ffmpeg"), "-y"]
+            if video_offset > 0.0005: concat_cmd.extend(["-itsoffset", f"{video_offset:.6f}"])
+            concat_cmd.extend(["-f", "concat", "-safe", "0", "-i", list_path, "-i", src_path, "-map", "0:v:0", *self._extra_stream_maps(1), "-c:v", "copy"])
+            audio_setting = self.settings["audio"]
+            if audio_setting == "No Audio": concat_cmd.append("-an")
+            elif audio_setting == "AAC": concat_cmd.extend(["-c:a", "aac", "-b:a", "128k"])
+            else: concat_cmd.extend(["-c:a", "copy"])
+            returncode, error_text = self._run_ffmpeg(concat_cmd + ["-f", OUTPUT_MUXERS[self.settings["format"]], dest])
+            if returncode != 0 or self.cancel_event.is_set(): return returncode, error_text
+            try: problem = check_segmented_output(src_timing, probe_timing(ffprobe_path, dest), audio_setting != "No Audio")
+            except Exception as e: problem = f"無法驗證分段輸出: {e}"
+            return (1, f"    {problem}") if problem else (returncode, error_text)
+        finally: shutil.rmtree(work_dir, ignore_errors=True)
+
+    def _extra_stream_maps(self, input_index):
+        """
+        視訊以外要保留的串流：全部音軌，MKV 另保留字幕 (字幕編碼多半無法直接放進其他容器)。
+        一般編碼、重新封裝與分段合併共用，各路徑輸出相同的串流。
+        """
+        maps = [] if self.settings["audio"] == "No Audio" else ["-map", f"{input_index}:a?"]
+        if self.settings["format"] == "MKV": maps.extend(["-map", f"{input_index}:s?", "-c:s", "copy"])
+        return maps
+
+    def _build_remux_cmd(self, src, dest, decision):
+        """
+        串流複製：視訊 (與相容的音訊) 直接複製封包；音訊不相容或指定 AAC 時只轉檔音訊。
+        串流對應與重新編碼相同 (全部音軌，MKV 另含字幕)，判定為可重新封裝的檔案不會因此少掉音軌。
+        """
+        s = self.settings; ffmpeg_exe = s.get("ffmpeg_path", "ffmpeg")
+        cmd = [ffmpeg_exe, "-y", "-i", src, "-map", "0:V:0", *self._extra_stream_maps(0), "-c:v", "copy"]
+        if s["audio"] == "No Audio": cmd.append("-an")
+        elif decision == DECISION_COPY_VIDEO: cmd.extend(["-c:a", "aac", "-b:a", "128k"])
+        else: cmd.extend(["-c:a", "copy"])
+        if s["format"] in ("MP4", "MOV"):
+            if (self.video_meta.get(src) or {}).get("video_codec") == "hevc": cmd.extend(["-tag:v", "hvc1"])
+            cmd.extend(["-movflags", "+faststart"])
+        cmd.append(dest)
+        return cmd
+
+    def _build_ffmpeg_cmd(self, src, dest, video_only=False):
         s = self.settings; ffmpeg_exe = s.get("ffmpeg_path", "ffmpeg")
         cmd = [ffmpeg_exe, "-y"]
         _, ext = os.path.splitext(src)
-        
-        # Exclude non-video formats from hardware acceleration
-        if ext.lower() not in ['.gif', '.png', '.jpg', '.jpeg', '.bmp', '.webp']:
-            cmd.extend(["-hwaccel", "cuda", "-hwaccel_output_format", "cuda"])
-
-        cmd.extend(["-i", src])
+        caps = self.caps
         
         if s["format"] == "GIF":
-            cmd.extend(["-vf", f"fps={10 if s['fps']=='維持原始' else s['fps']},scale=480:-1:flags=lanczos,split[s0][s1];[s0]palettegen[p];[s1][p]paletteuse"])
+            self._require_filters(["fps", "scale", "split", "palettegen", "paletteuse"])
+            cmd.extend(["-i", src, "-vf", f"fps={10 if s['fps']=='維持原始' else s['fps']},scale=480:-1:flags=lanczos,split[s0][s1];[s0]palettegen[p];[s1][p]paletteuse"])
             return cmd + [dest]
         
         video_codec = "libx264"; preset = s["preset"]
         is_gpu = preset == "GPU (NVENC)"; is_10bit = s.get("10bit", False)
 
+        # 只有 NVENC 編碼時才使用 CUDA 解碼 (CPU 編碼器無法接收 CUDA 影格)，且需實測裝置可用；
+        # 影格留在 GPU (零複製) 時無法套用 CPU 濾鏡與像素格式轉換，因此調整大小或 10-bit 時改為下載回系統記憶體
+        if is_gpu and caps["cuda"] and ext.lower() not in ['.gif', '.png', '.jpg', '.jpeg', '.bmp', '.webp']:
+            cmd.extend(["-hwaccel", "cuda"])
+            if not s["resize"] and not is_10bit: cmd.extend(["-hwaccel_output_format", "cuda"])
+
+        cmd.extend(["-i", src, "-map", "0:V:0"])
+        if not video_only: cmd.extend(self._extra_stream_maps(0))
+
         if is_gpu:
+            preset = "p4"
             if is_10bit: video_codec = "hevc_nvenc"; cmd.extend(["-pix_fmt", "p010le", "-profile:v", "main10"])
-            else: video_codec = "h264_nvenc"; preset = "p4"
+            else: video_codec = "h264_nvenc"
         elif is_10bit: cmd.extend(["-pix_fmt", "yuv420p10le", "-profile:v", "high10"])
 
-        if is_gpu: cmd.extend(["-c:v", video_codec, "-rc", "constqp", "-qp", str(s["crf"]), "-preset", "p4" if preset == "p4" else preset])
+        if is_gpu: cmd.extend(["-c:v", video_codec, "-rc", "constqp", "-qp", str(s["crf"]), "-preset", preset])
+        elif caps["encoders"] and "libx264" not in caps["encoders"]:
+            # 沒有 libx264 的 ffmpeg (例如 LGPL 版本) 退回內建的 mpeg4，CRF 14~38 對應到 -q:v 2~10
+            if is_10bit: del cmd[cmd.index("-pix_fmt"):cmd.index("-pix_fmt") + 4]
+            cmd.extend(["-c:v", "mpeg4", "-q:v", str(min(31, max(2, 2 + (int(s["crf"]) - 14) // 3)))])
         else: cmd.extend(["-c:v", video_codec, "-crf", str(s["crf"]), "-preset", preset])
         
-        audio_setting = s["audio"]
+        audio_setting = "No Audio" if video_only else s["audio"]
         if audio_setting == "No Audio": cmd.append("-an")
         elif audio_setting == "AAC": cmd.extend(["-c:a", "aac", "-b:a", "128k"])
         else: cmd.extend(["-c:a", "copy"])
@@ -702,10 +1240,6 @@ class VideoWorker(threading.Thread):
         if s["fps"] != "維持原始": filters.append(f"fps={s['fps']}")
         
         if s["resize"]:
-            # Resize incompatible with CUDA hwaccel output format; fallback to CPU decoding if resize needed
-            if "-hwaccel" in cmd:
-                if cmd[2] == "-hwaccel": del cmd[2:6] 
-
             if s["resize_mode"] == "百分比":
                 try:
                     w_fac = float(s["w"]) / 100.0; h_fac = float(s["h"]) / 100.0
@@ -719,10 +1253,17 @@ class VideoWorker(threading.Thread):
                     filters.append(f"scale={w_digit}:{h_digit}")
                 except: pass
 
-        if filters: cmd.extend(["-vf", ",".join(filters)])
+        if filters:
+            self._require_filters([f.split("=")[0] for f in filters])
+            cmd.extend(["-vf", ",".join(filters)])
         cmd.append(dest)
         return cmd
 
+    def _require_filters(self, names):
+        # 能力探測失敗 (清單為空) 時不阻擋，交由 ffmpeg 自行回報
+        missing = [name for name in names if self.caps["filters"] and name not in self.caps["filters"]]
+        if missing: raise RuntimeError(f"此 ffmpeg 不支援濾鏡: {', '.join(missing)}")
+
 if __name__ == "__main__":
     try: from utils import ensure_tk_with_dnd, VIDEO_EXTS
     except ImportError: